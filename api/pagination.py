@@ -0,0 +1,81 @@
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from core.pagination import DEFAULT_ORDERING, InvalidCursor, keyset_paginate
+from listings.catalog import paginate_listings
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Cursor pagination keyed on the view's ``cursor_ordering`` (``created_at``
+    then ``id`` by default). Deep pages cost the same as the first one.
+    Pass ``?total=1`` to include an approximate total.
+    """
+    page_size = api_settings.PAGE_SIZE or 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering = DEFAULT_ORDERING
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        ordering = getattr(view, 'cursor_ordering', None) or self.ordering
+        try:
+            self.page = self.get_page(
+                queryset,
+                request,
+                cursor=request.query_params.get(self.cursor_query_param),
+                page_size=self.get_page_size(request),
+                ordering=ordering,
+                with_total=request.query_params.get('total') == '1',
+            )
+        except InvalidCursor:
+            raise NotFound('Invalid cursor.')
+        return list(self.page)
+
+    def get_page(self, queryset, request, **kwargs):
+        return keyset_paginate(queryset, **kwargs)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(remove_query_param(url, 'total'), self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        response = {
+            'next': self.get_link(self.page.next_cursor),
+            'previous': self.get_link(self.page.previous_cursor),
+            'results': data,
+        }
+        if self.page.approximate_total is not None:
+            response['approximate_total'] = self.page.approximate_total
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'approximate_total': {'type': 'integer'},
+                'results': schema,
+            },
+        }
+
+
+class ListingCursorPagination(KeysetCursorPagination):
+    """Keyset pagination served from the in-memory listing catalog when enabled"""
+
+    def get_page(self, queryset, request, **kwargs):
+        return paginate_listings(queryset, request.query_params, **kwargs)
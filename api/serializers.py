@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from accounts.models import User
 from listings.models import Listing
+from listings.images import VARIANTS, url_for_quality
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -8,6 +9,48 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'email', 'first_name', 'last_name']
 
 class ListingSerializer(serializers.ModelSerializer):
+    """Listing card; expects a Listing.objects.for_cards() queryset"""
+    host_name = serializers.CharField(source='host.full_name', read_only=True)
+    category = serializers.SlugRelatedField(slug_field='slug', read_only=True)
+    amenities = serializers.SlugRelatedField(slug_field='name', many=True, read_only=True)
+    primary_image = serializers.SerializerMethodField()
+    primary_image_srcset = serializers.SerializerMethodField()
+    distance_km = serializers.SerializerMethodField()
+    quote = serializers.SerializerMethodField()
+    
     class Meta:
         model = Listing
-        fields = ['id', 'title', 'description', 'price_per_day', 'city', 'country']
+        fields = ['id', 'title', 'description', 'price_per_day', 'city', 'country',
+                  'latitude', 'longitude', 'distance_km',
+                  'host_name', 'category', 'amenities', 'primary_image', 'primary_image_srcset',
+                  'average_rating', 'total_reviews', 'quote']
+    
+    def absolute_url(self, url):
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+    
+    def get_primary_image(self, obj):
+        """Variant matching the client's image_quality (see listings.images)"""
+        image = obj.primary_image
+        if image is None or not image.image:
+            return None
+        quality = self.context.get('image_quality', 'medium')
+        return self.absolute_url(url_for_quality(image, quality))
+    
+    def get_primary_image_srcset(self, obj):
+        image = obj.primary_image
+        if image is None or not image.image:
+            return None
+        return ', '.join(
+            f'{self.absolute_url(image.variant_url(variant))} {width}w'
+            for variant, width in VARIANTS.items()
+        )
+    
+    def get_distance_km(self, obj):
+        distance = getattr(obj, 'distance_km', None)
+        return round(distance, 2) if distance is not None else None
+    
+    def get_quote(self, obj):
+        """Price of the searched stay, when the search has check_in/check_out"""
+        stay_quote = getattr(obj, 'stay_quote', None)
+        return stay_quote.as_dict() if stay_quote is not None else None
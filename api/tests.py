@@ -1,3 +1,94 @@
+import datetime
+from decimal import Decimal
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from listings.models import Category, Listing, ListingImage
+
+
+class ListingApiTests(TestCase):
+    """The listing endpoints answer through the router with cursors, filters, facets and quotes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(
+            email='host@example.com', password='secret', first_name='Host', last_name='User'
+        )
+        cls.category = Category.objects.create(name='Apartment', slug='apartment')
+        cls.listings = [
+            Listing.objects.create(
+                title=f'Listing {index}',
+                description='Sunny and central',
+                host=cls.host,
+                category=cls.category if index % 2 else None,
+                price_per_day=Decimal('100.00') + index,
+                city='Durban' if index < 3 else 'Cape Town',
+                country='South Africa',
+                latitude=Decimal('-29.858681') if index < 3 else Decimal('-33.924870'),
+                longitude=Decimal('31.021839') if index < 3 else Decimal('18.424055'),
+                is_approved=True,
+            )
+            for index in range(5)
+        ]
+        ListingImage.objects.create(listing=cls.listings[0], image='listings/0.jpg', is_primary=True)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('listing-list')
+
+    def get(self, params=None, url=None):
+        return self.client.get(url or self.url, params or {})
+
+    def test_cursor_pages_walk_every_listing(self):
+        seen = []
+        response = self.get({'page_size': 2})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            seen += [listing['id'] for listing in body['results']]
+            if not body['next']:
+                break
+            response = self.client.get(body['next'])
+        newest_first = sorted(self.listings, key=lambda listing: (listing.created_at, listing.pk), reverse=True)
+        self.assertEqual(seen, [listing.pk for listing in newest_first])
+        self.assertEqual(self.get({'cursor': 'garbage'}).status_code, 404)
+
+    def test_filters_geo_and_malformed_parameters(self):
+        body = self.get({'city': 'Durban', 'sort': 'price'}).json()
+        self.assertEqual([listing['title'] for listing in body['results']], ['Listing 0', 'Listing 1', 'Listing 2'])
+
+        body = self.get({'lat': '-29.85', 'lng': '31.02', 'radius_km': '20'}).json()
+        self.assertEqual(len(body['results']), 3)
+        self.assertTrue(all(listing['distance_km'] < 20 for listing in body['results']))
+
+        for params in ({'lat': 'north'}, {'radius_km': '5', 'lat': '-29.85', 'lng': '999'}):
+            self.assertEqual(self.get(params).status_code, 400)
+
+    def test_stay_quotes_and_length_cap(self):
+        check_in = timezone.localdate() + datetime.timedelta(days=10)
+        body = self.get({
+            'city': 'Durban', 'check_in': check_in.isoformat(),
+            'check_out': (check_in + datetime.timedelta(days=2)).isoformat(),
+        }).json()
+        self.assertEqual(len(body['results']), 3)
+        self.assertTrue(all(listing['quote']['nights'] == 2 for listing in body['results']))
+
+        response = self.get({
+            'check_in': check_in.isoformat(), 'check_out': (check_in + datetime.timedelta(days=400)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_facets_and_image_quality(self):
+        facets = self.client.get(reverse('listing-facets'), {'city': 'Durban'}).json()
+        self.assertEqual(facets['total'], 3)
+        self.assertEqual([(row['slug'], row['count']) for row in facets['categories']], [('apartment', 1)])
 
-# Create your tests here.
+        body = self.get({'city': 'Durban', 'sort': 'price', 'image_quality': 'low'}).json()
+        self.assertTrue(body['results'][0]['primary_image'].endswith(
+            reverse('listings:image_variant', args=[self.listings[0].images.get().pk, 'thumb', 'jpg'])
+        ))
+        self.assertIsNone(body['results'][1]['primary_image'])
@@ -5,14 +5,10 @@ from . import views
 
 router = DefaultRouter()
 router.register(r'users', views.UserViewSet, basename='user')
-router.register(r'categories', views.CategoryViewSet, basename='category')
 router.register(r'listings', views.ListingViewSet, basename='listing')
-router.register(r'bookings', views.BookingViewSet, basename='booking')
-router.register(r'reviews', views.ReviewViewSet, basename='review')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-    path('search/', views.SearchAPIView.as_view(), name='search'),
 ]
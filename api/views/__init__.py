@@ -1 +1,2 @@
 # API views package
+from .listings import ListingViewSet, UserViewSet
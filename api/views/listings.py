@@ -0,0 +1,55 @@
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from accounts.models import User
+from listings.models import Listing
+from bookings.pricing import attach_quotes
+from listings.filters import filter_listings, parse_stay
+from listings.facets import get_facets
+from ..pagination import ListingCursorPagination
+from ..serializers import UserSerializer, ListingSerializer
+
+class UserViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = User.objects.all()
+    serializer_class = UserSerializer
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+class ListingViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = Listing.objects.published().for_cards()
+    serializer_class = ListingSerializer
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = ListingCursorPagination
+    cursor_ordering = ('-created_at', '-id')
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        try:
+            queryset, self.cursor_ordering = filter_listings(queryset, self.request.query_params, strict=True)
+        except ValueError as exc:
+            raise ValidationError({'detail': str(exc)})
+        return queryset.order_by(*self.cursor_ordering)
+    
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        # Totals for the searched stay, priced for the whole page at once
+        stay = parse_stay(self.request.query_params)
+        if stay and page:
+            attach_quotes(page, *stay)
+        return page
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        # Desktop/mobile clients send their PlatformSettings.image_quality
+        context['image_quality'] = (
+            self.request.query_params.get('image_quality')
+            or self.request.headers.get('X-Image-Quality')
+            or 'medium'
+        )
+        return context
+    
+    @action(detail=False)
+    def facets(self, request):
+        """Facet counts for the current filter set"""
+        return Response(get_facets(request.query_params, self.get_queryset()))
@@ -0,0 +1,216 @@
+"""
+Host booking analytics from precomputed monthly rollups.
+
+``ListingMonthlyStats`` holds, per listing and calendar month, the booked
+nights and revenue of confirmed/active/completed stays (a stay crossing a
+month boundary is split night by night, its total spread pro rata), the
+number of confirmed bookings checking in that month and how many of those
+were cancelled. A booking counts as confirmed once it has ``confirmed_at``
+or a confirmed-or-later status, so expired unpaid requests do not show up as
+host cancellations.
+
+The Booking signals apply each save or delete as a delta: the booking's old
+contribution is subtracted and its new one added with ``F()`` updates, so
+the reports never scan Booking rows. ``rebuild`` recomputes the table from
+the bookings for repairs and backfills.
+"""
+import calendar
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from .availability import add_months
+from .models import Booking, ListingMonthlyStats
+from .pricing import money
+
+COUNTED_STATUSES = ('confirmed', 'active', 'completed')
+
+# Booking columns a contribution depends on, in ``BookingState`` order
+STATE_FIELDS = ('listing_id', 'status', 'check_in', 'check_out', 'total_price', 'confirmed_at')
+
+ROLLUP_FIELDS = ('booked_nights', 'revenue', 'bookings', 'cancellations')
+
+DEFAULT_MONTHS = 12
+MAX_MONTHS = 36
+
+
+def booking_state(booking):
+    return tuple(getattr(booking, field) for field in STATE_FIELDS)
+
+
+def stored_state(pk):
+    """The saved state of a booking, or None if it is not in the database yet"""
+    return Booking.objects.filter(pk=pk).values_list(*STATE_FIELDS).first()
+
+
+def month_nights(check_in, check_out):
+    """``[(month, nights)]`` of a stay, split at month boundaries"""
+    split = []
+    month = check_in.replace(day=1)
+    while month < check_out:
+        following = add_months(month, 1)
+        nights = (min(following, check_out) - max(month, check_in)).days
+        if nights > 0:
+            split.append((month, nights))
+        month = following
+    return split
+
+
+def add_contribution(deltas, state, sign=1):
+    """Add (or with ``sign=-1`` remove) one booking's share of the rollups to ``deltas``"""
+    listing_id, status, check_in, check_out, total_price, confirmed_at = state
+    if not check_in or not check_out or check_out <= check_in:
+        return deltas
+    was_confirmed = status in COUNTED_STATUSES or confirmed_at is not None
+    if not was_confirmed:
+        return deltas
+
+    arrival = deltas[(listing_id, check_in.replace(day=1))]
+    arrival['bookings'] += sign
+    if status == 'cancelled':
+        arrival['cancellations'] += sign
+    if status not in COUNTED_STATUSES:
+        return deltas
+
+    total = Decimal(total_price or 0)
+    nights = (check_out - check_in).days
+    allocated = Decimal('0')
+    split = month_nights(check_in, check_out)
+    for index, (month, month_total) in enumerate(split):
+        # The last month takes the rounding remainder so revenue adds up to the total
+        share = total - allocated if index == len(split) - 1 else money(total * month_total / nights)
+        allocated += share
+        row = deltas[(listing_id, month)]
+        row['booked_nights'] += sign * month_total
+        row['revenue'] += sign * share
+    return deltas
+
+
+def empty_deltas():
+    return defaultdict(lambda: {'booked_nights': 0, 'revenue': Decimal('0'), 'bookings': 0, 'cancellations': 0})
+
+
+def apply_deltas(deltas):
+    """Add ``{(listing_id, month): {field: delta}}`` to the rollup rows"""
+    with transaction.atomic():
+        # Sorted so concurrent writers touch rows in the same order
+        for (listing_id, month), values in sorted(deltas.items()):
+            changes = {field: value for field, value in values.items() if value}
+            if not changes:
+                continue
+            stats, _ = ListingMonthlyStats.objects.get_or_create(listing_id=listing_id, month=month)
+            ListingMonthlyStats.objects.filter(pk=stats.pk).update(
+                **{field: F(field) + value for field, value in changes.items()}
+            )
+
+
+def record_change(old_state, new_state):
+    """Apply the difference between a booking's stored and new state"""
+    deltas = empty_deltas()
+    if old_state is not None:
+        add_contribution(deltas, old_state, -1)
+    if new_state is not None:
+        add_contribution(deltas, new_state, 1)
+    apply_deltas(deltas)
+
+
+def rebuild(listing_ids=None, chunk_size=2000):
+    """Recompute the rollups from the bookings; returns the number of rows written"""
+    bookings = Booking.objects.order_by()
+    stats = ListingMonthlyStats.objects.all()
+    if listing_ids is not None:
+        bookings = bookings.filter(listing_id__in=listing_ids)
+        stats = stats.filter(listing_id__in=listing_ids)
+
+    deltas = empty_deltas()
+    for state in bookings.values_list(*STATE_FIELDS).iterator(chunk_size=chunk_size):
+        add_contribution(deltas, state)
+    rows = [
+        ListingMonthlyStats(listing_id=listing_id, month=month, **values)
+        for (listing_id, month), values in sorted(deltas.items())
+        if any(values.values())
+    ]
+    with transaction.atomic():
+        stats.delete()
+        ListingMonthlyStats.objects.bulk_create(rows, batch_size=chunk_size)
+    return len(rows)
+
+
+def parse_period(params, today=None):
+    """``(start, months)`` from ``?start=YYYY-MM&months=N``; defaults to the last 12 months"""
+    today = today or datetime.date.today()
+    months = int(params.get('months') or DEFAULT_MONTHS)
+    if not 1 <= months <= MAX_MONTHS:
+        raise ValueError(f'months must be between 1 and {MAX_MONTHS}')
+    if params.get('start'):
+        start = datetime.datetime.strptime(params['start'], '%Y-%m').date()
+    else:
+        start = add_months(today.replace(day=1), 1 - months)
+    return start, months
+
+
+def metrics(days, booked_nights, revenue, bookings, cancellations):
+    return {
+        'booked_nights': booked_nights,
+        'revenue': str(money(revenue)),
+        'occupancy': round(booked_nights / days, 4) if days else 0.0,
+        'adr': str(money(revenue / booked_nights)) if booked_nights else '0.00',
+        'bookings': bookings,
+        'cancellations': cancellations,
+        'cancellation_rate': round(cancellations / bookings, 4) if bookings else 0.0,
+    }
+
+
+def host_report(host, start, months, listings=None):
+    """
+    Occupancy, ADR, revenue and cancellation rate of a host's listings,
+    month by month and in total, read from the rollups only.
+    """
+    from listings.models import Listing
+
+    end = add_months(start, months)
+    month_list = [add_months(start, offset) for offset in range(months)]
+    days = {month: calendar.monthrange(month.year, month.month)[1] for month in month_list}
+    period_days = sum(days.values())
+
+    if listings is None:
+        listings = Listing.objects.filter(host=host)
+    listings = list(listings.order_by('title', 'pk').values_list('pk', 'uuid', 'title'))
+    rows = {
+        (row['listing_id'], row['month']): row
+        for row in ListingMonthlyStats.objects.filter(
+            listing_id__in=[pk for pk, _, _ in listings], month__gte=start, month__lt=end,
+        ).values('listing_id', 'month', *ROLLUP_FIELDS)
+    }
+
+    overall = dict.fromkeys(ROLLUP_FIELDS, 0)
+    report = []
+    for pk, listing_uuid, title in listings:
+        totals = dict.fromkeys(ROLLUP_FIELDS, 0)
+        month_metrics = []
+        for month in month_list:
+            row = rows.get((pk, month)) or dict.fromkeys(ROLLUP_FIELDS, 0)
+            for field in ROLLUP_FIELDS:
+                totals[field] += row[field]
+            month_metrics.append(dict(
+                metrics(days[month], *(row[field] for field in ROLLUP_FIELDS)),
+                month=month.strftime('%Y-%m'),
+            ))
+        for field in ROLLUP_FIELDS:
+            overall[field] += totals[field]
+        report.append({
+            'listing': str(listing_uuid),
+            'title': title,
+            'months': month_metrics,
+            'totals': metrics(period_days, *(totals[field] for field in ROLLUP_FIELDS)),
+        })
+
+    return {
+        'start': start.strftime('%Y-%m'),
+        'months': months,
+        'listings': report,
+        'totals': metrics(period_days * len(listings), *(overall[field] for field in ROLLUP_FIELDS)),
+    }
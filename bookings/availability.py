@@ -0,0 +1,171 @@
+"""
+Availability calendar per listing.
+
+A listing's booked nights are kept as a sorted list of merged, half-open
+``[first_night, checkout)`` intervals of date ordinals, covering its blocking
+bookings and the ranges blocked by imported calendars (bookings.ical). It is
+built with two queries, cached, and dropped whenever one of the listing's
+bookings or blocked ranges changes (see bookings.signals). Range checks are a binary search over that
+list and the date picker gets a whole year as one bitmap, so browsing dates
+no longer costs a query per check.
+"""
+import datetime
+from bisect import bisect_right
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+# Bookings in these states hold their nights
+BLOCKING_STATUSES = ('pending', 'confirmed', 'active')
+
+CALENDAR_CACHE_TIMEOUT = 3600
+
+# Nights further back than this are not worth keeping in the calendar
+HISTORY_DAYS = 31
+
+
+def calendar_cache_key(listing_id):
+    return f'bookings:calendar:{listing_id}'
+
+
+def merge_intervals(intervals):
+    """Sort and merge overlapping or touching ``(start, end)`` intervals"""
+    merged = []
+    for start, end in sorted(intervals):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+class ListingCalendar:
+    """Booked nights of one listing"""
+
+    def __init__(self, listing_id, intervals):
+        self.listing_id = listing_id
+        self.intervals = merge_intervals(intervals)
+        self.starts = [start for start, _ in self.intervals]
+        self.ends = [end for _, end in self.intervals]
+
+    @classmethod
+    def from_database(cls, listing_id):
+        from .models import BlockedRange, Booking
+
+        since = timezone.now().date() - datetime.timedelta(days=HISTORY_DAYS)
+        rows = list(Booking.objects.filter(
+            listing_id=listing_id,
+            status__in=BLOCKING_STATUSES,
+            check_out__gt=since,
+        ).values_list('check_in', 'check_out'))
+        rows += BlockedRange.objects.filter(
+            listing_id=listing_id,
+            end_date__gt=since,
+        ).values_list('start_date', 'end_date')
+        return cls(listing_id, [(check_in.toordinal(), check_out.toordinal()) for check_in, check_out in rows])
+
+    def is_available(self, check_in, check_out):
+        """True if no night from ``check_in`` up to ``check_out`` is booked"""
+        first, last = check_in.toordinal(), check_out.toordinal()
+        # First interval ending after check-in; intervals are disjoint so ends are sorted
+        index = bisect_right(self.ends, first)
+        return index == len(self.intervals) or self.starts[index] >= last
+
+    def bitmap(self, start, days):
+        """One character per night from ``start``: ``1`` booked, ``0`` free"""
+        first = start.toordinal()
+        last = first + days
+        nights = bytearray(b'0' * days)
+        index = bisect_right(self.ends, first)
+        for booked_start, booked_end in self.intervals[index:]:
+            if booked_start >= last:
+                break
+            low, high = max(booked_start, first) - first, min(booked_end, last) - first
+            nights[low:high] = b'1' * (high - low)
+        return nights.decode('ascii')
+
+
+def get_calendar(listing_id):
+    """The cached calendar of a listing, built on first use"""
+    key = calendar_cache_key(listing_id)
+    intervals = cache.get(key)
+    if intervals is not None:
+        return ListingCalendar(listing_id, intervals)
+    calendar = ListingCalendar.from_database(listing_id)
+    cache.set(key, calendar.intervals, CALENDAR_CACHE_TIMEOUT)
+    return calendar
+
+
+def is_available(listing_id, check_in, check_out):
+    return get_calendar(listing_id).is_available(check_in, check_out)
+
+
+def overlapping_bookings(listing_id, check_in, check_out, exclude=None):
+    """Blocking bookings of a listing that share a night with the stay"""
+    from .models import Booking
+
+    bookings = Booking.objects.filter(
+        listing_id=listing_id,
+        status__in=BLOCKING_STATUSES,
+        check_in__lt=check_out,
+        check_out__gt=check_in,
+    )
+    if exclude is not None:
+        bookings = bookings.exclude(pk=exclude)
+    return bookings
+
+
+def blocked_ranges(listing_id, check_in, check_out):
+    """Imported blocked ranges of a listing that share a night with the stay"""
+    from .models import BlockedRange
+
+    return BlockedRange.objects.filter(
+        listing_id=listing_id,
+        start_date__lt=check_out,
+        end_date__gt=check_in,
+    )
+
+
+def nights_taken(listing_id, check_in, check_out, exclude=None):
+    """True if a blocking booking (other than ``exclude``) or a blocked range overlaps the stay"""
+    return (
+        overlapping_bookings(listing_id, check_in, check_out, exclude).exists()
+        or blocked_ranges(listing_id, check_in, check_out).exists()
+    )
+
+
+def booked_between(check_in, check_out, listing_ref='pk'):
+    """
+    Condition that is true for listings with a blocking booking or a blocked
+    range overlapping the stay; negated it is an anti-join on the
+    (listing, check_in, check_out) and (listing, start_date, end_date) indexes.
+    """
+    from .models import BlockedRange, Booking
+
+    return Exists(Booking.objects.filter(
+        listing=OuterRef(listing_ref),
+        status__in=BLOCKING_STATUSES,
+        check_in__lt=check_out,
+        check_out__gt=check_in,
+    )) | Exists(BlockedRange.objects.filter(
+        listing=OuterRef(listing_ref),
+        start_date__lt=check_out,
+        end_date__gt=check_in,
+    ))
+
+
+def invalidate_calendar(listing_id):
+    """Drop a listing's calendar now and again once the transaction commits"""
+    key = calendar_cache_key(listing_id)
+    cache.delete(key)
+    # A request could rebuild it from pre-commit data in between
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return day.replace(year=day.year + month // 12, month=month % 12 + 1, day=1)
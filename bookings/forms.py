@@ -2,6 +2,8 @@ from django import forms
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 import datetime
+from .availability import is_available
+from .pricing import quote
 from .models import Booking, Listing, BookingChangeRequest
 
 
@@ -75,6 +77,10 @@ class BookingForm(forms.ModelForm):
             # Check maximum stay if set
             if self.listing and self.listing.maximum_stay and nights > self.listing.maximum_stay:
                 raise ValidationError(f'Maximum stay is {self.listing.maximum_stay} nights.')
+            
+            # Early answer from the calendar; create_booking re-checks under a lock
+            if self.listing and not is_available(self.listing.pk, check_in, check_out):
+                raise ValidationError('Those dates are not available.')
         
         if guests and self.listing:
             # Check capacity
@@ -83,36 +89,15 @@ class BookingForm(forms.ModelForm):
         
         return cleaned_data
     
+    def get_quote(self):
+        """Quote for the cleaned dates (see bookings.pricing)"""
+        return quote(self.listing, self.cleaned_data['check_in'], self.cleaned_data['check_out'])
+    
     def calculate_total_price(self):
-        """Calculate total price based on dates and listing price"""
+        """Price breakdown for the cleaned dates"""
         if not self.listing or not self.cleaned_data.get('check_in') or not self.cleaned_data.get('check_out'):
-            return 0
-        
-        check_in = self.cleaned_data['check_in']
-        check_out = self.cleaned_data['check_out']
-        
-        # Calculate number of nights
-        nights = (check_out - check_in).days
-        if nights < 1:
-            nights = 1
-        
-        # Base price (using price_per_day as nightly rate)
-        base_price = self.listing.price_per_day * nights
-        
-        # For now, no cleaning fee in the model - could add later
-        cleaning_fee = 0
-        
-        # Add service fee (10%)
-        service_fee = (base_price + cleaning_fee) * 0.10
-        total = base_price + cleaning_fee + service_fee
-        
-        return {
-            'nights': nights,
-            'base_price': float(base_price),
-            'cleaning_fee': float(cleaning_fee),
-            'service_fee': float(service_fee),
-            'total': round(float(total), 2)
-        }
+            return {}
+        return self.get_quote().as_dict()
 
 
 class BookingChangeRequestForm(forms.ModelForm):
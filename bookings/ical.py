@@ -0,0 +1,205 @@
+"""
+iCalendar availability feeds.
+
+Export: each listing has an ``.ics`` feed of its blocking bookings (imported
+ranges are left out so two platforms syncing each other do not echo blocks
+back). The generated feed is cached with its ETag and generation time and
+only rebuilt after ``invalidate_feed``, which the Booking signals and the
+lifecycle sweeper call for the listing whose bookings changed. The view
+answers ``If-None-Match``/``If-Modified-Since`` with 304 from the cache.
+
+Import: external feeds are read line by line, unfolded and parsed into
+``(uid, start, end, summary)`` tuples without holding the document in memory.
+``import_feed`` then replaces the ``BlockedRange`` rows of that listing and
+source in one short transaction; the availability calendar, the booking
+overlap check and the search anti-join all treat them as booked. Only
+all-day and timed ``VEVENT`` dates are read; recurrence rules are ignored.
+"""
+import datetime
+import hashlib
+import time
+from urllib.request import Request, urlopen
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from listings.cache import invalidate_stays
+from .availability import BLOCKING_STATUSES, HISTORY_DAYS, invalidate_calendar
+
+PRODID = '-//Rentala//Availability//EN'
+
+FEED_CACHE_TIMEOUT = 24 * 3600
+
+FETCH_TIMEOUT = 30
+
+# RFC 5545 lines are folded at 75 octets
+LINE_LIMIT = 75
+
+
+def feed_cache_key(listing_id):
+    return f'bookings:ical:{listing_id}'
+
+
+def escape(text):
+    return (
+        text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+    )
+
+
+def fold(line):
+    encoded = line.encode('utf-8')
+    if len(encoded) <= LINE_LIMIT:
+        return line
+    parts = []
+    while encoded:
+        limit = LINE_LIMIT if not parts else LINE_LIMIT - 1
+        # Do not split a multi-byte character
+        while limit < len(encoded) and (encoded[limit] & 0xC0) == 0x80:
+            limit -= 1
+        parts.append(encoded[:limit].decode('utf-8'))
+        encoded = encoded[limit:]
+    return '\r\n '.join(parts)
+
+
+def build_feed(listing):
+    """The ``.ics`` document of a listing's blocking bookings"""
+    from .models import Booking
+
+    since = timezone.now().date() - datetime.timedelta(days=HISTORY_DAYS)
+    bookings = Booking.objects.filter(
+        listing_id=listing.pk,
+        status__in=BLOCKING_STATUSES,
+        check_out__gt=since,
+    ).order_by('check_in', 'pk').values_list('pk', 'check_in', 'check_out', 'updated_at')
+
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape(listing.title)}',
+    ]
+    for pk, check_in, check_out, updated_at in bookings:
+        lines += [
+            'BEGIN:VEVENT',
+            f'UID:{pk}@rentala',
+            f'DTSTAMP:{updated_at.astimezone(datetime.timezone.utc):%Y%m%dT%H%M%SZ}',
+            f'DTSTART;VALUE=DATE:{check_in:%Y%m%d}',
+            f'DTEND;VALUE=DATE:{check_out:%Y%m%d}',
+            'SUMMARY:Reserved',
+            'END:VEVENT',
+        ]
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(fold(line) for line in lines) + '\r\n'
+
+
+def get_feed(listing):
+    """``{'body', 'etag', 'last_modified'}`` of a listing's feed, generated on first use"""
+    key = feed_cache_key(listing.pk)
+    feed = cache.get(key)
+    if feed is None:
+        body = build_feed(listing)
+        feed = {
+            'body': body,
+            'etag': '"%s"' % hashlib.sha256(body.encode('utf-8')).hexdigest()[:32],
+            'last_modified': int(time.time()),
+        }
+        cache.set(key, feed, FEED_CACHE_TIMEOUT)
+    return feed
+
+
+def invalidate_feed(listing_id):
+    """Drop a listing's feed now and again once the transaction commits"""
+    key = feed_cache_key(listing_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def unfold(lines):
+    """Logical lines of a feed, joining folded continuation lines"""
+    current = None
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def parse_date(value):
+    """Date part of ``20310105`` or ``20310105T140000Z``"""
+    return datetime.datetime.strptime(value[:8], '%Y%m%d').date()
+
+
+def parse_events(lines):
+    """Yield ``(uid, start, end, summary)`` for each VEVENT, one line at a time"""
+    event = None
+    for line in unfold(lines):
+        name, _, value = line.partition(':')
+        name = name.partition(';')[0].upper()
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            event = {}
+        elif event is None:
+            continue
+        elif name == 'END' and value.upper() == 'VEVENT':
+            start = event.get('DTSTART')
+            if start:
+                end = event.get('DTEND')
+                if not end or end <= start:
+                    end = start + datetime.timedelta(days=1)
+                yield event.get('UID', ''), start, end, event.get('SUMMARY', '')
+            event = None
+        elif name in ('DTSTART', 'DTEND'):
+            try:
+                event[name] = parse_date(value)
+            except ValueError:
+                pass
+        elif name in ('UID', 'SUMMARY'):
+            event[name] = value.replace('\\,', ',').replace('\\;', ';')
+
+
+def open_feed(source):
+    """Line iterator over a feed URL or local file; close it when done"""
+    if source.startswith(('http://', 'https://')):
+        return urlopen(Request(source, headers={'User-Agent': 'Rentala calendar sync'}), timeout=FETCH_TIMEOUT)
+    return open(source, encoding='utf-8', errors='replace', newline='')
+
+
+def import_feed(listing_id, source, lines, batch_size=1000):
+    """Replace a listing's blocked ranges from one feed; returns how many were stored"""
+    from .models import BlockedRange
+
+    today = timezone.now().date()
+    # Only compact tuples are kept while the feed is read; past events are dropped
+    events = [
+        (uid[:255], start, end, summary[:255])
+        for uid, start, end, summary in parse_events(lines)
+        if end > today
+    ]
+    with transaction.atomic():
+        BlockedRange.objects.filter(listing_id=listing_id, source=source).delete()
+        BlockedRange.objects.bulk_create(
+            (
+                BlockedRange(
+                    listing_id=listing_id,
+                    source=source,
+                    uid=uid,
+                    start_date=start,
+                    end_date=end,
+                    summary=summary,
+                )
+                for uid, start, end, summary in events
+            ),
+            batch_size=batch_size,
+        )
+        invalidate_calendar(listing_id)
+    invalidate_stays()
+    return len(events)
@@ -0,0 +1,157 @@
+"""
+Set-based booking lifecycle sweeper.
+
+Moves bookings along with plain ``UPDATE ... WHERE pk IN (chunk) AND <rule>``
+statements instead of per-object saves:
+
+* ``activate`` - confirmed stays that have started become ``active``
+* ``complete`` - confirmed/active stays that have ended become ``completed``
+* ``expire``   - unpaid ``pending`` bookings older than
+  ``BOOKING_PENDING_EXPIRY_HOURS`` (or whose check-in has passed) are cancelled
+
+Each chunk is selected by the rule, updated in its own short transaction with
+the rule repeated in the ``WHERE`` clause, notified in bulk and applied to the
+host analytics rollups (bookings.analytics) as one set of deltas. Rows that
+were already moved no longer match, so the sweep is idempotent and safe to
+run concurrently or again after a crash.
+"""
+import datetime
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from listings.cache import invalidate_stays
+from .analytics import STATE_FIELDS, add_contribution, apply_deltas, empty_deltas
+from .availability import invalidate_calendar
+from .ical import invalidate_feed
+from .models import Booking
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class Transition:
+
+    def __init__(self, name, rule, values, title, message):
+        self.name = name
+        self.rule = rule
+        self.values = values
+        self.title = title
+        self.message = message
+
+
+def transitions(now=None):
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    expiry_hours = getattr(settings, 'BOOKING_PENDING_EXPIRY_HOURS', 24)
+    return [
+        Transition(
+            'activate',
+            Q(status='confirmed', check_in__lte=today, check_out__gt=today),
+            {'status': 'active', 'confirmed_at': Coalesce(F('confirmed_at'), now)},
+            'Your stay has started',
+            'Enjoy your stay at {title}.',
+        ),
+        Transition(
+            'complete',
+            Q(status__in=('confirmed', 'active'), check_out__lte=today),
+            {'status': 'completed'},
+            'Your stay is complete',
+            'Your stay at {title} is complete. How was it? Leave a review.',
+        ),
+        Transition(
+            'expire',
+            Q(status='pending') & ~Q(payment_status='paid') & (
+                Q(created_at__lt=now - datetime.timedelta(hours=expiry_hours)) | Q(check_in__lte=today)
+            ),
+            {'status': 'cancelled', 'cancelled_at': now},
+            'Booking request expired',
+            'Your booking request for {title} expired before it was paid.',
+        ),
+    ]
+
+
+def notify(transition, rows):
+    """One bulk insert of guest notifications for the rows a chunk moved"""
+    if not rows or not apps.is_installed('notifications'):
+        return
+    from notifications.models import Notification
+    from notifications.services import NotificationService
+
+    NotificationService.create_bulk_notifications([
+        Notification(
+            user_id=user_id,
+            title=transition.title,
+            message=transition.message.format(title=title),
+            notification_type='booking',
+            related_object_type='Booking',
+            related_object_id=str(booking_id),
+            data={'booking_id': str(booking_id), 'status': transition.values['status']},
+        )
+        for booking_id, user_id, _, title in rows
+    ])
+
+
+def record_rollups(transition, states, now):
+    """Rollup deltas of a moved chunk; ``.update()`` skips the Booking signals"""
+    deltas = empty_deltas()
+    status = transition.values['status']
+    for state in states:
+        listing_id, _, check_in, check_out, total_price, confirmed_at = state
+        if 'confirmed_at' in transition.values:
+            confirmed_at = confirmed_at or now
+        add_contribution(deltas, state, -1)
+        add_contribution(deltas, (listing_id, status, check_in, check_out, total_price, confirmed_at))
+    apply_deltas(deltas)
+
+
+def apply_transition(transition, now, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+    """Apply one transition chunk by chunk; returns the number of bookings moved"""
+    matching = Booking.objects.filter(transition.rule).order_by()
+    if dry_run:
+        return matching.count()
+
+    moved = 0
+    while True:
+        selected = list(
+            matching.values_list('pk', 'user_id', 'listing_id', 'listing__title', *STATE_FIELDS)[:chunk_size]
+        )
+        if not selected:
+            return moved
+        rows = [row[:4] for row in selected]
+        ids = [row[0] for row in rows]
+        with transaction.atomic():
+            updated = Booking.objects.filter(transition.rule, pk__in=ids).update(
+                updated_at=now, **transition.values
+            )
+            if updated != len(ids):
+                # Someone else moved some of them; notify only for what this run changed
+                changed = set(
+                    Booking.objects.filter(pk__in=ids, status=transition.values['status'], updated_at=now)
+                    .values_list('pk', flat=True)
+                )
+                rows = [row for row in rows if row[0] in changed]
+                selected = [row for row in selected if row[0] in changed]
+            notify(transition, rows)
+            record_rollups(transition, [row[4:] for row in selected], now)
+        for listing_id in {row[2] for row in rows}:
+            invalidate_calendar(listing_id)
+            invalidate_feed(listing_id)
+        moved += updated
+
+
+def sweep(chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False, now=None):
+    """Run every transition; returns ``{name: count}`` plus ``seconds``"""
+    now = now or timezone.now()
+    started = time.perf_counter()
+    results = {}
+    for transition in transitions(now):
+        results[transition.name] = apply_transition(transition, now, chunk_size, dry_run)
+    if not dry_run and any(results.values()):
+        invalidate_stays()
+    results['seconds'] = round(time.perf_counter() - started, 3)
+    return results
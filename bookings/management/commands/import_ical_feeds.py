@@ -0,0 +1,77 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from bookings.ical import import_feed, open_feed
+from listings.models import Listing
+
+
+class Command(BaseCommand):
+    help = 'Import external iCalendar feeds as blocked date ranges'
+
+    def add_arguments(self, parser):
+        parser.add_argument('feeds', nargs='?',
+                            help='File with one "<listing uuid> <feed url or path>" per line')
+        parser.add_argument('--listing', help='Listing uuid, with --source')
+        parser.add_argument('--source', help='Feed URL or file path, with --listing')
+        parser.add_argument('--workers', type=int, default=4, help='Feeds fetched at the same time')
+
+    def parse_listing(self, value, where):
+        try:
+            return uuid.UUID(value)
+        except ValueError:
+            raise CommandError(f'{where}: invalid listing uuid {value!r}')
+
+    def read_feeds(self, options):
+        if options['listing'] and options['source']:
+            return [(self.parse_listing(options['listing'], '--listing'), options['source'])]
+        if not options['feeds']:
+            raise CommandError('Give a feeds file or --listing with --source')
+        feeds = []
+        with open(options['feeds'], encoding='utf-8') as handle:
+            for number, line in enumerate(handle, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                parts = line.split(None, 1)
+                if len(parts) != 2:
+                    raise CommandError(f'Line {number}: expected "<listing uuid> <feed>"')
+                feeds.append((self.parse_listing(parts[0], f'Line {number}'), parts[1]))
+        return feeds
+
+    def import_one(self, listing_id, source):
+        try:
+            with closing(open_feed(source)) as lines:
+                return import_feed(listing_id, source, lines), None
+        except (OSError, ValueError) as exc:
+            return None, exc
+        finally:
+            close_old_connections()
+
+    def handle(self, *args, **options):
+        feeds = self.read_feeds(options)
+        listings = dict(
+            Listing.objects.filter(uuid__in={listing for listing, _ in feeds}).values_list('uuid', 'pk')
+        )
+        jobs = []
+        for listing, source in feeds:
+            if listing in listings:
+                jobs.append((listings[listing], source))
+            else:
+                self.stderr.write(f'Unknown listing {listing}')
+
+        imported = failed = 0
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as executor:
+            results = executor.map(lambda job: self.import_one(*job), jobs)
+            for (listing_id, source), (count, error) in zip(jobs, results):
+                if error is not None:
+                    failed += 1
+                    self.stderr.write(f'{source}: {error}')
+                else:
+                    imported += count
+                    self.stdout.write(f'{source}: {count} blocked ranges')
+        self.stdout.write(f'Imported {imported} blocked ranges from {len(jobs) - failed} feeds, {failed} failed')
+
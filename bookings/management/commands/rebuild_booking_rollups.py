@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bookings.analytics import rebuild
+from listings.models import Listing
+
+
+class Command(BaseCommand):
+    help = 'Recompute the host analytics monthly rollups from the bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listing', action='append', default=[],
+                            help='Only rebuild this listing (uuid); may be repeated')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        listing_ids = None
+        if options['listing']:
+            listing_ids = list(Listing.objects.filter(uuid__in=options['listing']).values_list('pk', flat=True))
+            if len(listing_ids) != len(set(options['listing'])):
+                raise CommandError('Unknown listing')
+
+        started = time.perf_counter()
+        rows = rebuild(listing_ids, chunk_size=options['chunk_size'])
+        self.stdout.write(f'Wrote {rows} monthly rollups in {time.perf_counter() - started:.1f}s')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from bookings.lifecycle import DEFAULT_CHUNK_SIZE, sweep
+
+
+class Command(BaseCommand):
+    help = 'Activate, complete and expire bookings in set-based chunks (safe to run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Only count the bookings that would move')
+
+    def handle(self, *args, **options):
+        results = sweep(chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(
+            f"{verb}: {results['activate']} activated, {results['complete']} completed, "
+            f"{results['expire']} expired in {results['seconds']}s"
+        )
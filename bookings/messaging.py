@@ -0,0 +1,107 @@
+"""
+Booking message threads.
+
+Every participant of a booking's conversation (the guest and the host) has a
+``BookingThread`` row holding their unread count and the thread's last
+message. Counters move with single ``F()`` updates: a new message bumps the
+receiver's count (bookings.signals), and ``mark_read`` subtracts exactly the
+rows it flipped, so concurrent sends and reads never lose an update. The
+inbox is then one keyset-paginated query over the threads, and a thread's
+messages page over the ``(booking, created_at, id)`` index.
+"""
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Greatest
+
+from core.pagination import keyset_paginate
+from .models import BookingMessage, BookingThread
+
+INBOX_ORDERING = ('-last_message_at', '-id')
+MESSAGE_ORDERING = ('-created_at', '-id')
+
+PAGE_SIZE = 20
+
+
+def participants(booking):
+    return booking.user_id, booking.listing.host_id
+
+
+def can_message(booking, user):
+    return user.pk in participants(booking)
+
+
+def send_message(booking, sender, text):
+    """Create a message from one participant to the other"""
+    guest_id, host_id = participants(booking)
+    receiver_id = host_id if sender.pk == guest_id else guest_id
+    return BookingMessage.objects.create(
+        booking=booking, sender=sender, receiver_id=receiver_id, message=text,
+    )
+
+
+def record_message(message):
+    """Point both participants' threads at a new message and count it as unread for the receiver"""
+    with transaction.atomic():
+        # Same order for every writer so two sends cannot deadlock
+        for user_id in sorted({message.sender_id, message.receiver_id}):
+            thread, _ = BookingThread.objects.get_or_create(booking_id=message.booking_id, participant_id=user_id)
+            threads = BookingThread.objects.filter(pk=thread.pk)
+            if user_id == message.receiver_id and user_id != message.sender_id:
+                threads.update(unread_count=F('unread_count') + 1)
+            # A send that commits late must not replace a newer last message
+            threads.filter(
+                Q(last_message__isnull=True)
+                | Q(last_message__created_at__lt=message.created_at)
+                | Q(last_message__created_at=message.created_at, last_message_id__lt=message.pk)
+            ).update(last_message=message, last_message_at=message.created_at)
+
+
+def mark_read(booking, user):
+    """Mark the user's unread messages of a booking as read; returns how many"""
+    with transaction.atomic():
+        count = BookingMessage.objects.filter(booking=booking, receiver=user, is_read=False).update(is_read=True)
+        if count:
+            BookingThread.objects.filter(booking=booking, participant=user).update(
+                unread_count=Greatest(F('unread_count') - count, 0)
+            )
+    return count
+
+
+def unread_total(user):
+    return BookingThread.objects.filter(participant=user).aggregate(total=Sum('unread_count'))['total'] or 0
+
+
+def inbox(user, cursor=None, page_size=PAGE_SIZE):
+    """A page of the user's threads, newest activity first, with last message and unread count"""
+    threads = BookingThread.objects.filter(
+        participant=user, last_message_at__isnull=False,
+    ).select_related('booking__listing', 'last_message__sender')
+    return keyset_paginate(threads, cursor, page_size, INBOX_ORDERING)
+
+
+def thread_messages(booking, cursor=None, page_size=PAGE_SIZE):
+    """A page of a booking's messages, newest first"""
+    messages = BookingMessage.objects.filter(booking=booking).select_related('sender')
+    return keyset_paginate(messages, cursor, page_size, MESSAGE_ORDERING)
+
+
+def message_dict(message):
+    return {
+        'id': str(message.id),
+        'sender': message.sender.get_full_name() or message.sender.email,
+        'sender_id': message.sender_id,
+        'message': message.message,
+        'is_read': message.is_read,
+        'created_at': message.created_at.isoformat(),
+    }
+
+
+def thread_dict(thread):
+    return {
+        'booking': str(thread.booking_id),
+        'listing': thread.booking.listing.title,
+        'check_in': thread.booking.check_in.isoformat(),
+        'check_out': thread.booking.check_out.isoformat(),
+        'unread_count': thread.unread_count,
+        'last_message': message_dict(thread.last_message) if thread.last_message else None,
+    }
@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-17 19:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0007_pricing_rules'),
+        ('bookings', '0002_lifecycle_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingMonthlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('booked_nights', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('bookings', models.IntegerField(default=0)),
+                ('cancellations', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_stats', to='listings.listing')),
+            ],
+            options={
+                'verbose_name_plural': 'Listing monthly stats',
+                'ordering': ['listing', 'month'],
+                'unique_together': {('listing', 'month')},
+            },
+        ),
+    ]
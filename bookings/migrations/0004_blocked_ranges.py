@@ -0,0 +1,39 @@
+# Generated by Django 4.2 on 2026-10-17 20:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0007_pricing_rules'),
+        ('bookings', '0003_listing_monthly_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlockedRange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField(help_text='Exclusive, like a check-out date')),
+                ('source', models.CharField(max_length=500)),
+                ('uid', models.CharField(blank=True, max_length=255)),
+                ('summary', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocked_ranges', to='listings.listing')),
+            ],
+            options={
+                'ordering': ['listing', 'start_date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='blockedrange',
+            index=models.Index(fields=['listing', 'start_date', 'end_date'], name='bookings_bl_listing_5c3378_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blockedrange',
+            index=models.Index(fields=['listing', 'source'], name='bookings_bl_listing_719600_idx'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 4.2 on 2026-10-17 20:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_threads(apps, schema_editor):
+    """Threads for existing messages: unread counts and last message per participant"""
+    BookingMessage = apps.get_model('bookings', 'BookingMessage')
+    BookingThread = apps.get_model('bookings', 'BookingThread')
+    
+    threads = {}
+    for message in BookingMessage.objects.order_by('created_at', 'id').iterator():
+        for user_id in {message.sender_id, message.receiver_id}:
+            thread = threads.setdefault(
+                (message.booking_id, user_id),
+                BookingThread(booking_id=message.booking_id, participant_id=user_id),
+            )
+            thread.last_message_id = message.id
+            thread.last_message_at = message.created_at
+            if user_id == message.receiver_id and user_id != message.sender_id and not message.is_read:
+                thread.unread_count += 1
+    BookingThread.objects.bulk_create(threads.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('bookings', '0004_blocked_ranges'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingThread',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread_count', models.IntegerField(default=0)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='bookingmessage',
+            index=models.Index(fields=['booking', 'created_at', 'id'], name='bookings_bo_booking_8e2bc2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookingmessage',
+            index=models.Index(fields=['booking', 'receiver', 'is_read'], name='bookings_bo_booking_930aa7_idx'),
+        ),
+        migrations.AddField(
+            model_name='bookingthread',
+            name='booking',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='threads', to='bookings.booking'),
+        ),
+        migrations.AddField(
+            model_name='bookingthread',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='bookings.bookingmessage'),
+        ),
+        migrations.AddField(
+            model_name='bookingthread',
+            name='participant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_threads', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='bookingthread',
+            index=models.Index(fields=['participant', 'last_message_at', 'id'], name='bookings_bo_partici_0156a1_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='bookingthread',
+            unique_together={('booking', 'participant')},
+        ),
+        migrations.RunPython(backfill_threads, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 import uuid
+from decimal import Decimal
 from listings.models import Listing
 
 
@@ -62,6 +63,9 @@ class Booking(models.Model):
             models.Index(fields=['user', 'status']),
             models.Index(fields=['listing', 'check_in', 'check_out']),
             models.Index(fields=['payment_status']),
+            # Lifecycle sweeps (see bookings.lifecycle)
+            models.Index(fields=['status', 'check_out']),
+            models.Index(fields=['status', 'created_at']),
         ]
     
     def __str__(self):
@@ -160,6 +164,27 @@ class BookingChangeRequest(models.Model):
     
     def __str__(self):
         return f"Change request for {self.booking}"
+    
+    @property
+    def new_check_in(self):
+        return self.requested_check_in or self.booking.check_in
+    
+    @property
+    def new_check_out(self):
+        return self.requested_check_out or self.booking.check_out
+    
+    def calculate_price_adjustment(self):
+        """Quoted total of the requested stay minus what the booking costs now"""
+        from .pricing import quote
+        if self.new_check_out <= self.new_check_in:
+            return Decimal('0.00')
+        return quote(self.booking.listing, self.new_check_in, self.new_check_out).total - self.booking.total_price
+    
+    def save(self, *args, **kwargs):
+        # Keep the adjustment in step with the requested dates until it is answered
+        if self.status == 'pending' and self.booking_id:
+            self.price_adjustment = self.calculate_price_adjustment()
+        super().save(*args, **kwargs)
 
 
 class BookingMessage(models.Model):
@@ -188,6 +213,109 @@ class BookingMessage(models.Model):
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Thread pages (see bookings.messaging)
+            models.Index(fields=['booking', 'created_at', 'id']),
+            models.Index(fields=['booking', 'receiver', 'is_read']),
+        ]
     
     def __str__(self):
         return f"Message from {self.sender} about {self.booking}"
+
+
+class BookingThread(models.Model):
+    """
+    One participant's view of a booking's message thread: the denormalized
+    unread count and last message behind the inbox (see bookings.messaging).
+    """
+    
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        related_name='threads'
+    )
+    participant = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='booking_threads'
+    )
+    unread_count = models.IntegerField(default=0)
+    last_message = models.ForeignKey(
+        BookingMessage,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        unique_together = ['booking', 'participant']
+        indexes = [
+            models.Index(fields=['participant', 'last_message_at', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.participant} in {self.booking}"
+
+
+class ListingMonthlyStats(models.Model):
+    """
+    Per listing, per calendar month booking rollup behind host analytics.
+    
+    Kept up to date by the Booking signals (see bookings.analytics) and
+    rebuildable with ``manage.py rebuild_booking_rollups``.
+    """
+    
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name='monthly_stats'
+    )
+    month = models.DateField(help_text="First day of the month")
+    
+    # Nights and revenue of confirmed/active/completed stays falling in the month
+    booked_nights = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Confirmed bookings checking in during the month, and how many of them were cancelled
+    bookings = models.IntegerField(default=0)
+    cancellations = models.IntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['listing', 'month']
+        unique_together = ['listing', 'month']
+        verbose_name_plural = 'Listing monthly stats'
+    
+    def __str__(self):
+        return f"{self.listing.title} {self.month:%Y-%m}"
+
+
+class BlockedRange(models.Model):
+    """Nights blocked by an imported external calendar (see bookings.ical)"""
+    
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name='blocked_ranges'
+    )
+    start_date = models.DateField()
+    end_date = models.DateField(help_text="Exclusive, like a check-out date")
+    
+    # Feed the range came from; a re-import replaces the ranges of that feed
+    source = models.CharField(max_length=500)
+    uid = models.CharField(max_length=255, blank=True)
+    summary = models.CharField(max_length=255, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['listing', 'start_date']
+        indexes = [
+            models.Index(fields=['listing', 'start_date', 'end_date']),
+            models.Index(fields=['listing', 'source']),
+        ]
+    
+    def __str__(self):
+        return f"{self.listing.title} blocked {self.start_date} to {self.end_date}"
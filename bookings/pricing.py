@@ -0,0 +1,233 @@
+"""
+Pricing engine for quotes, bookings and change requests.
+
+All amounts are Decimals rounded half-up to cents; nothing goes through
+floats. Each night of a stay is charged:
+
+1. a seasonal rate covering the night (``listings.SeasonalRate``) wins,
+2. otherwise Friday and Saturday nights use ``weekend_price_per_day`` if set,
+3. otherwise ``price_per_day``.
+
+The nights are not walked one by one: each seasonal rate is charged for its
+overlap with the stay, and the nights left over are split into weekday and
+weekend counts arithmetically, so a quote costs the same for a weekend as
+for a year. Stays longer than ``MAX_STAY_NIGHTS`` are rejected by the views
+that accept dates (``validate_stay``).
+
+The nightly subtotal then gets the listing's weekly (7+ nights) or monthly
+(28+ nights) discount, the cleaning fee, and the platform service fee.
+
+``quote_batch`` prices any number of (listing, check_in, check_out) stays
+with a single query for the seasonal rates, so a page of search results can
+show totals for every card at once.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+CENTS = Decimal('0.01')
+
+# Nights that start on Friday (4) or Saturday (5)
+WEEKEND_NIGHTS = (4, 5)
+
+WEEKLY_NIGHTS = 7
+MONTHLY_NIGHTS = 28
+
+# Longest stay a search or quote accepts; listings may set a lower maximum_stay
+MAX_STAY_NIGHTS = 365
+
+
+def money(value):
+    return Decimal(value).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def service_fee_rate():
+    return Decimal(str(getattr(settings, 'BOOKING_SERVICE_FEE_RATE', '0.10')))
+
+
+def validate_stay(check_in, check_out):
+    """Raise ValueError unless the dates are a stay that can be searched or quoted"""
+    if check_out <= check_in:
+        raise ValueError('check_out must be after check_in')
+    if check_in < timezone.localdate():
+        raise ValueError('check_in must not be in the past')
+    if (check_out - check_in).days > MAX_STAY_NIGHTS:
+        raise ValueError(f'Stays are at most {MAX_STAY_NIGHTS} nights')
+
+
+def weekend_nights(check_in, check_out):
+    """Friday and Saturday nights between the dates, counted without walking them"""
+    weeks, rest = divmod((check_out - check_in).days, 7)
+    first = check_in.weekday()
+    return weeks * len(WEEKEND_NIGHTS) + sum(
+        1 for offset in range(rest) if (first + offset) % 7 in WEEKEND_NIGHTS
+    )
+
+
+class Quote:
+    """Price of one stay"""
+
+    def __init__(self, rules, check_in, check_out, base_price, discount, cleaning_fee, service_fee):
+        self.rules = rules
+        self.listing_id = rules.listing.pk
+        self.check_in = check_in
+        self.check_out = check_out
+        self.base_price = money(base_price)
+        self.discount = discount
+        self.cleaning_fee = cleaning_fee
+        self.service_fee = service_fee
+        self.total = money(self.base_price - discount + cleaning_fee + service_fee)
+        self.currency = rules.listing.currency
+
+    @property
+    def nights(self):
+        return (self.check_out - self.check_in).days
+
+    @property
+    def nightly_rates(self):
+        """Rate of each night, worked out on demand for itemised displays"""
+        return [
+            self.rules.nightly_rate(self.check_in + datetime.timedelta(days=offset))
+            for offset in range(self.nights)
+        ]
+
+    def as_dict(self):
+        """JSON/session friendly form; amounts as strings to keep them exact"""
+        return {
+            'listing': self.listing_id,
+            'check_in': self.check_in.isoformat(),
+            'check_out': self.check_out.isoformat(),
+            'nights': self.nights,
+            'base_price': str(self.base_price),
+            'discount': str(self.discount),
+            'cleaning_fee': str(self.cleaning_fee),
+            'service_fee': str(self.service_fee),
+            'total': str(self.total),
+            'currency': self.currency,
+        }
+
+
+class PricingRules:
+    """Rate rules of one listing, with the seasonal rates relevant to the stays being priced"""
+
+    def __init__(self, listing, seasons=()):
+        self.listing = listing
+        self.seasons = sorted(seasons, key=lambda season: season.start_date, reverse=True)
+
+    def nightly_rate(self, night):
+        # The season that started most recently wins where seasons overlap
+        for season in self.seasons:
+            if season.start_date <= night <= season.end_date:
+                return season.price_per_day
+        if night.weekday() in WEEKEND_NIGHTS and self.listing.weekend_price_per_day is not None:
+            return self.listing.weekend_price_per_day
+        return self.listing.price_per_day
+
+    def discount_percent(self, nights):
+        if nights >= MONTHLY_NIGHTS and self.listing.monthly_discount:
+            return self.listing.monthly_discount
+        if nights >= WEEKLY_NIGHTS and self.listing.weekly_discount:
+            return self.listing.weekly_discount
+        return Decimal('0')
+
+    def base_price(self, check_in, check_out):
+        """Sum of the nightly rates, charged per seasonal overlap rather than per night"""
+        total = Decimal('0')
+        uncovered = [(check_in, check_out)]
+        # Seasons that started most recently claim their nights first
+        for season in self.seasons:
+            start, end = season.start_date, season.end_date + datetime.timedelta(days=1)
+            remaining = []
+            for first, last in uncovered:
+                overlap_start, overlap_end = max(first, start), min(last, end)
+                if overlap_start >= overlap_end:
+                    remaining.append((first, last))
+                    continue
+                total += season.price_per_day * (overlap_end - overlap_start).days
+                if first < overlap_start:
+                    remaining.append((first, overlap_start))
+                if overlap_end < last:
+                    remaining.append((overlap_end, last))
+            uncovered = remaining
+
+        weekend_price = self.listing.weekend_price_per_day
+        for first, last in uncovered:
+            nights = (last - first).days
+            weekend = weekend_nights(first, last) if weekend_price is not None else 0
+            total += self.listing.price_per_day * (nights - weekend)
+            if weekend:
+                total += weekend_price * weekend
+        return total
+
+    def quote(self, check_in, check_out):
+        if check_out <= check_in:
+            raise ValueError('check_out must be after check_in')
+        nights = (check_out - check_in).days
+        base_price = self.base_price(check_in, check_out)
+        discount = money(base_price * self.discount_percent(nights) / 100)
+        cleaning_fee = money(self.listing.cleaning_fee or 0)
+        service_fee = money((base_price - discount + cleaning_fee) * service_fee_rate())
+        return Quote(self, check_in, check_out, base_price, discount, cleaning_fee, service_fee)
+
+
+def seasons_for(stays):
+    """Seasonal rates touching any of the ``(listing, check_in, check_out)`` stays, per listing id"""
+    from listings.models import SeasonalRate
+
+    spans = {}
+    for listing, check_in, check_out in stays:
+        first, last = spans.get(listing.pk, (check_in, check_out))
+        spans[listing.pk] = (min(first, check_in), max(last, check_out))
+    if not spans:
+        return {}
+
+    query = Q()
+    for listing_id, (first, last) in spans.items():
+        query |= Q(listing_id=listing_id, start_date__lt=last, end_date__gte=first)
+    seasons = defaultdict(list)
+    for season in SeasonalRate.objects.filter(query):
+        seasons[season.listing_id].append(season)
+    return seasons
+
+
+def quote_batch(stays):
+    """Quotes for many ``(listing, check_in, check_out)`` stays in one query"""
+    stays = list(stays)
+    seasons = seasons_for(stays)
+    rules = {}
+    quotes = []
+    for listing, check_in, check_out in stays:
+        if listing.pk not in rules:
+            rules[listing.pk] = PricingRules(listing, seasons.get(listing.pk, ()))
+        quotes.append(rules[listing.pk].quote(check_in, check_out))
+    return quotes
+
+
+def quote(listing, check_in, check_out):
+    return quote_batch([(listing, check_in, check_out)])[0]
+
+
+def quote_listings(listings, check_in, check_out):
+    """``{listing_id: Quote}`` for one stay across a page of listings"""
+    return {
+        stay_quote.listing_id: stay_quote
+        for stay_quote in quote_batch((listing, check_in, check_out) for listing in listings)
+    }
+
+
+def quote_stays(listing, stays):
+    """Quotes for many date ranges of one listing"""
+    return quote_batch((listing, check_in, check_out) for check_in, check_out in stays)
+
+
+def attach_quotes(listings, check_in, check_out):
+    """Set ``stay_quote`` on each listing of a results page"""
+    listings = list(listings)
+    quotes = quote_listings(listings, check_in, check_out)
+    for listing in listings:
+        listing.stay_quote = quotes[listing.pk]
+    return listings
@@ -0,0 +1,80 @@
+"""
+Signed quote tokens.
+
+When a booking is created its price breakdown is cached under a short TTL
+and the guest carries a signed token naming the quote inputs (booking,
+listing, dates) and total to the payment page. The payment page verifies the
+signature and reads the breakdown from the cache, without a session write.
+A token that is older than the TTL, or whose cache entry is gone, is not
+trusted: the stay is priced again through bookings.pricing.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+from .pricing import quote
+
+QUOTE_SALT = 'bookings.quotes'
+
+
+class InvalidQuote(ValueError):
+    pass
+
+
+def quote_ttl():
+    return getattr(settings, 'BOOKING_QUOTE_TTL', 900)
+
+
+def quote_cache_key(token):
+    return f'bookings:quote:{hashlib.sha256(token.encode("utf-8")).hexdigest()}'
+
+
+def issue_quote(stay_quote, booking_id):
+    """Cache a quote's breakdown and return the signed token for it"""
+    token = signing.dumps(
+        {
+            'b': str(booking_id),
+            'l': stay_quote.listing_id,
+            'i': stay_quote.check_in.isoformat(),
+            'o': stay_quote.check_out.isoformat(),
+            't': str(stay_quote.total),
+            'at': int(time.time()),
+        },
+        salt=QUOTE_SALT,
+    )
+    cache.set(quote_cache_key(token), stay_quote.as_dict(), quote_ttl())
+    return token
+
+
+def read_quote(token, booking):
+    """
+    Return ``(breakdown, repriced)`` for a token issued for ``booking``.
+
+    Raises InvalidQuote for a forged token or one issued for another booking
+    or other dates. Expired or evicted quotes are priced again.
+    """
+    try:
+        payload = signing.loads(token, salt=QUOTE_SALT)
+    except signing.BadSignature as exc:
+        raise InvalidQuote('Invalid quote') from exc
+    if (
+        payload.get('b') != str(booking.pk)
+        or payload.get('l') != booking.listing_id
+        or payload.get('i') != booking.check_in.isoformat()
+        or payload.get('o') != booking.check_out.isoformat()
+    ):
+        raise InvalidQuote('Quote does not match the booking')
+
+    if time.time() - payload.get('at', 0) <= quote_ttl():
+        breakdown = cache.get(quote_cache_key(token))
+        if breakdown is not None and breakdown['total'] == payload['t']:
+            return breakdown, False
+    return reprice(booking), True
+
+
+def reprice(booking):
+    """Price a booking's stay again from the current rules"""
+    return quote(booking.listing, booking.check_in, booking.check_out).as_dict()
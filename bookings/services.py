@@ -0,0 +1,172 @@
+"""
+Booking writes that must not race.
+
+Two guests submitting the same nights at the same time would both pass a
+plain overlap check. Writes here lock the listing row first, so bookings of
+one listing are created or moved one at a time, and re-check overlaps inside
+the same transaction before saving.
+
+Approving a change request follows the same path: lock the listing and the
+request, re-check the new nights against every other booking, price the new
+stay and move the booking, all in one transaction.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from listings.models import Listing
+from .availability import nights_taken
+from .models import Booking, BookingChangeRequest
+from .pricing import quote
+
+
+class BookingConflict(Exception):
+    """The requested nights are already taken"""
+
+    def __init__(self, message='Those dates are no longer available.'):
+        super().__init__(message)
+        self.message = message
+
+
+class InvalidChangeRequest(Exception):
+    """The change request cannot be applied as it stands"""
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+def lock_listing(listing_id):
+    """Lock a listing row until the surrounding transaction ends"""
+    return Listing.objects.select_for_update().only('pk').get(pk=listing_id)
+
+
+def create_booking(booking):
+    """
+    Save an unsaved ``Booking`` if its nights are still free.
+    
+    Raises BookingConflict when another booking got there first.
+    """
+    with transaction.atomic():
+        lock_listing(booking.listing_id)
+        if nights_taken(booking.listing_id, booking.check_in, booking.check_out):
+            raise BookingConflict()
+        booking.save()
+    return booking
+
+
+CHANGEABLE_STATUSES = ('pending', 'confirmed', 'active')
+
+
+def lock_change_request(change_request_id):
+    """Lock a pending change request and its booking; raises InvalidChangeRequest once answered"""
+    change_request = BookingChangeRequest.objects.select_for_update().get(pk=change_request_id)
+    if change_request.status != 'pending':
+        raise InvalidChangeRequest('This change request has already been answered.')
+    change_request.booking = Booking.objects.select_for_update().select_related('listing').get(
+        pk=change_request.booking_id
+    )
+    return change_request
+
+
+def validate_change(change_request):
+    booking = change_request.booking
+    listing = booking.listing
+    check_in, check_out = change_request.new_check_in, change_request.new_check_out
+    guests = change_request.requested_guests or booking.guests
+    
+    if booking.status not in CHANGEABLE_STATUSES:
+        raise InvalidChangeRequest(f'A {booking.status} booking cannot be changed.')
+    if check_out <= check_in:
+        raise InvalidChangeRequest('Check-out date must be after check-in date.')
+    if check_in != booking.check_in and check_in < timezone.now().date():
+        raise InvalidChangeRequest('Check-in date cannot be in the past.')
+    nights = (check_out - check_in).days
+    if nights < listing.minimum_stay:
+        raise InvalidChangeRequest(f'Minimum stay is {listing.minimum_stay} nights.')
+    if listing.maximum_stay and nights > listing.maximum_stay:
+        raise InvalidChangeRequest(f'Maximum stay is {listing.maximum_stay} nights.')
+    if guests > listing.max_guests:
+        raise InvalidChangeRequest(f'Maximum {listing.max_guests} guests allowed.')
+    return check_in, check_out, guests
+
+
+def approve_change_request(change_request_id, note=''):
+    """
+    Apply a pending change request to its booking and return the request.
+    
+    Raises BookingConflict when the new nights are taken by another booking
+    or a blocked range, InvalidChangeRequest when the change is not allowed.
+    """
+    with transaction.atomic():
+        listing_id = BookingChangeRequest.objects.filter(pk=change_request_id).values_list(
+            'booking__listing_id', flat=True
+        ).get()
+        lock_listing(listing_id)
+        change_request = lock_change_request(change_request_id)
+        booking = change_request.booking
+        check_in, check_out, guests = validate_change(change_request)
+        
+        if nights_taken(listing_id, check_in, check_out, exclude=booking.pk):
+            raise BookingConflict()
+        
+        stay_quote = quote(booking.listing, check_in, check_out)
+        change_request.price_adjustment = stay_quote.total - booking.total_price
+        booking.check_in, booking.check_out, booking.guests = check_in, check_out, guests
+        booking.total_price = stay_quote.total
+        booking.save()
+        
+        change_request.status = 'approved'
+        change_request.responded_at = timezone.now()
+        change_request.response_note = note
+        change_request.save()
+    return change_request
+
+
+def reject_change_request(change_request_id, note=''):
+    with transaction.atomic():
+        change_request = lock_change_request(change_request_id)
+        change_request.status = 'rejected'
+        change_request.responded_at = timezone.now()
+        change_request.response_note = note
+        change_request.save()
+    return change_request
+
+
+def answer_change_requests(host, decisions):
+    """
+    Approve or reject many change requests of a host's listings.
+    
+    ``decisions`` are ``{'id', 'action', 'note'}`` dicts. Each one is applied
+    in its own transaction, so a conflict on one request does not undo the
+    others. Returns one result dict per decision, in order.
+    """
+    requests = BookingChangeRequest.objects.filter(
+        pk__in=[decision['id'] for decision in decisions],
+        booking__listing__host=host,
+    ).values_list('pk', 'booking__listing_id')
+    listing_of = dict(requests)
+    
+    results = {}
+    # Listing order keeps concurrent bulk calls from locking listings in opposite orders
+    order = sorted(
+        range(len(decisions)),
+        key=lambda index: (listing_of.get(decisions[index]['id'], 0), index),
+    )
+    for index in order:
+        decision = decisions[index]
+        result = {'id': str(decision['id']), 'action': decision['action']}
+        results[index] = result
+        if decision['id'] not in listing_of:
+            result['error'] = 'Change request not found.'
+            continue
+        try:
+            if decision['action'] == 'approve':
+                change_request = approve_change_request(decision['id'], decision.get('note', ''))
+            else:
+                change_request = reject_change_request(decision['id'], decision.get('note', ''))
+        except (BookingConflict, InvalidChangeRequest) as exc:
+            result['error'] = exc.message
+            continue
+        result['status'] = change_request.status
+        result['price_adjustment'] = str(change_request.price_adjustment)
+    return [results[index] for index in range(len(decisions))]
@@ -0,0 +1,46 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from listings.cache import invalidate_stays
+from .analytics import booking_state, record_change, stored_state
+from .availability import invalidate_calendar
+from .ical import invalidate_feed
+from .messaging import record_message
+from .models import BlockedRange, Booking, BookingMessage
+
+
+@receiver(pre_save, sender=Booking)
+def remember_previous_state(sender, instance, **kwargs):
+    """Keep the stored state so the analytics rollups can be updated by delta"""
+    instance._previous = stored_state(instance.pk) if instance.pk else None
+
+
+@receiver(post_save, sender=Booking)
+def apply_booking_saved(sender, instance, **kwargs):
+    record_change(getattr(instance, '_previous', None), booking_state(instance))
+
+
+@receiver(post_delete, sender=Booking)
+def apply_booking_deleted(sender, instance, **kwargs):
+    record_change(booking_state(instance), None)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def booking_changed(sender, instance, **kwargs):
+    invalidate_calendar(instance.listing_id)
+    invalidate_feed(instance.listing_id)
+    invalidate_stays()
+
+
+@receiver(post_save, sender=BlockedRange)
+@receiver(post_delete, sender=BlockedRange)
+def blocked_range_changed(sender, instance, **kwargs):
+    invalidate_calendar(instance.listing_id)
+    invalidate_stays()
+
+
+@receiver(post_save, sender=BookingMessage)
+def booking_message_sent(sender, instance, created, **kwargs):
+    if created:
+        record_message(instance)
@@ -1,3 +1,878 @@
-from django.test import TestCase
+import datetime
+import json
+import random
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from listings.filters import filter_listings
+from listings.models import Listing, SeasonalRate
+from .analytics import host_report, rebuild
+from .availability import get_calendar, is_available
+from .ical import import_feed, parse_events
+from .messaging import inbox, mark_read, record_message, send_message, thread_messages
+from .lifecycle import sweep
+from .models import Booking, BookingChangeRequest, BookingThread, ListingMonthlyStats
+from .pricing import quote, quote_batch
+from .quotes import InvalidQuote, issue_quote, read_quote
+from .services import (
+    BookingConflict, InvalidChangeRequest, answer_change_requests, approve_change_request, create_booking,
+)
+
+
+class AvailabilityCalendarTests(TestCase):
+    """The cached calendar answers like the overlap query and follows booking changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.guest = User.objects.create_user(
+            email='guest@example.com', password='secret', first_name='Guest', last_name='User'
+        )
+        cls.listing = Listing.objects.create(
+            title='Sea view flat',
+            description='Sunny and central',
+            host=cls.guest,
+            price_per_day=100,
+            city='Cape Town',
+            country='South Africa',
+            is_approved=True,
+        )
+        cls.today = timezone.now().date()
+
+    def setUp(self):
+        cache.clear()
+
+    def day(self, offset):
+        return self.today + datetime.timedelta(days=offset)
+
+    def book(self, first, last, status='confirmed'):
+        return Booking.objects.create(
+            user=self.guest,
+            listing=self.listing,
+            check_in=self.day(first),
+            check_out=self.day(last),
+            total_price=100,
+            status=status,
+        )
+
+    def overlaps(self, first, last):
+        return Booking.objects.filter(
+            listing=self.listing,
+            status__in=['pending', 'confirmed', 'active'],
+            check_in__lt=self.day(last),
+            check_out__gt=self.day(first),
+        ).exists()
+
+    def test_matches_overlap_query(self):
+        self.book(3, 6)
+        self.book(6, 8, status='pending')
+        self.book(12, 15)
+        self.book(20, 25, status='cancelled')
+        for first in range(0, 30):
+            for last in range(first + 1, 32):
+                with self.subTest(first=first, last=last):
+                    self.assertEqual(is_available(self.listing.pk, self.day(first), self.day(last)),
+                                     not self.overlaps(first, last))
+
+    def test_cached_checks_skip_the_database(self):
+        self.book(3, 6)
+        get_calendar(self.listing.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(is_available(self.listing.pk, self.day(5), self.day(7)))
+            self.assertTrue(is_available(self.listing.pk, self.day(6), self.day(9)))
+
+    def test_status_change_invalidates(self):
+        booking = self.book(3, 6)
+        self.assertFalse(is_available(self.listing.pk, self.day(4), self.day(5)))
+        booking.cancel_booking()
+        self.assertTrue(is_available(self.listing.pk, self.day(4), self.day(5)))
+        booking.delete()
+        self.book(4, 5, status='pending')
+        self.assertFalse(is_available(self.listing.pk, self.day(4), self.day(5)))
+
+    def test_calendar_endpoint(self):
+        self.book(3, 6)
+        start = self.today.replace(day=1)
+        response = self.client.get(
+            reverse('bookings:availability_calendar', args=[self.listing.uuid]),
+            {'start': start.isoformat()},
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['start'], start.isoformat())
+        self.assertIn(data['days'], (365, 366))
+        offset = (self.today - start).days
+        self.assertEqual(data['booked'][offset + 2:offset + 7], '01110')
+        self.assertEqual(data['booked'].count('1'), 3)
+
+
+class PricingTests(TestCase):
+    """Decimal pricing with weekend, seasonal and length-of-stay rules"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.guest = User.objects.create_user(
+            email='guest@example.com', password='secret', first_name='Guest', last_name='User'
+        )
+        cls.listing = Listing.objects.create(
+            title='Sea view flat',
+            description='Sunny and central',
+            host=cls.guest,
+            price_per_day=Decimal('100.00'),
+            weekend_price_per_day=Decimal('130.00'),
+            cleaning_fee=Decimal('45.50'),
+            weekly_discount=Decimal('10'),
+            monthly_discount=Decimal('25'),
+            city='Cape Town',
+            country='South Africa',
+            is_approved=True,
+        )
+        # December 2030: the 20th is a Friday
+        SeasonalRate.objects.create(
+            listing=cls.listing, name='Festive', start_date=datetime.date(2030, 12, 22),
+            end_date=datetime.date(2030, 12, 31), price_per_day=Decimal('210.00'),
+        )
+
+    def test_weekend_and_fees(self):
+        # Wednesday to Sunday: Wed, Thu at 100, Fri, Sat at 130
+        stay_quote = quote(self.listing, datetime.date(2030, 12, 18), datetime.date(2030, 12, 22))
+        self.assertEqual(stay_quote.nightly_rates, [Decimal('100.00')] * 2 + [Decimal('130.00')] * 2)
+        self.assertEqual(stay_quote.base_price, Decimal('460.00'))
+        self.assertEqual(stay_quote.discount, Decimal('0.00'))
+        self.assertEqual(stay_quote.service_fee, Decimal('50.55'))
+        self.assertEqual(stay_quote.total, Decimal('556.05'))
+
+    def test_season_overrides_weekend_and_weekly_discount(self):
+        # Fri 20th to Fri 27th: Fri, Sat weekend; Sun 22nd onwards festive
+        stay_quote = quote(self.listing, datetime.date(2030, 12, 20), datetime.date(2030, 12, 27))
+        self.assertEqual(stay_quote.base_price, Decimal('1310.00'))
+        self.assertEqual(stay_quote.discount, Decimal('131.00'))
+        self.assertEqual(stay_quote.total, Decimal('1346.95'))
+
+    def test_batch_uses_one_query(self):
+        stays = [
+            (self.listing, datetime.date(2030, 12, day), datetime.date(2030, 12, day + nights))
+            for day in range(1, 20)
+            for nights in (1, 3, 7)
+        ]
+        with self.assertNumQueries(1):
+            quotes = quote_batch(stays)
+        self.assertEqual(len(quotes), len(stays))
+        self.assertEqual(quotes[0].total, quote(*stays[0]).total)
+
+    def test_overlap_pricing_matches_night_by_night(self):
+        # Starts after Festive, so it wins the nights both cover
+        SeasonalRate.objects.create(
+            listing=self.listing, name='New year', start_date=datetime.date(2030, 12, 28),
+            end_date=datetime.date(2031, 1, 4), price_per_day=Decimal('250.00'),
+        )
+        randomizer = random.Random(14)
+        stays = [(datetime.date(2030, 12, 1), datetime.date(2031, 12, 1))] + [
+            (start, start + datetime.timedelta(days=randomizer.randint(1, 90)))
+            for start in (datetime.date(2030, 11, 1) + datetime.timedelta(days=randomizer.randint(0, 80))
+                          for _ in range(200))
+        ]
+        for stay_quote in quote_batch((self.listing, check_in, check_out) for check_in, check_out in stays):
+            self.assertEqual(stay_quote.base_price, sum(stay_quote.nightly_rates, Decimal('0')))
+        stay_quote = quote(self.listing, datetime.date(2030, 12, 26), datetime.date(2030, 12, 30))
+        self.assertEqual(stay_quote.nightly_rates, [Decimal('210.00')] * 2 + [Decimal('250.00')] * 2)
+
+    def test_quotes_endpoint_caps_stay_length(self):
+        today = timezone.localdate()
+
+        def status(check_in, check_out):
+            return self.client.get(reverse('bookings:quotes'), {
+                'listings': str(self.listing.uuid),
+                'stays': f'{check_in.isoformat()}/{check_out.isoformat()}',
+            }).status_code
+
+        self.assertEqual(status(today, today + datetime.timedelta(days=365)), 200)
+        self.assertEqual(status(today, today + datetime.timedelta(days=366)), 400)
+        self.assertEqual(status(datetime.date(1, 1, 1), datetime.date(1, 1, 3)), 400)
+        Listing.objects.filter(pk=self.listing.pk).update(maximum_stay=30)
+        self.assertEqual(status(today, today + datetime.timedelta(days=30)), 200)
+        self.assertEqual(status(today, today + datetime.timedelta(days=31)), 400)
+
+        with self.assertRaises(ValueError):
+            filter_listings(Listing.objects.all(), {
+                'check_in': today.isoformat(), 'check_out': (today + datetime.timedelta(days=400)).isoformat(),
+            }, strict=True)
+
+    def test_change_request_price_adjustment(self):
+        booking = Booking.objects.create(
+            user=self.guest,
+            listing=self.listing,
+            check_in=datetime.date(2030, 12, 18),
+            check_out=datetime.date(2030, 12, 22),
+            total_price=Decimal('556.05'),
+        )
+        change = BookingChangeRequest.objects.create(
+            booking=booking,
+            requested_by=self.guest,
+            requested_check_out=datetime.date(2030, 12, 23),
+            reason='One more night',
+        )
+        # One festive night (210) plus 10% service fee
+        self.assertEqual(change.price_adjustment, Decimal('231.00'))
+
+
+class QuoteTokenTests(TestCase):
+    """Signed quotes are honoured while fresh and priced again once stale"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.guest = User.objects.create_user(
+            email='guest@example.com', password='secret', first_name='Guest', last_name='User'
+        )
+        cls.listing = Listing.objects.create(
+            title='Sea view flat',
+            description='Sunny and central',
+            host=cls.guest,
+            price_per_day=Decimal('100.00'),
+            city='Cape Town',
+            country='South Africa',
+            is_approved=True,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.stay_quote = quote(self.listing, datetime.date(2030, 3, 11), datetime.date(2030, 3, 13))
+        self.booking = Booking.objects.create(
+            user=self.guest,
+            listing=self.listing,
+            check_in=self.stay_quote.check_in,
+            check_out=self.stay_quote.check_out,
+            total_price=self.stay_quote.total,
+        )
+        self.token = issue_quote(self.stay_quote, self.booking.pk)
+
+    def test_fresh_quote_comes_from_the_cache(self):
+        with self.assertNumQueries(0):
+            breakdown, repriced = read_quote(self.token, self.booking)
+        self.assertFalse(repriced)
+        self.assertEqual(breakdown['total'], '220.00')
+
+    def test_stale_quote_is_repriced(self):
+        Listing.objects.filter(pk=self.listing.pk).update(price_per_day=Decimal('120.00'))
+        self.booking.listing.refresh_from_db()
+        with override_settings(BOOKING_QUOTE_TTL=-1):
+            breakdown, repriced = read_quote(self.token, self.booking)
+        self.assertTrue(repriced)
+        self.assertEqual(breakdown['total'], '264.00')
+
+        cache.clear()
+        self.assertTrue(read_quote(self.token, self.booking)[1])
+
+    def test_forged_or_foreign_tokens_are_rejected(self):
+        with self.assertRaises(InvalidQuote):
+            read_quote(self.token[:-2] + 'xx', self.booking)
+        self.booking.check_out = datetime.date(2030, 3, 20)
+        with self.assertRaises(InvalidQuote):
+            read_quote(self.token, self.booking)
+
+
+class LifecycleSweepTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.guest = User.objects.create_user(
+            email='guest@example.com', password='secret', first_name='Guest', last_name='User'
+        )
+        cls.listing = Listing.objects.create(
+            title='Sea view flat',
+            description='Sunny and central',
+            host=cls.guest,
+            price_per_day=100,
+            city='Cape Town',
+            country='South Africa',
+            is_approved=True,
+        )
+
+    def book(self, first, last, status, created_hours_ago=0, payment_status='pending'):
+        today = timezone.localdate()
+        booking = Booking.objects.create(
+            user=self.guest,
+            listing=self.listing,
+            check_in=today + datetime.timedelta(days=first),
+            check_out=today + datetime.timedelta(days=last),
+            total_price=100,
+            status=status,
+            payment_status=payment_status,
+        )
+        Booking.objects.filter(pk=booking.pk).update(
+            created_at=timezone.now() - datetime.timedelta(hours=created_hours_ago)
+        )
+        return booking
+
+    def test_sweep_moves_each_rule_once(self):
+        started = self.book(-1, 2, 'confirmed')
+        ended = [self.book(-5, -1, 'confirmed'), self.book(-3, 0, 'active')]
+        stale = [self.book(5, 7, 'pending', created_hours_ago=30) for _ in range(3)]
+        past_check_in = self.book(0, 2, 'pending')
+        fresh = self.book(20, 22, 'pending', created_hours_ago=1)
+        paid = self.book(8, 9, 'pending', created_hours_ago=30, payment_status='paid')
+        future = self.book(10, 12, 'confirmed')
+
+        results = sweep(chunk_size=2)
+        self.assertEqual((results['activate'], results['complete'], results['expire']), (1, 2, 4))
+
+        started.refresh_from_db()
+        self.assertEqual(started.status, 'active')
+        self.assertIsNotNone(started.confirmed_at)
+        for booking in ended:
+            booking.refresh_from_db()
+            self.assertEqual(booking.status, 'completed')
+        for booking in stale + [past_check_in]:
+            booking.refresh_from_db()
+            self.assertEqual(booking.status, 'cancelled')
+            self.assertIsNotNone(booking.cancelled_at)
+        for booking, status in ((fresh, 'pending'), (paid, 'pending'), (future, 'confirmed')):
+            booking.refresh_from_db()
+            self.assertEqual(booking.status, status)
+
+        # Expired nights are free again
+        self.assertTrue(is_available(self.listing.pk, stale[0].check_in, stale[0].check_out))
+
+        again = sweep(chunk_size=2)
+        self.assertEqual((again['activate'], again['complete'], again['expire']), (0, 0, 0))
+
+
+class MonthlyRollupTests(TestCase):
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(
+            email='host@example.com', password='secret', first_name='Host', last_name='User'
+        )
+        cls.guest = User.objects.create_user(
+            email='guest@example.com', password='secret', first_name='Guest', last_name='User'
+        )
+        cls.listing = Listing.objects.create(
+            title='Sea view flat',
+            description='Sunny and central',
+            host=cls.host,
+            price_per_day=100,
+            city='Cape Town',
+            country='South Africa',
+            is_approved=True,
+        )
+    
+    def book(self, check_in, check_out, total, status='confirmed'):
+        return Booking.objects.create(
+            user=self.guest,
+            listing=self.listing,
+            check_in=check_in,
+            check_out=check_out,
+            total_price=total,
+            status=status,
+            confirmed_at=None if status == 'pending' else timezone.now(),
+        )
+    
+    def rollups(self):
+        return {
+            stats.month: (stats.booked_nights, stats.revenue, stats.bookings, stats.cancellations)
+            for stats in ListingMonthlyStats.objects.filter(listing=self.listing)
+        }
+    
+    def test_stay_is_split_across_months(self):
+        # 2 nights in January, 3 in February
+        self.book(datetime.date(2031, 1, 30), datetime.date(2031, 2, 4), '500.00')
+        self.assertEqual(self.rollups(), {
+            datetime.date(2031, 1, 1): (2, Decimal('200.00'), 1, 0),
+            datetime.date(2031, 2, 1): (3, Decimal('300.00'), 0, 0),
+        })
+    
+    def test_changes_are_applied_as_deltas(self):
+        booking = self.book(datetime.date(2031, 3, 10), datetime.date(2031, 3, 13), '300.00', status='pending')
+        self.assertEqual(self.rollups(), {})
+        
+        booking.confirm_booking()
+        booking.check_out = datetime.date(2031, 3, 14)
+        booking.total_price = Decimal('400.00')
+        booking.save()
+        self.assertEqual(self.rollups(), {datetime.date(2031, 3, 1): (4, Decimal('400.00'), 1, 0)})
+        
+        booking.cancel_booking()
+        self.assertEqual(self.rollups(), {datetime.date(2031, 3, 1): (0, Decimal('0.00'), 1, 1)})
+        
+        booking.delete()
+        self.assertEqual(self.rollups(), {datetime.date(2031, 3, 1): (0, Decimal('0.00'), 0, 0)})
+    
+    def test_expired_requests_are_not_host_cancellations(self):
+        booking = self.book(datetime.date(2031, 3, 10), datetime.date(2031, 3, 13), '300.00', status='pending')
+        booking.cancel_booking()
+        self.assertEqual(self.rollups(), {})
+    
+    def test_sweep_keeps_rollups_in_step(self):
+        today = timezone.localdate()
+        self.book(today - datetime.timedelta(days=1), today + datetime.timedelta(days=2), '300.00')
+        before = self.rollups()
+        sweep()
+        self.assertEqual(self.rollups(), before)
+        self.assertEqual(Booking.objects.get().status, 'active')
+    
+    def test_rebuild_matches_incremental_rollups(self):
+        self.book(datetime.date(2031, 1, 30), datetime.date(2031, 2, 4), '500.00')
+        self.book(datetime.date(2031, 2, 10), datetime.date(2031, 2, 13), '333.33', status='completed')
+        self.book(datetime.date(2031, 2, 20), datetime.date(2031, 2, 22), '200.00').cancel_booking()
+        incremental = {month: values for month, values in self.rollups().items() if any(values)}
+        
+        ListingMonthlyStats.objects.all().delete()
+        self.assertEqual(rebuild(), 2)
+        self.assertEqual(self.rollups(), incremental)
+    
+    def test_host_report(self):
+        self.book(datetime.date(2031, 2, 1), datetime.date(2031, 2, 8), '700.00')
+        self.book(datetime.date(2031, 2, 10), datetime.date(2031, 2, 12), '250.00').cancel_booking()
+        
+        with self.assertNumQueries(2):
+            report = host_report(self.host, datetime.date(2031, 1, 1), 2)
+        listing = report['listings'][0]
+        self.assertEqual(listing['listing'], str(self.listing.uuid))
+        self.assertEqual(listing['months'][0]['booked_nights'], 0)
+        february = listing['months'][1]
+        self.assertEqual(february['month'], '2031-02')
+        self.assertEqual(february['occupancy'], 0.25)
+        self.assertEqual(february['adr'], '100.00')
+        self.assertEqual(february['revenue'], '700.00')
+        self.assertEqual(february['cancellation_rate'], 0.5)
+        self.assertEqual(report['totals']['booked_nights'], 7)
+    
+    def test_host_analytics_api(self):
+        self.book(datetime.date(2031, 2, 1), datetime.date(2031, 2, 8), '700.00')
+        self.client.force_login(self.host)
+        response = self.client.get(reverse('bookings:host_analytics_api'), {'start': '2031-02', 'months': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['totals']['revenue'], '700.00')
+        
+        self.client.force_login(self.guest)
+        response = self.client.get(reverse('bookings:host_analytics_api'), {'start': '2031-02', 'months': 1})
+        self.assertEqual(response.json()['listings'], [])
+        self.assertEqual(
+            self.client.get(reverse('bookings:host_analytics_api'), {'months': 99}).status_code, 400
+        )
+
+
+FEED = (
+    'BEGIN:VCALENDAR\r\n'
+    'VERSION:2.0\r\n'
+    'BEGIN:VEVENT\r\n'
+    'UID:abc@elsewhere\r\n'
+    'DTSTART;VALUE=DATE:20310310\r\n'
+    'DTEND;VALUE=DATE:20310314\r\n'
+    'SUMMARY:Booked on an\r\n'
+    ' other site\r\n'
+    'END:VEVENT\r\n'
+    'BEGIN:VEVENT\r\n'
+    'UID:def@elsewhere\r\n'
+    'DTSTART:20310401T150000Z\r\n'
+    'END:VEVENT\r\n'
+    'BEGIN:VEVENT\r\n'
+    'UID:old@elsewhere\r\n'
+    'DTSTART;VALUE=DATE:20000101\r\n'
+    'DTEND;VALUE=DATE:20000105\r\n'
+    'END:VEVENT\r\n'
+    'END:VCALENDAR\r\n'
+)
+
+
+class ICalFeedTests(TestCase):
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.guest = User.objects.create_user(
+            email='guest@example.com', password='secret', first_name='Guest', last_name='User'
+        )
+        cls.listing = Listing.objects.create(
+            title='Sea view flat',
+            description='Sunny and central',
+            host=cls.guest,
+            price_per_day=100,
+            city='Cape Town',
+            country='South Africa',
+            is_approved=True,
+        )
+    
+    def setUp(self):
+        cache.clear()
+    
+    def book(self, check_in, check_out):
+        return Booking.objects.create(
+            user=self.guest,
+            listing=self.listing,
+            check_in=check_in,
+            check_out=check_out,
+            total_price=100,
+            status='confirmed',
+        )
+    
+    def test_export_answers_conditional_requests(self):
+        booking = self.book(datetime.date(2031, 3, 10), datetime.date(2031, 3, 14))
+        url = reverse('bookings:ical', args=[self.listing.uuid])
+        
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn(f'UID:{booking.pk}@rentala', body)
+        self.assertIn('DTSTART;VALUE=DATE:20310310', body)
+        self.assertIn('DTEND;VALUE=DATE:20310314', body)
+        etag = response['ETag']
+        
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        
+        booking.cancel_booking()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('BEGIN:VEVENT', response.content.decode())
+    
+    def test_parse_events_streams_folded_lines(self):
+        events = list(parse_events(iter(FEED.splitlines(keepends=True))))
+        self.assertEqual(events[0], (
+            'abc@elsewhere', datetime.date(2031, 3, 10), datetime.date(2031, 3, 14), 'Booked on another site'
+        ))
+        # No DTEND: one night
+        self.assertEqual(events[1][1:3], (datetime.date(2031, 4, 1), datetime.date(2031, 4, 2)))
+    
+    def test_import_blocks_dates(self):
+        lines = FEED.encode().splitlines(keepends=True)
+        self.assertEqual(import_feed(self.listing.pk, 'https://example.com/a.ics', lines), 2)
+        # A second import of the same feed replaces its ranges
+        self.assertEqual(import_feed(self.listing.pk, 'https://example.com/a.ics', lines), 2)
+        self.assertEqual(self.listing.blocked_ranges.count(), 2)
+        
+        self.assertFalse(is_available(self.listing.pk, datetime.date(2031, 3, 12), datetime.date(2031, 3, 15)))
+        self.assertTrue(is_available(self.listing.pk, datetime.date(2031, 3, 14), datetime.date(2031, 3, 16)))
+        with self.assertRaises(BookingConflict):
+            create_booking(Booking(
+                user=self.guest,
+                listing=self.listing,
+                check_in=datetime.date(2031, 3, 13),
+                check_out=datetime.date(2031, 3, 15),
+                total_price=200,
+            ))
+        queryset, _ = filter_listings(
+            Listing.objects.published(), {'check_in': '2031-03-11', 'check_out': '2031-03-12'}
+        )
+        self.assertFalse(queryset.exists())
+        
+        self.client.force_login(self.guest)
+        response = self.client.get(
+            reverse('bookings:check_availability', args=[self.listing.uuid]),
+            {'check_in': '2031-04-01', 'check_out': '2031-04-03'},
+        )
+        self.assertFalse(response.json()['available'])
+        # Imported blocks are not exported again
+        response = self.client.get(reverse('bookings:ical', args=[self.listing.uuid]))
+        self.assertNotIn('elsewhere', response.content.decode())
+
+
+class MessageThreadTests(TestCase):
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(
+            email='host@example.com', password='secret', first_name='Host', last_name='User'
+        )
+        cls.guest = User.objects.create_user(
+            email='guest@example.com', password='secret', first_name='Guest', last_name='User'
+        )
+        cls.listing = Listing.objects.create(
+            title='Sea view flat',
+            description='Sunny and central',
+            host=cls.host,
+            price_per_day=100,
+            city='Cape Town',
+            country='South Africa',
+            is_approved=True,
+        )
+        cls.bookings = [
+            Booking.objects.create(
+                user=cls.guest,
+                listing=cls.listing,
+                check_in=datetime.date(2031, 3, 1) + datetime.timedelta(days=10 * index),
+                check_out=datetime.date(2031, 3, 3) + datetime.timedelta(days=10 * index),
+                total_price=200,
+            )
+            for index in range(3)
+        ]
+    
+    def unread(self, booking, user):
+        return BookingThread.objects.get(booking=booking, participant=user).unread_count
+    
+    def test_counters_follow_sends_and_reads(self):
+        booking = self.bookings[0]
+        send_message(booking, self.guest, 'Hi, can we check in early?')
+        send_message(booking, self.guest, 'Around noon')
+        reply = send_message(booking, self.host, 'Sure')
+        self.assertEqual(reply.receiver, self.guest)
+        self.assertEqual(self.unread(booking, self.host), 2)
+        self.assertEqual(self.unread(booking, self.guest), 1)
+        
+        self.assertEqual(mark_read(booking, self.host), 2)
+        self.assertEqual(mark_read(booking, self.host), 0)
+        self.assertEqual(self.unread(booking, self.host), 0)
+        self.assertEqual(self.unread(booking, self.guest), 1)
+    
+    def test_late_message_keeps_newer_last_message(self):
+        booking = self.bookings[0]
+        earlier = send_message(booking, self.guest, 'Sent first')
+        later = send_message(booking, self.guest, 'Sent second')
+        # The first send's thread update lands after the second one
+        record_message(earlier)
+        for user in (self.guest, self.host):
+            thread = BookingThread.objects.get(booking=booking, participant=user)
+            self.assertEqual(thread.last_message, later)
+            self.assertEqual(thread.last_message_at, later.created_at)
+        self.assertEqual(self.unread(booking, self.host), 3)
+    
+    def test_inbox_is_one_query_per_page(self):
+        for booking in self.bookings:
+            send_message(booking, self.guest, f'About {booking.check_in}')
+        send_message(self.bookings[0], self.guest, 'Latest')
+        
+        with self.assertNumQueries(1):
+            page = inbox(self.host, page_size=2)
+            threads = [(thread.booking_id, thread.unread_count, thread.last_message.message) for thread in page]
+        self.assertEqual(threads[0], (self.bookings[0].pk, 2, 'Latest'))
+        self.assertEqual(threads[1][0], self.bookings[2].pk)
+        
+        rest = inbox(self.host, page.next_cursor, page_size=2)
+        self.assertEqual([thread.booking_id for thread in rest], [self.bookings[1].pk])
+        self.assertFalse(rest.has_next())
+    
+    def test_thread_pages_newest_first(self):
+        booking = self.bookings[0]
+        for number in range(5):
+            send_message(booking, self.guest, f'Message {number}')
+        first = thread_messages(booking, page_size=3)
+        second = thread_messages(booking, first.next_cursor, page_size=3)
+        self.assertEqual(
+            [message.message for message in list(first) + list(second)],
+            [f'Message {number}' for number in range(4, -1, -1)],
+        )
+    
+    def test_message_endpoints(self):
+        booking = self.bookings[0]
+        self.client.force_login(self.guest)
+        response = self.client.post(reverse('bookings:messages', args=[booking.pk]), {'message': 'Hello'})
+        self.assertEqual(response.status_code, 201)
+        
+        self.client.force_login(self.host)
+        response = self.client.get(reverse('bookings:inbox'))
+        self.assertEqual(response.json()['unread_total'], 1)
+        self.assertEqual(response.json()['threads'][0]['last_message']['message'], 'Hello')
+        response = self.client.post(reverse('bookings:messages_read', args=[booking.pk]))
+        self.assertEqual(response.json(), {'read': 1})
+        
+        outsider = User.objects.create_user(
+            email='other@example.com', password='secret', first_name='Other', last_name='User'
+        )
+        self.client.force_login(outsider)
+        self.assertEqual(self.client.get(reverse('bookings:messages', args=[booking.pk])).status_code, 404)
+
+
+class BookingCreationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.guest = User.objects.create_user(
+            email='guest@example.com', password='secret', first_name='Guest', last_name='User'
+        )
+        cls.listing = Listing.objects.create(
+            title='Sea view flat',
+            description='Sunny and central',
+            host=cls.guest,
+            price_per_day=100,
+            city='Cape Town',
+            country='South Africa',
+            is_approved=True,
+        )
+
+    def booking(self, check_in, check_out):
+        return Booking(
+            user=self.guest,
+            listing=self.listing,
+            check_in=check_in,
+            check_out=check_out,
+            total_price=100,
+        )
+
+    def test_overlapping_create_conflicts(self):
+        create_booking(self.booking(datetime.date(2030, 3, 12), datetime.date(2030, 3, 19)))
+        with self.assertRaises(BookingConflict):
+            create_booking(self.booking(datetime.date(2030, 3, 18), datetime.date(2030, 3, 20)))
+        create_booking(self.booking(datetime.date(2030, 3, 19), datetime.date(2030, 3, 20)))
+        self.assertEqual(Booking.objects.count(), 2)
+
+
+class ChangeRequestApprovalTests(TestCase):
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(
+            email='host@example.com', password='secret', first_name='Host', last_name='User'
+        )
+        cls.guest = User.objects.create_user(
+            email='guest@example.com', password='secret', first_name='Guest', last_name='User'
+        )
+        cls.listing = Listing.objects.create(
+            title='Sea view flat',
+            description='Sunny and central',
+            host=cls.host,
+            price_per_day=100,
+            city='Cape Town',
+            country='South Africa',
+            is_approved=True,
+        )
+    
+    def book(self, check_in, check_out):
+        return Booking.objects.create(
+            user=self.guest,
+            listing=self.listing,
+            check_in=check_in,
+            check_out=check_out,
+            total_price=quote(self.listing, check_in, check_out).total,
+            status='confirmed',
+        )
+    
+    def change(self, booking, check_in, check_out):
+        return BookingChangeRequest.objects.create(
+            booking=booking,
+            requested_by=self.guest,
+            requested_check_in=check_in,
+            requested_check_out=check_out,
+            reason='Plans changed',
+        )
+    
+    def test_approval_moves_and_reprices_the_booking(self):
+        booking = self.book(datetime.date(2031, 5, 1), datetime.date(2031, 5, 3))
+        # Overlaps only the booking itself
+        change = self.change(booking, datetime.date(2031, 5, 2), datetime.date(2031, 5, 6))
+        
+        change = approve_change_request(change.pk, 'See you then')
+        booking.refresh_from_db()
+        self.assertEqual((booking.check_in, booking.check_out), (datetime.date(2031, 5, 2), datetime.date(2031, 5, 6)))
+        self.assertEqual(booking.total_price, Decimal('440.00'))
+        self.assertEqual(change.status, 'approved')
+        self.assertEqual(change.price_adjustment, Decimal('220.00'))
+        self.assertFalse(is_available(self.listing.pk, datetime.date(2031, 5, 5), datetime.date(2031, 5, 6)))
+        
+        with self.assertRaises(InvalidChangeRequest):
+            approve_change_request(change.pk)
+    
+    def test_approval_rechecks_overlaps(self):
+        booking = self.book(datetime.date(2031, 5, 1), datetime.date(2031, 5, 3))
+        self.book(datetime.date(2031, 5, 5), datetime.date(2031, 5, 8))
+        change = self.change(booking, datetime.date(2031, 5, 1), datetime.date(2031, 5, 6))
+        
+        with self.assertRaises(BookingConflict):
+            approve_change_request(change.pk)
+        booking.refresh_from_db()
+        change.refresh_from_db()
+        self.assertEqual(booking.check_out, datetime.date(2031, 5, 3))
+        self.assertEqual(change.status, 'pending')
+    
+    def test_bulk_answers_each_request_on_its_own(self):
+        first = self.book(datetime.date(2031, 6, 1), datetime.date(2031, 6, 3))
+        second = self.book(datetime.date(2031, 6, 10), datetime.date(2031, 6, 12))
+        decisions = [
+            {'id': self.change(first, datetime.date(2031, 6, 2), datetime.date(2031, 6, 4)).pk, 'action': 'approve'},
+            # Clashes with the first booking once it has moved
+            {'id': self.change(second, datetime.date(2031, 6, 3), datetime.date(2031, 6, 5)).pk, 'action': 'approve'},
+            {'id': self.change(second, datetime.date(2031, 6, 20), datetime.date(2031, 6, 22)).pk, 'action': 'reject'},
+        ]
+        results = answer_change_requests(self.host, decisions)
+        self.assertEqual(results[0]['status'], 'approved')
+        self.assertIn('error', results[1])
+        self.assertEqual(results[2]['status'], 'rejected')
+        
+        # Only the host of the listing can answer
+        self.assertEqual(answer_change_requests(self.guest, decisions[1:2])[0]['error'], 'Change request not found.')
+    
+    def test_bulk_endpoint(self):
+        booking = self.book(datetime.date(2031, 6, 1), datetime.date(2031, 6, 3))
+        change = self.change(booking, datetime.date(2031, 6, 1), datetime.date(2031, 6, 4))
+        self.client.force_login(self.host)
+        url = reverse('bookings:bulk_respond_change_requests')
+        response = self.client.post(
+            url,
+            json.dumps({'decisions': [{'id': str(change.pk), 'action': 'approve'}]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['results'][0]['price_adjustment'], '110.00')
+        response = self.client.post(url, json.dumps({'decisions': [{'id': 'x'}]}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentBookingStressTests(TransactionTestCase):
+    """Hundreds of parallel creates against one listing; every night has at most one winner"""
+
+    attempts = 300
+    workers = 32
+
+    def setUp(self):
+        self.guest = User.objects.create_user(
+            email='guest@example.com', password='secret', first_name='Guest', last_name='User'
+        )
+        self.listing = Listing.objects.create(
+            title='Sea view flat',
+            description='Sunny and central',
+            host=self.guest,
+            price_per_day=100,
+            city='Cape Town',
+            country='South Africa',
+            is_approved=True,
+        )
+        self.start = datetime.date(2030, 1, 1)
+
+    def attempt(self, first, nights):
+        try:
+            create_booking(Booking(
+                user=self.guest,
+                listing=self.listing,
+                check_in=self.start + datetime.timedelta(days=first),
+                check_out=self.start + datetime.timedelta(days=first + nights),
+                total_price=100,
+            ))
+            return True
+        except BookingConflict:
+            return False
+        finally:
+            connection.close()
+
+    def run_parallel(self, stays):
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(lambda stay: self.attempt(*stay), stays))
+
+    def nights_taken(self):
+        taken = {}
+        for booking in Booking.objects.filter(listing=self.listing):
+            for offset in range(booking.nights):
+                night = booking.check_in + datetime.timedelta(days=offset)
+                taken[night] = taken.get(night, 0) + 1
+        return taken
+
+    def test_same_nights_have_one_winner(self):
+        results = self.run_parallel([(10, 7)] * self.attempts)
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_random_stays_never_double_book(self):
+        randomizer = random.Random(13)
+        stays = [(randomizer.randint(0, 60), randomizer.randint(1, 7)) for _ in range(self.attempts)]
+        results = self.run_parallel(stays)
+        taken = self.nights_taken()
+        self.assertEqual(results.count(True), Booking.objects.count())
+        self.assertTrue(taken)
+        self.assertEqual(max(taken.values()), 1)
@@ -16,7 +16,16 @@ urlpatterns = [
     # Host booking management
     path('host/', views.HostBookingsListView.as_view(), name='host_bookings'),
     path('<uuid:pk>/confirm/', views.confirm_booking, name='confirm'),
+    path('change-requests/<uuid:pk>/respond/', views.respond_change_request, name='respond_change_request'),
     
     # API endpoints
     path('api/check-availability/<uuid:listing_id>/', views.check_availability, name='check_availability'),
+    path('api/calendar/<uuid:listing_id>/', views.availability_calendar, name='availability_calendar'),
+    path('ical/<uuid:listing_id>.ics', views.listing_ical, name='ical'),
+    path('api/quotes/', views.quotes, name='quotes'),
+    path('api/inbox/', views.message_inbox, name='inbox'),
+    path('api/<uuid:pk>/messages/', views.booking_messages, name='messages'),
+    path('api/<uuid:pk>/messages/read/', views.mark_messages_read, name='messages_read'),
+    path('api/change-requests/', views.bulk_respond_change_requests, name='bulk_respond_change_requests'),
+    path('api/host-analytics/', views.host_analytics, name='host_analytics_api'),
 ]
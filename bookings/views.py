@@ -1,3 +1,7 @@
+import json
+import uuid
+from decimal import Decimal
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.views.generic import View, TemplateView, CreateView, ListView, DetailView
@@ -5,11 +9,27 @@ from django.utils.decorators import method_decorator
 from django.contrib import messages
 from django.utils import timezone
 from django.db.models import Q
-from django.http import JsonResponse
-from django.urls import reverse_lazy
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse, reverse_lazy
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, urlencode
 from django.views.decorators.http import require_http_methods
 
+from .analytics import host_report, parse_period
+from .availability import get_calendar, is_available, add_months
+from .ical import get_feed
+from .messaging import (
+    can_message, inbox, mark_read, message_dict, send_message, thread_dict, thread_messages, unread_total,
+)
+from .pricing import quote, quote_batch, validate_stay
+from .quotes import InvalidQuote, issue_quote, read_quote, reprice
 from .models import Booking, Listing, BookingChangeRequest
+from .services import (
+    BookingConflict, InvalidChangeRequest, answer_change_requests, approve_change_request, create_booking,
+    reject_change_request,
+)
+from core.pagination import InvalidCursor
+from listings.models import listing_card_prefetches
 from .forms import BookingForm, BookingChangeRequestForm
 
 
@@ -21,7 +41,7 @@ class BookingCreateView(CreateView):
     
     @method_decorator(login_required)
     def dispatch(self, *args, **kwargs):
-        self.listing = get_object_or_404(Listing, pk=self.kwargs['listing_id'])
+        self.listing = get_object_or_404(Listing, uuid=self.kwargs['listing_id'])
         return super().dispatch(*args, **kwargs)
     
     def get_form_kwargs(self):
@@ -36,18 +56,22 @@ class BookingCreateView(CreateView):
         form.instance.status = 'pending'
         
         # Calculate total price
-        price_calculation = form.calculate_total_price()
-        form.instance.total_price = price_calculation['total']
+        stay_quote = form.get_quote()
+        form.instance.total_price = stay_quote.total
+        form.instance.currency = stay_quote.currency
         
-        # Save booking
-        self.object = form.save()
+        # Save booking, unless someone booked the same nights in the meantime
+        try:
+            self.object = create_booking(form.instance)
+        except BookingConflict as exc:
+            form.add_error(None, exc.message)
+            return self.render_to_response(self.get_context_data(form=form), status=409)
         
-        # Store price details in session for payment page
-        self.request.session['booking_price_details'] = price_calculation
-        self.request.session['booking_id'] = self.object.id
+        # The payment page gets the price as a signed quote token (bookings.quotes)
+        token = issue_quote(stay_quote, self.object.pk)
         
         messages.success(self.request, 'Booking request submitted! Please complete payment to confirm.')
-        return redirect('bookings:payment', pk=self.object.pk)
+        return redirect(f"{reverse('bookings:payment', kwargs={'pk': self.object.pk})}?{urlencode({'quote': token})}")
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -90,7 +114,9 @@ class BookingListView(ListView):
     
     def get_queryset(self):
         # Users can only see their own bookings
-        queryset = Booking.objects.filter(user=self.request.user)
+        queryset = Booking.objects.filter(user=self.request.user).select_related(
+            'listing__host', 'listing__category'
+        ).prefetch_related(*listing_card_prefetches('listing__'))
         
         # Filter by status if provided
         status = self.request.GET.get('status')
@@ -116,9 +142,18 @@ class BookingPaymentView(DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Get price details from session
-        price_details = self.request.session.get('booking_price_details', {})
+        # Price details from the signed quote; anything stale is priced again
+        booking = self.object
+        try:
+            price_details, repriced = read_quote(self.request.GET.get('quote', ''), booking)
+        except InvalidQuote:
+            price_details, repriced = reprice(booking), True
+        if repriced and Decimal(price_details['total']) != booking.total_price:
+            Booking.objects.filter(pk=booking.pk, status='pending').update(total_price=price_details['total'])
+            booking.total_price = Decimal(price_details['total'])
+            messages.info(self.request, 'The price of this stay has been updated.')
         context.update(price_details)
+        context['quote_repriced'] = repriced
         
         return context
 
@@ -138,6 +173,10 @@ class HostBookingsListView(ListView):
         # Host can only see bookings for their own listings
         return Booking.objects.filter(
             listing__host=self.request.user
+        ).select_related(
+            'user', 'listing__host', 'listing__category'
+        ).prefetch_related(
+            *listing_card_prefetches('listing__')
         ).order_by('-created_at')
 
 
@@ -176,10 +215,64 @@ def confirm_booking(request, pk):
     return redirect('bookings:host_bookings')
 
 
+@login_required
+@require_http_methods(["POST"])
+def respond_change_request(request, pk):
+    """Host approves or rejects a change request"""
+    change_request = get_object_or_404(BookingChangeRequest, pk=pk, booking__listing__host=request.user)
+    note = request.POST.get('note', '')
+    
+    try:
+        if request.POST.get('action') == 'approve':
+            change_request = approve_change_request(change_request.pk, note)
+            messages.success(
+                request, f'Change approved. Price adjustment: {change_request.price_adjustment}.'
+            )
+        else:
+            reject_change_request(change_request.pk, note)
+            messages.success(request, 'Change request rejected.')
+    except (BookingConflict, InvalidChangeRequest) as exc:
+        messages.error(request, exc.message)
+    
+    return redirect('bookings:host_bookings')
+
+
+MAX_DECISIONS = 100
+
+
+@login_required
+@require_http_methods(["POST"])
+def bulk_respond_change_requests(request):
+    """
+    Approve or reject many change requests at once (API endpoint).
+    
+    Body: ``{"decisions": [{"id": "<uuid>", "action": "approve"|"reject", "note": ""}]}``.
+    Each decision succeeds or fails on its own.
+    """
+    try:
+        decisions = json.loads(request.body)['decisions']
+        decisions = [
+            {
+                'id': uuid.UUID(str(decision['id'])),
+                'action': decision['action'],
+                'note': str(decision.get('note', '')),
+            }
+            for decision in decisions
+        ]
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Invalid decisions'}, status=400)
+    if any(decision['action'] not in ('approve', 'reject') for decision in decisions):
+        return JsonResponse({'error': 'Action must be approve or reject'}, status=400)
+    if len(decisions) > MAX_DECISIONS:
+        return JsonResponse({'error': f'At most {MAX_DECISIONS} decisions per call'}, status=400)
+    
+    return JsonResponse({'results': answer_change_requests(request.user, decisions)})
+
+
 @login_required
 def check_availability(request, listing_id):
     """Check availability for a listing (API endpoint)"""
-    listing = get_object_or_404(Listing, pk=listing_id)
+    listing = get_object_or_404(Listing, uuid=listing_id)
     
     check_in = request.GET.get('check_in')
     check_out = request.GET.get('check_out')
@@ -193,38 +286,186 @@ def check_availability(request, listing_id):
     except ValueError:
         return JsonResponse({'error': 'Invalid date format'}, status=400)
     
-    # Check for overlapping bookings
-    overlapping = Booking.objects.filter(
-        listing=listing,
-        status__in=['pending', 'confirmed', 'active'],
-        check_in__lt=check_out_date,
-        check_out__gt=check_in_date
-    ).exists()
-    
-    available = not overlapping
+    # Answered from the cached calendar (bookings.availability)
+    available = is_available(listing.pk, check_in_date, check_out_date)
     
     # Calculate price if available
     price_calculation = {}
-    if available:
-        nights = (check_out_date - check_in_date).days
-        if nights < 1:
-            nights = 1
-        
-        base_price = listing.price_per_night * nights
-        cleaning_fee = listing.cleaning_fee or 0
-        service_fee = (base_price + cleaning_fee) * 0.10
-        total = base_price + cleaning_fee + service_fee
-        
-        price_calculation = {
-            'nights': nights,
-            'base_price': round(base_price, 2),
-            'cleaning_fee': round(cleaning_fee, 2),
-            'service_fee': round(service_fee, 2),
-            'total': round(total, 2)
-        }
+    if available and check_out_date > check_in_date:
+        price_calculation = quote(listing, check_in_date, check_out_date).as_dict()
     
     return JsonResponse({
         'available': available,
         'price_calculation': price_calculation,
         'max_guests': listing.max_guests
     })
+
+
+def availability_calendar(request, listing_id):
+    """Free/booked bitmap of a listing for the next 12 months (API endpoint)"""
+    listing = get_object_or_404(Listing, uuid=listing_id, is_active=True)
+    
+    start = request.GET.get('start')
+    try:
+        start = timezone.datetime.strptime(start, '%Y-%m-%d').date() if start else timezone.now().date()
+        months = min(max(int(request.GET.get('months', 12)), 1), 24)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid start or months'}, status=400)
+    
+    start = start.replace(day=1)
+    end = add_months(start, months)
+    days = (end - start).days
+    return JsonResponse({
+        'listing': str(listing.uuid),
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'days': days,
+        'booked': get_calendar(listing.pk).bitmap(start, days),
+        'minimum_stay': listing.minimum_stay,
+        'maximum_stay': listing.maximum_stay,
+    })
+
+
+@require_http_methods(["GET", "HEAD"])
+def listing_ical(request, listing_id):
+    """iCalendar export of a listing's booked dates, revalidated with ETag/Last-Modified"""
+    listing = get_object_or_404(Listing, uuid=listing_id, is_active=True)
+    feed = get_feed(listing)
+    
+    response = get_conditional_response(request, etag=feed['etag'], last_modified=feed['last_modified'])
+    if response is None:
+        response = HttpResponse(feed['body'], content_type='text/calendar; charset=utf-8')
+        response['Content-Disposition'] = f'inline; filename="{listing.uuid}.ics"'
+    response['ETag'] = feed['etag']
+    response['Last-Modified'] = http_date(feed['last_modified'])
+    # Calendar clients poll; make them revalidate, which is a cache hit here
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+MAX_QUOTES = 500
+
+
+def parse_stays(value):
+    """``2030-03-12/2030-03-19,2030-04-01/2030-04-03`` into date pairs"""
+    stays = []
+    for part in value.split(','):
+        check_in, _, check_out = part.strip().partition('/')
+        check_in = timezone.datetime.strptime(check_in, '%Y-%m-%d').date()
+        check_out = timezone.datetime.strptime(check_out, '%Y-%m-%d').date()
+        validate_stay(check_in, check_out)
+        stays.append((check_in, check_out))
+    return stays
+
+
+def quotes(request):
+    """
+    Quote many stays in one call (API endpoint).
+    
+    ``?listings=<uuid>,<uuid>`` with ``?check_in=&check_out=`` or
+    ``?stays=<check_in>/<check_out>,...``; every listing is quoted for every stay.
+    """
+    try:
+        listing_ids = [uuid.UUID(value) for value in request.GET.get('listings', '').split(',') if value.strip()]
+        if request.GET.get('stays'):
+            stays = parse_stays(request.GET['stays'])
+        else:
+            stays = parse_stays(f"{request.GET.get('check_in', '')}/{request.GET.get('check_out', '')}")
+    except ValueError:
+        return JsonResponse({'error': 'Invalid listings or dates'}, status=400)
+    if not listing_ids:
+        return JsonResponse({'error': 'Missing listings'}, status=400)
+    if len(listing_ids) * len(stays) > MAX_QUOTES:
+        return JsonResponse({'error': f'At most {MAX_QUOTES} quotes per call'}, status=400)
+    
+    listings = Listing.objects.published().in_bulk(listing_ids, field_name='uuid')
+    longest = max((check_out - check_in).days for check_in, check_out in stays)
+    for listing in listings.values():
+        if listing.maximum_stay and longest > listing.maximum_stay:
+            return JsonResponse(
+                {'error': f'Maximum stay for {listing.uuid} is {listing.maximum_stay} nights'}, status=400,
+            )
+    uuids = {listing.pk: str(listing.uuid) for listing in listings.values()}
+    results = quote_batch(
+        (listing, check_in, check_out)
+        for listing in listings.values()
+        for check_in, check_out in stays
+    )
+    return JsonResponse({
+        'quotes': [dict(stay_quote.as_dict(), listing=uuids[stay_quote.listing_id]) for stay_quote in results],
+    })
+
+
+@login_required
+def host_analytics(request):
+    """
+    Host analytics from the monthly rollups (API endpoint).
+    
+    ``?start=YYYY-MM&months=N`` picks the period (default: the last 12 months),
+    ``?listing=<uuid>`` narrows it to one of the host's listings.
+    """
+    try:
+        start, months = parse_period(request.GET)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid start or months'}, status=400)
+    
+    listings = Listing.objects.filter(host=request.user)
+    if request.GET.get('listing'):
+        try:
+            listings = listings.filter(uuid=uuid.UUID(request.GET['listing']))
+        except ValueError:
+            return JsonResponse({'error': 'Invalid listing'}, status=400)
+    return JsonResponse(host_report(request.user, start, months, listings))
+
+
+def page_json(page, key, serialize):
+    return {
+        key: [serialize(item) for item in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }
+
+
+@login_required
+def message_inbox(request):
+    """The user's booking threads with last message and unread count (API endpoint)"""
+    try:
+        page = inbox(request.user, request.GET.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    data = page_json(page, 'threads', thread_dict)
+    if not request.GET.get('cursor'):
+        data['unread_total'] = unread_total(request.user)
+    return JsonResponse(data)
+
+
+@login_required
+@require_http_methods(["GET", "POST"])
+def booking_messages(request, pk):
+    """Page through a booking's messages, or post one (API endpoint)"""
+    booking = get_object_or_404(Booking.objects.select_related('listing'), pk=pk)
+    if not can_message(booking, request.user):
+        return JsonResponse({'error': 'Not found'}, status=404)
+    
+    if request.method == 'POST':
+        text = request.POST.get('message', '').strip()
+        if not text:
+            return JsonResponse({'error': 'Empty message'}, status=400)
+        message = send_message(booking, request.user, text)
+        return JsonResponse(message_dict(message), status=201)
+    
+    try:
+        page = thread_messages(booking, request.GET.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    return JsonResponse(page_json(page, 'messages', message_dict))
+
+
+@login_required
+@require_http_methods(["POST"])
+def mark_messages_read(request, pk):
+    """Mark the user's messages of a booking as read (API endpoint)"""
+    booking = get_object_or_404(Booking.objects.select_related('listing'), pk=pk)
+    if not can_message(booking, request.user):
+        return JsonResponse({'error': 'Not found'}, status=404)
+    return JsonResponse({'read': mark_read(booking, request.user)})
@@ -0,0 +1,193 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of ``OFFSET n`` plus a ``COUNT(*)``, each page remembers the sort key
+of its first and last row and the next page starts with a ``WHERE`` on that
+key. Every page costs one indexed range scan no matter how deep it is.
+
+Cursors are signed so clients can treat them as opaque tokens and cannot
+forge arbitrary filter values.
+"""
+import datetime
+import uuid
+from decimal import Decimal
+
+from django.core import signing
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+CURSOR_SALT = 'core.pagination.cursor'
+
+DEFAULT_ORDERING = ('-created_at', '-id')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        return ['dt', value.isoformat()]
+    if isinstance(value, Decimal):
+        return ['dec', str(value)]
+    if isinstance(value, uuid.UUID):
+        return ['str', str(value)]
+    return ['raw', value]
+
+
+def _decode_value(encoded):
+    kind, value = encoded
+    if kind == 'dt':
+        return parse_datetime(value)
+    if kind == 'dec':
+        return Decimal(value)
+    return value
+
+
+def encode_cursor(values, backwards=False):
+    return signing.dumps(
+        {'v': [_encode_value(value) for value in values], 'b': backwards},
+        salt=CURSOR_SALT,
+        compress=True,
+    )
+
+
+def decode_cursor(token):
+    """Return (values, backwards) or raise InvalidCursor"""
+    try:
+        data = signing.loads(token, salt=CURSOR_SALT)
+        return [_decode_value(value) for value in data['v']], bool(data['b'])
+    except (signing.BadSignature, KeyError, TypeError, ValueError) as exc:
+        raise InvalidCursor('Invalid cursor') from exc
+
+
+def _split(ordering):
+    return [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+
+
+def keyset_filter(ordering, values, backwards=False):
+    """
+    Q object selecting rows strictly after ``values`` in ``ordering`` (or
+    strictly before when ``backwards`` is set).
+    """
+    keys = _split(ordering)
+    query = Q()
+    for position, (field, descending) in enumerate(keys):
+        lookup = 'lt' if descending != backwards else 'gt'
+        clause = Q(**{f'{field}__{lookup}': values[position]})
+        for earlier, (earlier_field, _) in enumerate(keys[:position]):
+            clause &= Q(**{earlier_field: values[earlier]})
+        query |= clause
+
+    # Redundant bound on the leading key so the database can use a range scan
+    field, descending = keys[0]
+    bound = 'lte' if descending != backwards else 'gte'
+    return Q(**{f'{field}__{bound}': values[0]}) & query
+
+
+def approximate_count(queryset):
+    """
+    Cheap row estimate for a queryset. On MySQL this reads the optimizer's
+    estimate from EXPLAIN instead of scanning; elsewhere it falls back to
+    ``count()``.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'mysql':
+        return queryset.count()
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN {sql}', params)
+        columns = [column[0] for column in cursor.description]
+        row = cursor.fetchone()
+    if not row or 'rows' not in columns:
+        return queryset.count()
+    return int(row[columns.index('rows')] or 0)
+
+
+class KeysetPage:
+    """One page of keyset-paginated results"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, total=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.approximate_total = total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def _row_key(row, keys):
+    return [getattr(row, field) for field, _ in keys]
+
+
+def parse_cursor(cursor, ordering):
+    """Return (values, backwards) for a cursor token, or (None, False) without one"""
+    if not cursor:
+        return None, False
+    values, backwards = decode_cursor(cursor)
+    if len(values) != len(ordering):
+        raise InvalidCursor('Cursor does not match ordering')
+    return values, backwards
+
+
+def keyset_page(rows, ordering, page_size, values=None, backwards=False, total=None):
+    """
+    Build a ``KeysetPage`` from up to ``page_size + 1`` rows fetched in page
+    order (reversed when paging backwards) after the cursor ``values``.
+    """
+    keys = _split(ordering)
+    rows = list(rows)
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    if backwards:
+        # The row the cursor was taken from is always ahead of this page
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, values is not None
+
+    next_cursor = previous_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor(_row_key(rows[-1], keys))
+    if rows and has_previous:
+        previous_cursor = encode_cursor(_row_key(rows[0], keys), backwards=True)
+
+    return KeysetPage(rows, next_cursor, previous_cursor, total)
+
+
+def keyset_paginate(queryset, cursor=None, page_size=20, ordering=DEFAULT_ORDERING, with_total=False):
+    """
+    Return a ``KeysetPage`` for ``queryset`` ordered by ``ordering``. The last
+    ordering field must be unique (normally the primary key).
+
+    Raises InvalidCursor for a tampered or malformed cursor.
+    """
+    values, backwards = parse_cursor(cursor, ordering)
+    total = approximate_count(queryset) if with_total else None
+
+    if backwards:
+        page_ordering = [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+    else:
+        page_ordering = list(ordering)
+
+    page_queryset = queryset.order_by(*page_ordering)
+    if values is not None:
+        page_queryset = page_queryset.filter(keyset_filter(ordering, values, backwards))
+
+    return keyset_page(page_queryset[:page_size + 1], ordering, page_size, values, backwards, total)
@@ -1,3 +1,76 @@
+import datetime
+
+from django.core import signing
 from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import User
+from listings.models import Listing
+from .pagination import InvalidCursor, encode_cursor, keyset_paginate
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pages walk the whole ordering once in either direction"""
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user(
+            email='host@example.com', password='secret', first_name='Host', last_name='User'
+        )
+        for index in range(7):
+            Listing.objects.create(
+                title=f'Listing {index}', description='Sunny and central', host=host, price_per_day=100,
+                city='Cape Town', country='South Africa', is_approved=True,
+            )
+        # Pairs of rows share a created_at so the id has to break the tie
+        start = timezone.now()
+        for position, pk in enumerate(Listing.objects.order_by('id').values_list('pk', flat=True)):
+            Listing.objects.filter(pk=pk).update(created_at=start - datetime.timedelta(minutes=position // 2))
+        cls.expected = list(Listing.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+    def pks(self, page):
+        return [listing.pk for listing in page]
+
+    def test_forward_and_backward(self):
+        seen = []
+        pages = []
+        cursor = None
+        while True:
+            page = keyset_paginate(Listing.objects.all(), cursor, page_size=3)
+            pages.append(page)
+            seen += self.pks(page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, self.expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertFalse(pages[0].has_previous())
+
+        # Walking back from the last page returns the same pages
+        page = pages[-1]
+        for earlier in reversed(pages[:-1]):
+            page = keyset_paginate(Listing.objects.all(), page.previous_cursor, page_size=3)
+            self.assertEqual(self.pks(page), self.pks(earlier))
+            self.assertTrue(page.has_next())
+        self.assertFalse(page.has_previous())
+
+    def test_ties_break_on_id(self):
+        ordering = ('created_at', 'id')
+        ascending = list(Listing.objects.order_by(*ordering).values_list('pk', flat=True))
+        seen = []
+        cursor = None
+        for _ in range(len(ascending)):
+            page = keyset_paginate(Listing.objects.all(), cursor, page_size=1, ordering=ordering)
+            seen += self.pks(page)
+            cursor = page.next_cursor
+        # Rows sharing a created_at are neither skipped nor repeated
+        self.assertEqual(seen, ascending)
+        self.assertIsNone(cursor)
 
-# Create your tests here.
+    def test_rejects_invalid_cursors(self):
+        page = keyset_paginate(Listing.objects.all(), page_size=3)
+        tampered = page.next_cursor[:-2] + ('A' if page.next_cursor[-2] != 'A' else 'B') + page.next_cursor[-1]
+        forged = signing.dumps({'v': [['raw', 1], ['raw', 2]], 'b': False}, salt='another.salt')
+        for cursor in ('garbage', tampered, forged, encode_cursor([1])):
+            with self.assertRaises(InvalidCursor):
+                keyset_paginate(Listing.objects.all(), cursor, page_size=3)
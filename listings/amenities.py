@@ -0,0 +1,152 @@
+"""
+Amenity bitmask for multi-amenity filtering.
+
+Every amenity owns one bit and every listing stores the OR of its amenities'
+bits in ``amenity_mask``, so "has wifi, parking and a pool" is one predicate,
+``amenity_mask & mask = mask``, evaluated against the
+(is_active, is_approved, amenity_mask) index instead of one join per amenity.
+
+The mask is kept in step with ``Listing.amenities`` by listings.signals.
+Amenities beyond the 63 available bits get no bit and are filtered through
+the M2M table as before.
+"""
+from django.core.cache import cache
+from django.db.models import F
+from django.utils.text import slugify
+
+from .cache import get_version
+
+MAX_BITS = 63
+
+BITS_CACHE_TIMEOUT = 3600
+
+
+def next_free_bit():
+    """Lowest bit not owned by an amenity, or None when all are taken"""
+    from .models import Amenity
+
+    used = set(Amenity.objects.exclude(bit=None).values_list('bit', flat=True))
+    for bit in range(MAX_BITS):
+        if bit not in used:
+            return bit
+    return None
+
+
+def unique_slug(name, exclude_pk=None):
+    """``slugify(name)``, with a numeric suffix when another amenity has it"""
+    from .models import Amenity
+
+    base = slugify(name) or 'amenity'
+    taken = set(Amenity.objects.exclude(pk=exclude_pk).filter(slug__startswith=base).values_list('slug', flat=True))
+    slug, suffix = base, 2
+    while slug in taken:
+        slug, suffix = f'{base}-{suffix}', suffix + 1
+    return slug
+
+
+def amenity_bits():
+    """``{slug: (id, bit)}`` for every amenity, cached until the taxonomy changes"""
+    from .models import Amenity
+
+    key = f'listings:amenity_bits:{get_version("taxonomy")}'
+    bits = cache.get(key)
+    if bits is None:
+        bits = {
+            slug: (pk, bit)
+            for pk, slug, bit in Amenity.objects.values_list('pk', 'slug', 'bit')
+        }
+        cache.set(key, bits, BITS_CACHE_TIMEOUT)
+    return bits
+
+
+def mask_for(bits):
+    mask = 0
+    for bit in bits:
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+
+def parse_amenities(value):
+    """Amenity slugs from a ``wifi,parking,pool`` parameter"""
+    return sorted({slug.strip().lower() for slug in (value or '').split(',') if slug.strip()})
+
+
+def with_all_bits(queryset, mask, field='amenity_mask'):
+    """Rows whose ``field`` has every bit of ``mask`` set"""
+    return queryset.alias(amenity_match=F(field).bitand(mask)).filter(amenity_match=mask)
+
+
+def filter_by_amenities(queryset, slugs):
+    """Listings that have every amenity in ``slugs``; unknown slugs match nothing"""
+    if not slugs:
+        return queryset
+    known = amenity_bits()
+    if any(slug not in known for slug in slugs):
+        return queryset.none()
+
+    mask = mask_for(known[slug][1] for slug in slugs)
+    if mask:
+        queryset = with_all_bits(queryset, mask)
+    for slug in slugs:
+        amenity_id, bit = known[slug]
+        if bit is None:
+            queryset = queryset.filter(amenities=amenity_id)
+    return queryset
+
+
+def refresh_mask(listing):
+    """Recompute one listing's mask from its amenities"""
+    from .models import Listing
+
+    mask = mask_for(
+        Listing.amenities.through.objects.filter(listing_id=listing.pk)
+        .values_list('amenity__bit', flat=True)
+    )
+    Listing.objects.filter(pk=listing.pk).update(amenity_mask=mask)
+    listing.amenity_mask = mask
+    return mask
+
+
+def set_bit(listing_ids, bit):
+    from .models import Listing
+
+    if bit is None:
+        return
+    Listing.objects.filter(pk__in=listing_ids).update(amenity_mask=F('amenity_mask').bitor(1 << bit))
+
+
+def clear_bit(bit, listing_ids=None):
+    """Clear ``bit`` on the given listings, or on every listing that has it"""
+    from .models import Listing
+
+    if bit is None:
+        return
+    listings = Listing.objects.all()
+    if listing_ids is not None:
+        listings = listings.filter(pk__in=listing_ids)
+    with_all_bits(listings, 1 << bit).update(amenity_mask=F('amenity_mask').bitand(~(1 << bit)))
+
+
+def rebuild_masks(batch_size=1000):
+    """Recompute every listing's mask from the M2M table; returns the number of listings"""
+    from .models import Listing
+
+    through = Listing.amenities.through
+    masks = {}
+    for listing_id, bit in through.objects.exclude(amenity__bit=None).values_list('listing_id', 'amenity__bit'):
+        masks[listing_id] = masks.get(listing_id, 0) | (1 << bit)
+
+    updated = 0
+    listing_ids = list(Listing.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(listing_ids), batch_size):
+        batch = Listing.objects.filter(pk__in=listing_ids[start:start + batch_size]).only('pk', 'amenity_mask')
+        changed = []
+        for listing in batch:
+            mask = masks.get(listing.pk, 0)
+            if listing.amenity_mask != mask:
+                listing.amenity_mask = mask
+                changed.append(listing)
+        Listing.objects.bulk_update(changed, ['amenity_mask'])
+        updated += len(changed)
+    return updated
@@ -0,0 +1,220 @@
+"""
+Response cache for the public listing pages.
+
+Anonymous GETs of the listing list and detail pages are served from the
+cache. Keys embed version counters rather than being deleted one by one:
+
+* ``catalog``  - bumped by any listing change; part of every list page key
+* ``listing:<pk>`` - bumped when that listing, its images or amenities change;
+  part of its detail page key
+* ``taxonomy`` - bumped by category/amenity changes; part of every key
+* ``bookings`` - bumped by any booking change; part of the list page keys of
+  date-range searches only (see bookings.signals)
+
+so a listing edit drops the list pages and that one detail page, and leaves
+the other detail pages alone (see listings.signals).
+
+Entries carry a soft expiry. Once it passes, one request takes a short lock
+and re-renders while concurrent requests keep getting the stale copy, so a
+popular page expiring does not send every worker to the database at once.
+"""
+import hashlib
+import re
+import time
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+PAGE_CACHE_TIMEOUT = 300
+STALE_GRACE = 120
+LOCK_TIMEOUT = 15
+LOCK_WAIT = 2.0
+LOCK_POLL_INTERVAL = 0.05
+
+LIST_PARAMS = (
+    'q', 'category', 'min_price', 'max_price', 'lat', 'lng', 'radius_km', 'bbox',
+    'amenities', 'city', 'bedrooms', 'bathrooms', 'guests', 'check_in', 'check_out',
+    'sort', 'cursor', 'page', 'total',
+)
+
+# Opaque tokens: compared exactly, never case-folded
+OPAQUE_PARAMS = ('cursor',)
+
+# Parameters whose results also depend on bookings
+STAY_PARAMS = ('check_in', 'check_out')
+
+STATS_EVENTS = ('hit', 'stale', 'miss', 'wait')
+
+CSRF_INPUT_RE = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+CSRF_PLACEHOLDER = b'__csrf_token__'
+
+
+def get_version(name):
+    key = f'listings:version:{name}'
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted counter never reuses an old version
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    key = f'listings:version:{name}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def invalidate_listing(listing_id):
+    """A listing changed: drop its detail page and every list page"""
+    bump_version(f'listing:{listing_id}')
+    bump_version('catalog')
+
+
+def invalidate_stays():
+    """A booking changed: drop list pages filtered by check-in/check-out"""
+    bump_version('bookings')
+
+
+def stay_version(params):
+    """Booking version for searches with a stay filter, '' for the rest"""
+    if any(params.get(name) for name in STAY_PARAMS):
+        return f':{get_version("bookings")}'
+    return ''
+
+
+def invalidate_all():
+    """Categories, amenities or bulk updates: drop every cached page"""
+    bump_version('taxonomy')
+
+
+def normalize_param(name, value):
+    value = value.strip()
+    return value if name in OPAQUE_PARAMS else value.lower()
+
+
+def list_cache_key(params, path=''):
+    normalized = '&'.join(
+        f'{name}={normalize_param(name, params.get(name, ""))}'
+        for name in LIST_PARAMS
+        if params.get(name)
+    )
+    digest = hashlib.md5(f'{path}?{normalized}'.encode('utf-8')).hexdigest()
+    return (
+        f'listings:page:list:{get_version("taxonomy")}:{get_version("catalog")}'
+        f'{stay_version(params)}:{digest}'
+    )
+
+
+def detail_cache_key(listing_id, path=''):
+    digest = hashlib.md5(path.encode('utf-8')).hexdigest()
+    return (
+        f'listings:page:detail:{listing_id}:{get_version("taxonomy")}:'
+        f'{get_version(f"listing:{listing_id}")}:{digest}'
+    )
+
+
+def record(event):
+    key = f'listings:page:stats:{event}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def cache_stats():
+    stats = {event: cache.get(f'listings:page:stats:{event}', 0) for event in STATS_EVENTS}
+    served = stats['hit'] + stats['stale']
+    requests = served + stats['miss']
+    stats['hit_ratio'] = round(served / requests, 4) if requests else None
+    return stats
+
+
+def reset_stats():
+    cache.delete_many([f'listings:page:stats:{event}' for event in STATS_EVENTS])
+
+
+def _freeze(response):
+    content = CSRF_INPUT_RE.sub(rb'\g<1>' + CSRF_PLACEHOLDER + rb'\g<2>', response.content)
+    return {
+        'expires': time.time() + PAGE_CACHE_TIMEOUT,
+        'content': content,
+        'content_type': response.get('Content-Type'),
+    }
+
+
+def _thaw(request, entry, status):
+    content = entry['content']
+    if CSRF_PLACEHOLDER in content:
+        # Cached copies are shared, so every visitor gets their own token
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode('ascii'))
+    response = HttpResponse(content, content_type=entry['content_type'])
+    response['X-Cache'] = status
+    return response
+
+
+def _store(key, response):
+    entry = _freeze(response)
+    cache.set(key, entry, PAGE_CACHE_TIMEOUT + STALE_GRACE)
+    return entry
+
+
+def cached_response(request, key, render):
+    """
+    Return the cached response for ``key`` or call ``render()`` to build it.
+    Only 200 responses without cookies are stored.
+    """
+    entry = cache.get(key)
+    if entry is not None and entry['expires'] > time.time():
+        record('hit')
+        return _thaw(request, entry, 'HIT')
+
+    lock_key = f'{key}:lock'
+    locked = cache.add(lock_key, 1, LOCK_TIMEOUT)
+    if not locked:
+        if entry is not None:
+            # Someone else is refreshing; the stale copy is good enough
+            record('stale')
+            return _thaw(request, entry, 'STALE')
+        # Cold key: give the refreshing request a moment before rendering too
+        record('wait')
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                record('hit')
+                return _thaw(request, entry, 'HIT')
+
+    try:
+        record('miss')
+        response = render()
+        if hasattr(response, 'render') and callable(response.render):
+            response = response.render()
+        if response.status_code == 200 and not response.cookies:
+            _store(key, response)
+            response['X-Cache'] = 'MISS'
+        return response
+    finally:
+        if locked:
+            cache.delete(lock_key)
+
+
+class CachedPageMixin:
+    """Serve anonymous GETs of a view from the page cache"""
+
+    def get_page_cache_key(self):
+        raise NotImplementedError
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method != 'GET' or request.user.is_authenticated:
+            return super().dispatch(request, *args, **kwargs)
+        return cached_response(
+            request,
+            self.get_page_cache_key(),
+            lambda: super(CachedPageMixin, self).dispatch(request, *args, **kwargs),
+        )
@@ -0,0 +1,311 @@
+"""
+Process-local columnar copy of the listing catalog.
+
+Most listing searches are plain range/equality filters (price, bedrooms,
+bathrooms, guests, city, category) plus a sort. With ``LISTING_CATALOG_ENABLED``
+those columns are kept in NumPy arrays and such searches are answered with
+vectorized masks; only the ids of the requested page go to the database,
+through the same filtered queryset, so a stale catalog can drop a row from a
+page but never show one that no longer matches.
+
+The catalog refreshes incrementally from ``Listing.updated_at`` at most every
+``LISTING_CATALOG_REFRESH_SECONDS`` and reloads in full when the row count
+shows a deletion; bulk ``update()`` calls that leave ``updated_at`` alone are
+only picked up by such a reload. Past ``LISTING_CATALOG_MAX_ROWS`` rows it
+does not load at all. Anything it cannot answer (text, location or amenity
+search, other sorts, a missing NumPy) falls back to SQL.
+"""
+import datetime
+import logging
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.pagination import keyset_page, keyset_paginate, parse_cursor
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Parameters only the database can answer
+SQL_ONLY_PARAMS = ('q', 'lat', 'lng', 'radius_km', 'bbox', 'amenities', 'check_in', 'check_out')
+
+# Extra ids fetched per page query to absorb rows that went stale in the catalog
+STALE_SLACK = 8
+
+# Ordering fields the catalog can sort on
+SORT_COLUMNS = {
+    'created_at': 'created',
+    'price_per_day': 'price',
+    'id': 'id',
+}
+
+COLUMN_FIELDS = (
+    'id', 'price_per_day', 'bedrooms', 'bathrooms', 'max_guests', 'city',
+    'category_id', 'is_active', 'is_approved', 'created_at', 'updated_at',
+)
+
+REFRESH_OVERLAP = datetime.timedelta(seconds=60)
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def to_micros(value):
+    """Exact integer microseconds since the epoch"""
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, datetime.timezone.utc)
+    return (value - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def to_cents(value):
+    return int(Decimal(value) * 100)
+
+
+class Snapshot:
+    """One immutable set of column arrays; refreshes build a new one"""
+
+    def __init__(self, columns, cities, watermark):
+        self.columns = columns
+        self.cities = cities
+        self.positions = {int(pk): index for index, pk in enumerate(columns['id'])}
+        self.watermark = watermark
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns.values())
+
+
+class ListingCatalog:
+
+    def __init__(self, max_rows=None, refresh_seconds=None):
+        self.max_rows = max_rows or getattr(settings, 'LISTING_CATALOG_MAX_ROWS', 200000)
+        self.refresh_seconds = (
+            refresh_seconds if refresh_seconds is not None
+            else getattr(settings, 'LISTING_CATALOG_REFRESH_SECONDS', 5)
+        )
+        self.snapshot = None
+        self.checked_at = float('-inf')
+        self._lock = threading.Lock()
+
+    # Loading
+
+    def _rows(self, queryset):
+        return queryset.order_by().values_list(*COLUMN_FIELDS).iterator(chunk_size=5000)
+
+    def _build(self, rows, cities):
+        rows = list(rows)
+        city_codes = [cities.setdefault(row[5].strip().lower(), len(cities)) for row in rows]
+        columns = {
+            'id': np.array([row[0] for row in rows], dtype=np.int64),
+            'price': np.array([to_cents(row[1]) for row in rows], dtype=np.int64),
+            'bedrooms': np.array([row[2] for row in rows], dtype=np.int32),
+            'bathrooms': np.array([row[3] for row in rows], dtype=np.int32),
+            'guests': np.array([row[4] for row in rows], dtype=np.int32),
+            'city': np.array(city_codes, dtype=np.int32),
+            'category': np.array([row[6] if row[6] is not None else -1 for row in rows], dtype=np.int64),
+            'live': np.array([row[7] and row[8] for row in rows], dtype=bool),
+            'created': np.array([to_micros(row[9]) for row in rows], dtype=np.int64),
+        }
+        watermark = max((row[10] for row in rows), default=None)
+        return columns, watermark
+
+    def load(self):
+        from .models import Listing
+
+        if Listing.objects.count() > self.max_rows:
+            self.snapshot = None
+            logger.warning('Listing catalog disabled: more than %s listings', self.max_rows)
+            return None
+        cities = {}
+        columns, watermark = self._build(self._rows(Listing.objects.all()), cities)
+        self.snapshot = Snapshot(columns, cities, watermark)
+        return self.snapshot
+
+    def refresh(self):
+        """Apply rows changed since the last load; reload in full after deletions"""
+        from .models import Listing
+
+        snapshot = self.snapshot
+        if snapshot is None or snapshot.watermark is None:
+            return self.load()
+
+        cities = dict(snapshot.cities)
+        # Re-read a little history for rows that committed after the last refresh
+        changed = Listing.objects.filter(updated_at__gte=snapshot.watermark - REFRESH_OVERLAP)
+        delta, watermark = self._build(self._rows(changed), cities)
+        columns = snapshot.columns
+        if len(delta['id']):
+            columns = {name: column.copy() for name, column in columns.items()}
+            existing = np.array([pk in snapshot.positions for pk in delta['id'].tolist()], dtype=bool)
+            targets = np.array(
+                [snapshot.positions[pk] for pk in delta['id'][existing].tolist()], dtype=np.int64
+            )
+            for name, column in columns.items():
+                column[targets] = delta[name][existing]
+            if not existing.all():
+                columns = {
+                    name: np.concatenate([column, delta[name][~existing]])
+                    for name, column in columns.items()
+                }
+
+        if len(columns['id']) > self.max_rows or len(columns['id']) != Listing.objects.count():
+            return self.load()
+
+        self.snapshot = Snapshot(columns, cities, watermark or snapshot.watermark)
+        return self.snapshot
+
+    def current(self):
+        """The up-to-date snapshot, or None when the catalog cannot be used"""
+        checked_at = self.checked_at
+        if time.monotonic() - checked_at < self.refresh_seconds:
+            return self.snapshot
+        with self._lock:
+            if self.checked_at == checked_at:
+                self.refresh()
+                self.checked_at = time.monotonic()
+            return self.snapshot
+
+    # Querying
+
+    def mask(self, snapshot, params):
+        """Boolean mask for the filter params, or None if SQL has to answer them"""
+        from .filters import SORT_ORDERINGS, parse_number
+        from .models import Category
+
+        if any(params.get(name) for name in SQL_ONLY_PARAMS):
+            return None
+        sort = params.get('sort')
+        if sort and sort not in SORT_ORDERINGS:
+            return None
+
+        columns = snapshot.columns
+        mask = columns['live'].copy()
+
+        category = params.get('category')
+        if category:
+            category_id = Category.objects.filter(slug=category).values_list('pk', flat=True).first()
+            if category_id is None:
+                return np.zeros_like(mask)
+            mask &= columns['category'] == category_id
+
+        min_price = parse_number(params, 'min_price', Decimal)
+        max_price = parse_number(params, 'max_price', Decimal)
+        if min_price is not None:
+            mask &= columns['price'] >= to_cents(min_price)
+        if max_price is not None:
+            mask &= columns['price'] <= to_cents(max_price)
+
+        city = params.get('city', '').strip().lower()
+        if city:
+            code = snapshot.cities.get(city)
+            if code is None:
+                return np.zeros_like(mask)
+            mask &= columns['city'] == code
+
+        for param, column in (('bedrooms', 'bedrooms'), ('bathrooms', 'bathrooms'), ('guests', 'guests')):
+            minimum = parse_number(params, param, int)
+            if minimum is not None:
+                mask &= columns[column] >= minimum
+        return mask
+
+    def page_ids(self, params, ordering, values=None, backwards=False, limit=20):
+        """
+        Ids of up to ``limit`` listings after the cursor ``values`` in
+        ``ordering`` (all of them, as an array, when ``limit`` is None), plus
+        the number of matches. Returns (None, None) when SQL has to answer.
+        """
+        keys = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+        if any(field not in SORT_COLUMNS for field, _ in keys):
+            return None, None
+        snapshot = self.current()
+        if snapshot is None:
+            return None, None
+        mask = self.mask(snapshot, params)
+        if mask is None:
+            return None, None
+        total = int(mask.sum())
+
+        columns = [(snapshot.columns[SORT_COLUMNS[field]], descending != backwards) for field, descending in keys]
+        if values is not None:
+            after = np.zeros_like(mask)
+            equal = np.ones_like(mask)
+            for (column, descending), value in zip(columns, self._key_values(keys, values)):
+                after |= equal & (column < value if descending else column > value)
+                equal &= column == value
+            mask &= after
+
+        matches = np.flatnonzero(mask)
+        # lexsort sorts by the last key first; negate descending keys
+        order = np.lexsort([
+            -column[matches] if descending else column[matches]
+            for column, descending in reversed(columns)
+        ])
+        if limit is None:
+            return snapshot.columns['id'][matches[order]], total
+        return snapshot.columns['id'][matches[order[:limit]]].tolist(), total
+
+    def _key_values(self, keys, values):
+        converted = []
+        for (field, _), value in zip(keys, values):
+            if field == 'created_at':
+                converted.append(to_micros(value))
+            elif field == 'price_per_day':
+                converted.append(to_cents(value))
+            else:
+                converted.append(int(value))
+        return converted
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """The process-wide catalog, or None when it is switched off or unavailable"""
+    global _catalog
+    if np is None or not getattr(settings, 'LISTING_CATALOG_ENABLED', False):
+        return None
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = ListingCatalog()
+        return _catalog
+
+
+def paginate_listings(queryset, params, cursor=None, page_size=20, ordering=None, with_total=False):
+    """
+    Keyset page of ``queryset`` (already filtered by ``filter_listings`` with
+    ``params``). Served from the catalog when it can answer the filters,
+    otherwise by ``keyset_paginate``; both produce interchangeable cursors.
+    """
+    catalog = get_catalog()
+    if catalog is not None:
+        values, backwards = parse_cursor(cursor, ordering)
+        ids, total = catalog.page_ids(params, ordering, values, backwards, limit=None)
+        if ids is not None:
+            # Rows the catalog still has but SQL no longer matches drop out; keep
+            # fetching until the page and its look-ahead row are full or ids run out
+            rows = []
+            offset = 0
+            while len(rows) <= page_size and offset < len(ids):
+                chunk = ids[offset:offset + page_size + 1 - len(rows) + STALE_SLACK].tolist()
+                offset += len(chunk)
+                live = {listing.pk: listing for listing in queryset.filter(pk__in=chunk)}
+                rows += [live[pk] for pk in chunk if pk in live]
+            return keyset_page(
+                rows[:page_size + 1],
+                ordering,
+                page_size,
+                values,
+                backwards,
+                total if with_total else None,
+            )
+    return keyset_paginate(queryset, cursor, page_size, ordering, with_total)
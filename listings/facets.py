@@ -0,0 +1,122 @@
+"""
+Facet counts for the listing filters.
+
+All scalar facets (category, price bucket, bedrooms, max guests) come from a
+single grouped aggregation over the filtered listings; the cube it returns is
+rolled up into per-facet counts in Python. Amenities live in an M2M table and
+take one more grouped query. Results are cached per filter set and dropped
+whenever a listing, category or amenity changes (see listings.cache).
+"""
+import hashlib
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import Case, When, Value, IntegerField, Count
+
+from .cache import get_version, stay_version
+from .models import Listing
+
+PRICE_BUCKETS = [
+    (0, 50),
+    (50, 100),
+    (100, 200),
+    (200, 500),
+    (500, None),
+]
+
+# Request parameters that change the filtered set
+FILTER_PARAMS = (
+    'q', 'category', 'min_price', 'max_price', 'lat', 'lng', 'radius_km', 'bbox', 'amenities',
+    'city', 'bedrooms', 'bathrooms', 'guests', 'check_in', 'check_out',
+)
+
+FACET_CACHE_TIMEOUT = 600
+
+
+def price_bucket_label(low, high):
+    return f'{low}+' if high is None else f'{low}-{high}'
+
+
+def _price_bucket_expression():
+    whens = [
+        When(price_per_day__lt=high, then=Value(index))
+        for index, (low, high) in enumerate(PRICE_BUCKETS)
+        if high is not None
+    ]
+    return Case(*whens, default=Value(len(PRICE_BUCKETS) - 1), output_field=IntegerField())
+
+
+def compute_facets(queryset):
+    """Facet counts for every listing in ``queryset``"""
+    listing_ids = queryset.order_by().values('pk')
+    base = Listing.objects.filter(pk__in=listing_ids)
+
+    cube = (
+        base.annotate(price_bucket=_price_bucket_expression())
+        .values('category__slug', 'category__name', 'price_bucket', 'bedrooms', 'max_guests')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+
+    categories = {}
+    price = defaultdict(int)
+    bedrooms = defaultdict(int)
+    guests = defaultdict(int)
+    total = 0
+    for row in cube:
+        count = row['count']
+        total += count
+        if row['category__slug']:
+            entry = categories.setdefault(
+                row['category__slug'],
+                {'slug': row['category__slug'], 'name': row['category__name'], 'count': 0},
+            )
+            entry['count'] += count
+        price[row['price_bucket']] += count
+        bedrooms[row['bedrooms']] += count
+        guests[row['max_guests']] += count
+
+    amenities = [
+        {'id': row['amenity_id'], 'slug': row['amenity__slug'], 'name': row['amenity__name'], 'count': row['count']}
+        for row in Listing.amenities.through.objects.filter(listing_id__in=listing_ids)
+        .values('amenity_id', 'amenity__slug', 'amenity__name')
+        .annotate(count=Count('listing_id'))
+        .order_by('amenity__name')
+    ]
+
+    return {
+        'total': total,
+        'categories': sorted(categories.values(), key=lambda entry: entry['name']),
+        'price': [
+            {
+                'label': price_bucket_label(low, high),
+                'min_price': low,
+                'max_price': high,
+                'count': price.get(index, 0),
+            }
+            for index, (low, high) in enumerate(PRICE_BUCKETS)
+        ],
+        'bedrooms': [{'value': value, 'count': count} for value, count in sorted(bedrooms.items())],
+        'max_guests': [{'value': value, 'count': count} for value, count in sorted(guests.items())],
+        'amenities': amenities,
+    }
+
+
+def facet_cache_key(params):
+    normalized = '&'.join(
+        f'{name}={params.get(name, "").strip().lower()}'
+        for name in FILTER_PARAMS
+        if params.get(name)
+    )
+    digest = hashlib.md5(normalized.encode('utf-8')).hexdigest()
+    return f'listings:facets:{get_version("taxonomy")}:{get_version("catalog")}{stay_version(params)}:{digest}'
+
+
+def get_facets(params, queryset):
+    """Cached facet counts for the filter set described by ``params``"""
+    key = facet_cache_key(params)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset)
+        cache.set(key, facets, FACET_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,137 @@
+"""
+Filtering shared by the listing pages and the listing API, so both accept the
+same query parameters and produce the same result set.
+"""
+import datetime
+from decimal import Decimal
+
+from django.db.models import Q
+
+from bookings.pricing import MAX_STAY_NIGHTS, validate_stay
+from .amenities import parse_amenities, filter_by_amenities
+from .geo import parse_geo_params, apply_geo_filter
+from .search import search_listings
+
+
+# ?sort= values and the ordering they select
+SORT_ORDERINGS = {
+    'newest': ['-created_at'],
+    'price': ['price_per_day'],
+    '-price': ['-price_per_day'],
+}
+
+
+def parse_number(params, name, cast=int, strict=False):
+    """Numeric parameter or None; malformed values raise ValueError only when ``strict``"""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        number = cast(value)
+        valid = number >= 0 and (cast is not Decimal or number.is_finite())
+    except (ValueError, ArithmeticError):
+        valid = False
+    if not valid:
+        if strict:
+            raise ValueError(f'{name} must be a non-negative number')
+        return None
+    return number
+
+
+def parse_stay(params, strict=False):
+    """``(check_in, check_out)`` dates from the parameters, or None"""
+    if not params.get('check_in') and not params.get('check_out'):
+        return None
+    try:
+        check_in = datetime.date.fromisoformat(params.get('check_in', ''))
+        check_out = datetime.date.fromisoformat(params.get('check_out', ''))
+        validate_stay(check_in, check_out)
+    except ValueError:
+        if strict:
+            raise ValueError(
+                'check_in and check_out must be YYYY-MM-DD, from today on, with check_out after check_in '
+                f'and at most {MAX_STAY_NIGHTS} nights later'
+            )
+        return None
+    return check_in, check_out
+
+
+def filter_listings(queryset, params, strict=False):
+    """
+    Apply the public search parameters to a listing queryset.
+    
+    Returns ``(queryset, ordering)`` where ``ordering`` ends with ``-id`` so it
+    can be used as a unique pagination key. Malformed location parameters are
+    ignored unless ``strict`` is set, in which case ValueError is raised.
+    """
+    sort = params.get('sort')
+    ordering = list(SORT_ORDERINGS.get(sort, SORT_ORDERINGS['newest']))
+    
+    # Search functionality (ranked lookup on the search index)
+    search_query = params.get('q')
+    if search_query:
+        ranked = search_listings(queryset, search_query)
+        if ranked is not None:
+            queryset = ranked
+            if sort not in SORT_ORDERINGS:
+                ordering = ['-search_rank', '-created_at']
+        else:
+            queryset = queryset.filter(
+                Q(title__icontains=search_query) |
+                Q(description__icontains=search_query) |
+                Q(city__icontains=search_query) |
+                Q(country__icontains=search_query)
+            )
+    
+    # Location filter (?lat=&lng=&radius_km= or ?bbox=south,west,north,east)
+    try:
+        geo = parse_geo_params(params)
+    except ValueError:
+        if strict:
+            raise
+        geo = None
+    if geo:
+        queryset = apply_geo_filter(queryset, geo)
+        if 'point' in geo and sort == 'distance':
+            ordering = ['distance_km'] + ordering
+    
+    # Category filter
+    category_slug = params.get('category')
+    if category_slug:
+        queryset = queryset.filter(category__slug=category_slug)
+    
+    # Price range filter
+    min_price = parse_number(params, 'min_price', Decimal, strict)
+    max_price = parse_number(params, 'max_price', Decimal, strict)
+    if min_price is not None:
+        queryset = queryset.filter(price_per_day__gte=min_price)
+    if max_price is not None:
+        queryset = queryset.filter(price_per_day__lte=max_price)
+    
+    # City and minimum size filters
+    city = params.get('city', '').strip()
+    if city:
+        queryset = queryset.filter(city__iexact=city)
+    for param, field in (('bedrooms', 'bedrooms'), ('bathrooms', 'bathrooms'), ('guests', 'max_guests')):
+        minimum = parse_number(params, param, int, strict)
+        if minimum is not None:
+            queryset = queryset.filter(**{f'{field}__gte': minimum})
+    
+    # Stay filter (?check_in=&check_out=): NOT EXISTS anti-joins on bookings and blocked ranges
+    stay = parse_stay(params, strict)
+    if stay:
+        from bookings.availability import booked_between
+        check_in, check_out = stay
+        nights = (check_out - check_in).days
+        queryset = queryset.filter(
+            ~booked_between(check_in, check_out),
+            minimum_stay__lte=nights,
+        ).filter(Q(maximum_stay__isnull=True) | Q(maximum_stay__gte=nights))
+    
+    # Amenity filter (?amenities=wifi,parking,pool), one bitmask predicate
+    amenity_slugs = parse_amenities(params.get('amenities'))
+    if amenity_slugs:
+        queryset = filter_by_amenities(queryset, amenity_slugs)
+    
+    # Primary key last so the ordering is a unique keyset
+    return queryset, ordering + ['-id']
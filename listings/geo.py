@@ -0,0 +1,169 @@
+"""
+Radius and bounding-box lookups over listing coordinates without a GIS backend.
+
+Every listing stores a ``geo_cell``: the id of the fixed lat/lng grid cell it
+falls in. Cells are numbered row by row, so the cells covering one latitude
+row of a bounding box form a contiguous integer range. A spatial query turns
+into a handful of ``geo_cell BETWEEN x AND y`` range scans on an index, and the
+exact haversine distance is only computed for the rows those scans return.
+"""
+import math
+
+from django.db.models import Q, FloatField, ExpressionWrapper, Value
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+
+# Cell size in degrees (~11km of latitude)
+CELL_SIZE = 0.1
+GRID_COLUMNS = int(round(360 / CELL_SIZE))
+GRID_ROWS = int(round(180 / CELL_SIZE))
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+MAX_RADIUS_KM = 500
+
+# Past this many latitude rows the range list stops paying off and the plain
+# coordinate predicate is used on its own
+MAX_CELL_ROWS = 200
+
+
+def cell_row(latitude):
+    return min(int(math.floor((float(latitude) + 90) / CELL_SIZE)), GRID_ROWS - 1)
+
+
+def cell_column(longitude):
+    return min(int(math.floor((float(longitude) + 180) / CELL_SIZE)), GRID_COLUMNS - 1)
+
+
+def cell_for(latitude, longitude):
+    """Return the grid cell id for a coordinate, or None if it is incomplete"""
+    if latitude is None or longitude is None:
+        return None
+    return cell_row(latitude) * GRID_COLUMNS + cell_column(longitude)
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """Return (south, west, north, east) enclosing a circle around a point"""
+    lat_delta = radius_km / KM_PER_DEGREE_LAT
+    south = max(latitude - lat_delta, -90.0)
+    north = min(latitude + lat_delta, 90.0)
+
+    # Longitude degrees shrink towards the poles; use the widest latitude in the box
+    widest = max(abs(south), abs(north))
+    if widest >= 89.9:
+        return south, -180.0, north, 180.0
+    lng_delta = radius_km / (KM_PER_DEGREE_LAT * math.cos(math.radians(widest)))
+    if lng_delta >= 180:
+        return south, -180.0, north, 180.0
+
+    west = longitude - lng_delta
+    east = longitude + lng_delta
+    if west < -180:
+        west += 360
+    if east > 180:
+        east -= 360
+    return south, west, north, east
+
+
+def cell_ranges(south, west, north, east):
+    """Q object matching every grid cell that intersects the bounding box"""
+    if west <= east:
+        column_spans = [(cell_column(west), cell_column(east))]
+    else:
+        # Box crosses the antimeridian
+        column_spans = [(cell_column(west), GRID_COLUMNS - 1), (0, cell_column(east))]
+
+    query = Q()
+    for row in range(cell_row(south), cell_row(north) + 1):
+        base = row * GRID_COLUMNS
+        for first, last in column_spans:
+            query |= Q(geo_cell__range=(base + first, base + last))
+    return query
+
+
+def coordinate_filter(south, west, north, east):
+    """Exact lat/lng predicate for a bounding box"""
+    query = Q(latitude__gte=south, latitude__lte=north)
+    if west <= east:
+        return query & Q(longitude__gte=west, longitude__lte=east)
+    return query & (Q(longitude__gte=west) | Q(longitude__lte=east))
+
+
+def distance_expression(latitude, longitude):
+    """Haversine distance in km from a point to each listing, as an SQL expression"""
+    lat = math.radians(latitude)
+    row_lat = Radians(Cast('latitude', FloatField()))
+    row_lng = Radians(Cast('longitude', FloatField()))
+    dlat = (row_lat - Value(lat)) / Value(2.0)
+    dlng = (row_lng - Value(math.radians(longitude))) / Value(2.0)
+    a = Power(Sin(dlat), 2) + Value(math.cos(lat)) * Cos(row_lat) * Power(Sin(dlng), 2)
+    return ExpressionWrapper(
+        Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(a)),
+        output_field=FloatField(),
+    )
+
+
+def within_bbox(queryset, south, west, north, east):
+    """Listings inside a bounding box"""
+    if cell_row(north) - cell_row(south) < MAX_CELL_ROWS:
+        queryset = queryset.filter(cell_ranges(south, west, north, east))
+    return queryset.filter(coordinate_filter(south, west, north, east))
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    """Listings within ``radius_km`` of a point, annotated with ``distance_km``"""
+    box = bounding_box(latitude, longitude, radius_km)
+    return within_bbox(queryset, *box).annotate(
+        distance_km=distance_expression(latitude, longitude)
+    ).filter(distance_km__lte=radius_km)
+
+
+def parse_geo_params(params):
+    """
+    Read ``lat``/``lng``/``radius_km`` or ``bbox=south,west,north,east`` from
+    request parameters. Returns None if neither is present and raises
+    ValueError for malformed or out-of-range values.
+    """
+    bbox = params.get('bbox')
+    if bbox:
+        parts = [float(part) for part in bbox.split(',')]
+        if len(parts) != 4:
+            raise ValueError('bbox must be south,west,north,east')
+        south, west, north, east = parts
+        if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+            raise ValueError('bbox is out of range')
+        result = {'bbox': (south, west, north, east)}
+        # A point is optional with a bbox; it enables distance sorting
+        if params.get('lat') and params.get('lng'):
+            result['point'] = _parse_point(params)
+        return result
+
+    if params.get('lat') or params.get('lng'):
+        latitude, longitude = _parse_point(params)
+        radius_km = float(params.get('radius_km') or 10)
+        if not 0 < radius_km <= MAX_RADIUS_KM:
+            raise ValueError(f'radius_km must be between 0 and {MAX_RADIUS_KM}')
+        return {'point': (latitude, longitude), 'radius_km': radius_km}
+
+    return None
+
+
+def _parse_point(params):
+    latitude = float(params.get('lat'))
+    longitude = float(params.get('lng'))
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError('lat/lng is out of range')
+    return latitude, longitude
+
+
+def apply_geo_filter(queryset, geo):
+    """Apply the result of ``parse_geo_params`` to a listing queryset"""
+    if geo is None:
+        return queryset
+    if 'bbox' in geo:
+        queryset = within_bbox(queryset, *geo['bbox'])
+        if 'point' in geo:
+            queryset = queryset.annotate(distance_km=distance_expression(*geo['point']))
+        return queryset
+    latitude, longitude = geo['point']
+    return within_radius(queryset, latitude, longitude, geo['radius_km'])
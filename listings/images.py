@@ -0,0 +1,179 @@
+"""
+Resized variants of listing photos.
+
+Each uploaded ``ListingImage`` gets ``thumb``, ``card`` and ``full`` variants
+in WebP and JPEG. They are rendered by a Celery task
+(``listings.tasks.render_image_variants``) queued once the upload commits,
+so the request that saved the photo never waits on Pillow and queued jobs
+survive web worker restarts. A variant still missing when a page asks for it
+is rendered on first request (``listings.views.image_variant``).
+
+``ListingImage.rendered_variants`` is a bitmask of the variants in storage,
+set with an atomic ``OR`` as each one is stored, so building a page's image
+URLs reads a field already loaded with the photo instead of asking storage
+once per URL. Variant names are derived from the original file name, and
+replacing a photo clears the mask, so a new photo never serves stale
+variants.
+"""
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.urls import reverse
+
+# name: max width in pixels
+VARIANTS = {
+    'thumb': 320,
+    'card': 640,
+    'full': 1600,
+}
+
+FORMATS = ('webp', 'jpg')
+
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+# PlatformSettings.image_quality -> variant ('original' serves the upload)
+QUALITY_VARIANTS = {
+    'low': 'thumb',
+    'medium': 'card',
+    'high': 'full',
+    'original': None,
+}
+
+
+def render_variants(data, specs):
+    """
+    Render ``specs`` ([(variant, fmt), ...]) from the original image bytes;
+    returns ``{(variant, fmt): bytes}``.
+    """
+    from PIL import Image, ImageOps
+
+    source = Image.open(io.BytesIO(data))
+    source = ImageOps.exif_transpose(source)
+    if source.mode not in ('RGB', 'RGBA'):
+        source = source.convert('RGBA' if 'transparency' in source.info else 'RGB')
+
+    rendered = {}
+    for variant, fmt in specs:
+        width = VARIANTS[variant]
+        image = source.copy()
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        if fmt == 'jpg' and image.mode == 'RGBA':
+            image = image.convert('RGB')
+        output = io.BytesIO()
+        if fmt == 'webp':
+            image.save(output, 'WEBP', quality=WEBP_QUALITY, method=4)
+        else:
+            image.save(output, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+        rendered[(variant, fmt)] = output.getvalue()
+    return rendered
+
+
+def variant_name(image_name, variant, fmt):
+    stem, _ = os.path.splitext(image_name)
+    return f'listings/variants/{stem.replace("listings/", "", 1)}/{variant}.{fmt}'
+
+
+def all_specs():
+    return [(variant, fmt) for variant in VARIANTS for fmt in FORMATS]
+
+
+def spec_bit(variant, fmt):
+    """Bit of a variant in ``ListingImage.rendered_variants``"""
+    return 1 << all_specs().index((variant, fmt))
+
+
+ALL_RENDERED = (1 << len(all_specs())) - 1
+
+
+def missing_specs(image_name, specs=None):
+    return [
+        (variant, fmt)
+        for variant, fmt in (specs or all_specs())
+        if not default_storage.exists(variant_name(image_name, variant, fmt))
+    ]
+
+
+def save_variants(image_name, rendered):
+    for (variant, fmt), content in rendered.items():
+        name = variant_name(image_name, variant, fmt)
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(content))
+
+
+def mark_rendered(listing_image, specs):
+    """Record stored variants; a photo replaced meanwhile keeps its own mask"""
+    from .models import ListingImage
+
+    mask = 0
+    for variant, fmt in specs:
+        mask |= spec_bit(variant, fmt)
+    listing_image.rendered_variants |= mask
+    return ListingImage.objects.filter(pk=listing_image.pk, image=listing_image.image.name).update(
+        rendered_variants=F('rendered_variants').bitor(mask),
+    )
+
+
+def read_original(image_name):
+    with default_storage.open(image_name, 'rb') as handle:
+        return handle.read()
+
+
+def render_missing(listing_image):
+    """Render and store every variant of a photo not in storage yet; returns how many"""
+    image_name = listing_image.image.name
+    specs = missing_specs(image_name)
+    if specs:
+        save_variants(image_name, render_variants(read_original(image_name), specs))
+    mark_rendered(listing_image, all_specs())
+    return len(specs)
+
+
+def schedule_variants(listing_image):
+    """Queue the variants of a photo once the upload has committed"""
+    if not listing_image.image or listing_image.rendered_variants == ALL_RENDERED:
+        return
+    from .tasks import render_image_variants
+
+    image_id = listing_image.pk
+    transaction.on_commit(lambda: render_image_variants.delay(image_id))
+
+
+def ensure_variant(listing_image, variant, fmt):
+    """Return the storage name of a variant, rendering it now if it is missing"""
+    image_name = listing_image.image.name
+    name = variant_name(image_name, variant, fmt)
+    if not default_storage.exists(name):
+        save_variants(image_name, render_variants(read_original(image_name), [(variant, fmt)]))
+    mark_rendered(listing_image, [(variant, fmt)])
+    return name
+
+
+def variant_url(listing_image, variant, fmt='jpg'):
+    """
+    URL for a variant: the stored file when ``rendered_variants`` has it,
+    otherwise the view that renders it on demand.
+    """
+    if listing_image.rendered_variants & spec_bit(variant, fmt):
+        return default_storage.url(variant_name(listing_image.image.name, variant, fmt))
+    return reverse('listings:image_variant', args=[listing_image.pk, variant, fmt])
+
+
+def srcset(listing_image, fmt='jpg'):
+    return ', '.join(
+        f'{variant_url(listing_image, variant, fmt)} {width}w'
+        for variant, width in VARIANTS.items()
+    )
+
+
+def url_for_quality(listing_image, quality, fmt='jpg'):
+    """URL matching a client's ``image_quality`` preference"""
+    variant = QUALITY_VARIANTS.get(quality, QUALITY_VARIANTS['medium'])
+    if variant is None:
+        return listing_image.image.url
+    return variant_url(listing_image, variant, fmt)
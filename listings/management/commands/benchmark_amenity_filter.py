@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from listings.amenities import filter_by_amenities, parse_amenities
+from listings.models import Amenity, Listing
+
+
+class Command(BaseCommand):
+    help = 'Compare the amenity bitmask filter against one M2M join per amenity'
+
+    def add_arguments(self, parser):
+        parser.add_argument('amenity_sets', nargs='*', help='Comma separated amenity slugs, e.g. wifi,parking')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=12)
+
+    def join_filter(self, slugs):
+        queryset = Listing.objects.filter(is_active=True, is_approved=True)
+        for slug in slugs:
+            queryset = queryset.filter(amenities__slug=slug)
+        return queryset.distinct().order_by('-created_at', '-id')
+
+    def mask_filter(self, slugs):
+        queryset = Listing.objects.filter(is_active=True, is_approved=True)
+        return filter_by_amenities(queryset, slugs).order_by('-created_at', '-id')
+
+    def time_query(self, build, slugs, repeat, page_size):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            queryset = build(slugs)
+            count = queryset.count()
+            list(queryset.values_list('id', flat=True)[:page_size])
+        return (time.perf_counter() - start) / repeat * 1000, count
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        page_size = options['page_size']
+        amenity_sets = [parse_amenities(value) for value in options['amenity_sets']]
+        if not amenity_sets:
+            # Default to the most common amenities, one to three at a time
+            popular = list(Amenity.objects.order_by('name').values_list('slug', flat=True)[:3])
+            if not popular:
+                raise CommandError('No amenities to benchmark')
+            amenity_sets = [popular[:size] for size in range(1, len(popular) + 1)]
+
+        self.stdout.write(f'{Listing.objects.count()} listings, {repeat} runs per amenity set')
+        self.stdout.write(f"{'amenities':<32}{'rows':>8}{'join ms':>12}{'mask ms':>12}{'speedup':>10}")
+
+        for slugs in amenity_sets:
+            join_ms, join_count = self.time_query(self.join_filter, slugs, repeat, page_size)
+            mask_ms, mask_count = self.time_query(self.mask_filter, slugs, repeat, page_size)
+            if join_count != mask_count:
+                self.stderr.write(f'{",".join(slugs)}: join found {join_count}, mask found {mask_count}')
+            speedup = join_ms / mask_ms if mask_ms else float('inf')
+            self.stdout.write(
+                f'{",".join(slugs):<32}{mask_count:>8}{join_ms:>12.2f}{mask_ms:>12.2f}{speedup:>9.1f}x'
+            )
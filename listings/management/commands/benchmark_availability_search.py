@@ -0,0 +1,122 @@
+import datetime
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import User
+from bookings.availability import BLOCKING_STATUSES
+from bookings.models import Booking
+from listings.filters import filter_listings
+from listings.models import Listing
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare the check_in/check_out anti-join against one availability query per listing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed-bookings', type=int, default=0,
+                            help='Insert this many random bookings first (rolled back afterwards)')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded bookings')
+        parser.add_argument('--city', default='')
+        parser.add_argument('--guests', default='')
+        parser.add_argument('--days-ahead', type=int, default=30)
+        parser.add_argument('--nights', type=int, default=7)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--page-size', type=int, default=12)
+
+    def seed(self, count):
+        listing_ids = list(Listing.objects.published().values_list('id', flat=True))
+        if not listing_ids:
+            raise CommandError('Seeding needs at least one published listing')
+        user = User.objects.order_by('pk').first() or User.objects.create_user(
+            email='benchmark@example.com', password=None, first_name='Benchmark', last_name='User'
+        )
+        today = timezone.now().date()
+        statuses = list(BLOCKING_STATUSES) + ['cancelled', 'completed']
+        batch = []
+        for _ in range(count):
+            check_in = today + datetime.timedelta(days=random.randint(-60, 365))
+            batch.append(Booking(
+                user=user,
+                listing_id=random.choice(listing_ids),
+                check_in=check_in,
+                check_out=check_in + datetime.timedelta(days=random.randint(1, 14)),
+                total_price=0,
+                status=random.choice(statuses),
+            ))
+            if len(batch) == 5000:
+                Booking.objects.bulk_create(batch)
+                batch = []
+        Booking.objects.bulk_create(batch)
+
+    def per_listing(self, params, check_in, check_out, page_size):
+        """The old way: filter, then one overlap query per candidate listing"""
+        queryset, ordering = filter_listings(Listing.objects.published(), params)
+        available = []
+        for listing_id in queryset.order_by(*ordering).values_list('id', flat=True):
+            if not Booking.objects.filter(
+                listing_id=listing_id,
+                status__in=BLOCKING_STATUSES,
+                check_in__lt=check_out,
+                check_out__gt=check_in,
+            ).exists():
+                available.append(listing_id)
+        return len(available), available[:page_size]
+
+    def anti_join(self, params, check_in, check_out, page_size):
+        stay = dict(params, check_in=check_in.isoformat(), check_out=check_out.isoformat())
+        queryset, ordering = filter_listings(Listing.objects.published(), stay)
+        queryset = queryset.order_by(*ordering)
+        return queryset.count(), list(queryset.values_list('id', flat=True)[:page_size])
+
+    def time_query(self, run, repeat, *args):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = run(*args)
+        return (time.perf_counter() - start) / repeat * 1000, result
+
+    def benchmark(self, options):
+        params = {name: options[name] for name in ('city', 'guests') if options[name]}
+        check_in = timezone.now().date() + datetime.timedelta(days=options['days_ahead'])
+        check_out = check_in + datetime.timedelta(days=options['nights'])
+        # The old search ignored stay limits, so compare on listings without them
+        if Listing.objects.published().exclude(minimum_stay__lte=options['nights']).exists():
+            self.stderr.write('Some listings have a minimum stay above --nights; counts may differ')
+
+        self.stdout.write(
+            f'{Listing.objects.published().count()} listings, {Booking.objects.count()} bookings, '
+            f'stay {check_in} to {check_out}, {options["repeat"]} runs'
+        )
+        args = (params, check_in, check_out, options['page_size'])
+        loop_ms, (loop_count, _) = self.time_query(self.per_listing, options['repeat'], *args)
+        join_ms, (join_count, _) = self.time_query(self.anti_join, options['repeat'], *args)
+        if loop_count != join_count:
+            self.stderr.write(f'per-listing found {loop_count}, anti-join found {join_count}')
+
+        self.stdout.write(f"{'approach':<16}{'available':>10}{'ms':>12}")
+        self.stdout.write(f"{'per listing':<16}{loop_count:>10}{loop_ms:>12.2f}")
+        self.stdout.write(f"{'anti-join':<16}{join_count:>10}{join_ms:>12.2f}")
+        speedup = loop_ms / join_ms if join_ms else float('inf')
+        self.stdout.write(f'speedup {speedup:.1f}x')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options['seed_bookings']:
+                    started = time.perf_counter()
+                    self.seed(options['seed_bookings'])
+                    self.stdout.write(
+                        f'Seeded {options["seed_bookings"]} bookings in {time.perf_counter() - started:.1f}s'
+                    )
+                self.benchmark(options)
+                if options['seed_bookings'] and not options['keep']:
+                    raise Rollback
+        except Rollback:
+            self.stdout.write('Seeded bookings rolled back')
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from listings.models import Listing
+from listings.search import search_listings
+
+
+class Command(BaseCommand):
+    help = 'Compare ranked index search against the old icontains (LIKE) search'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*', default=['beach', 'cape town', 'apartment wifi'])
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=12)
+
+    def like_search(self, query):
+        return Listing.objects.filter(is_active=True, is_approved=True).filter(
+            Q(title__icontains=query) |
+            Q(description__icontains=query) |
+            Q(city__icontains=query) |
+            Q(country__icontains=query)
+        ).order_by('-created_at')
+
+    def index_search(self, query):
+        queryset = Listing.objects.filter(is_active=True, is_approved=True)
+        ranked = search_listings(queryset, query)
+        if ranked is None:
+            return self.like_search(query)
+        return ranked.order_by('-search_rank', '-created_at')
+
+    def time_query(self, build, query, repeat, page_size):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            queryset = build(query)
+            queryset.count()
+            list(queryset.values_list('id', flat=True)[:page_size])
+        return (time.perf_counter() - start) / repeat * 1000
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        page_size = options['page_size']
+        self.stdout.write(f'{Listing.objects.count()} listings, {repeat} runs per query')
+        self.stdout.write(f"{'query':<24}{'LIKE ms':>12}{'index ms':>12}{'speedup':>10}")
+
+        for query in options['queries']:
+            like_ms = self.time_query(self.like_search, query, repeat, page_size)
+            index_ms = self.time_query(self.index_search, query, repeat, page_size)
+            speedup = like_ms / index_ms if index_ms else float('inf')
+            self.stdout.write(f'{query:<24}{like_ms:>12.2f}{index_ms:>12.2f}{speedup:>9.1f}x')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from listings.images import ALL_RENDERED
+from listings.models import ListingImage
+from listings.tasks import render_image_variants
+
+
+class Command(BaseCommand):
+    help = 'Queue rendering of missing thumb/card/full variants for every listing image (--now renders here)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--now', action='store_true', help='Render in this process instead of the Celery workers')
+
+    def handle(self, *args, **options):
+        image_ids = list(ListingImage.objects.exclude(image='').exclude(
+            rendered_variants=ALL_RENDERED,
+        ).values_list('pk', flat=True))
+        for image_id in image_ids:
+            if options['now']:
+                render_image_variants(image_id)
+            else:
+                render_image_variants.delay(image_id)
+        action = 'Rendered' if options['now'] else 'Queued'
+        self.stdout.write(self.style.SUCCESS(f'{action} variants for {len(image_ids)} images'))
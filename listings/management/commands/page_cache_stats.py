@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from listings.cache import cache_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters for the public listing page cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing')
+
+    def handle(self, *args, **options):
+        stats = cache_stats()
+        for name in ('hit', 'stale', 'miss', 'wait'):
+            self.stdout.write(f'{name:<10}{stats[name]:>12}')
+        ratio = stats['hit_ratio']
+        self.stdout.write(f"{'hit ratio':<10}{'-' if ratio is None else f'{ratio:.1%}':>12}")
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
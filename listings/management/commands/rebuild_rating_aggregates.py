@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from listings.models import Listing
+
+
+class Command(BaseCommand):
+    help = 'Recompute stored rating sum/count/average on every listing from reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = Listing.rebuild_rating_aggregates(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Updated rating aggregates on {updated} listings'))
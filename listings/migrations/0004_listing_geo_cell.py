@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-17 19:35
+
+from django.db import migrations, models
+
+
+def populate_geo_cells(apps, schema_editor):
+    from listings.geo import cell_for
+    Listing = apps.get_model('listings', 'Listing')
+    batch = []
+    rows = Listing.objects.filter(latitude__isnull=False, longitude__isnull=False).only('id', 'latitude', 'longitude')
+    for listing in rows.iterator(chunk_size=1000):
+        listing.geo_cell = cell_for(listing.latitude, listing.longitude)
+        batch.append(listing)
+        if len(batch) >= 1000:
+            Listing.objects.bulk_update(batch, ['geo_cell'])
+            batch = []
+    if batch:
+        Listing.objects.bulk_update(batch, ['geo_cell'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0003_listing_rating_average_listing_rating_count_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='geo_cell',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['is_active', 'is_approved', 'geo_cell'], name='listings_li_is_acti_d8639e_idx'),
+        ),
+        migrations.RunPython(populate_geo_cells, migrations.RunPython.noop),
+    ]
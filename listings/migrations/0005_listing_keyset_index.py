@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 19:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0004_listing_geo_cell'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['is_active', 'is_approved', 'created_at', 'id'], name='listings_li_is_acti_9e4a5e_idx'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2 on 2026-10-17 19:44
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def backfill_amenity_bits(apps, schema_editor):
+    Amenity = apps.get_model('listings', 'Amenity')
+    Listing = apps.get_model('listings', 'Listing')
+
+    taken = set()
+    bits = {}
+    for position, amenity in enumerate(Amenity.objects.order_by('pk')):
+        slug = base = slugify(amenity.name) or f'amenity-{amenity.pk}'
+        suffix = 2
+        while slug in taken:
+            slug = f'{base}-{suffix}'
+            suffix += 1
+        taken.add(slug)
+        amenity.slug = slug
+        amenity.bit = position if position < 63 else None
+        amenity.save(update_fields=['slug', 'bit'])
+        bits[amenity.pk] = amenity.bit
+
+    masks = {}
+    for listing_id, amenity_id in Listing.amenities.through.objects.values_list('listing_id', 'amenity_id'):
+        if bits.get(amenity_id) is not None:
+            masks[listing_id] = masks.get(listing_id, 0) | (1 << bits[amenity_id])
+    for listing_id, mask in masks.items():
+        Listing.objects.filter(pk=listing_id).update(amenity_mask=mask)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_listing_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='amenity',
+            name='bit',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='amenity',
+            name='slug',
+            field=models.SlugField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='amenity_mask',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_amenity_bits, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='amenity',
+            name='slug',
+            field=models.SlugField(blank=True, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['is_active', 'is_approved', 'amenity_mask'], name='listings_li_is_acti_d8ac65_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2 on 2026-10-17 19:51
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0006_amenity_mask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='cleaning_fee',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='monthly_discount',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Percent off stays of 28 nights or more', max_digits=5, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)]),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='weekend_price_per_day',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Nightly rate for Friday and Saturday nights', max_digits=10, null=True, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='weekly_discount',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Percent off stays of 7 nights or more', max_digits=5, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)]),
+        ),
+        migrations.CreateModel(
+            name='SeasonalRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=100)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('price_per_day', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(0)])),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seasonal_rates', to='listings.listing')),
+            ],
+            options={
+                'ordering': ['start_date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='seasonalrate',
+            index=models.Index(fields=['listing', 'start_date', 'end_date'], name='listings_se_listing_28f52a_idx'),
+        ),
+    ]
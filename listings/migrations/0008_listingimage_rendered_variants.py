@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-17 21:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0007_pricing_rules'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listingimage',
+            name='rendered_variants',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,8 +1,11 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Cast, Floor
+from decimal import Decimal, ROUND_HALF_UP
 from django.conf import settings
 import uuid
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator, MaxValueValidator
+from .cache import invalidate_listing, invalidate_all
 
 
 class Category(models.Model):
@@ -26,7 +29,12 @@ class Category(models.Model):
 
 class Amenity(models.Model):
     name = models.CharField(max_length=100)
+    slug = models.SlugField(unique=True, blank=True)
     icon = models.CharField(max_length=50, blank=True)
+    # Position in Listing.amenity_mask (see listings.amenities)
+    bit = models.PositiveSmallIntegerField(unique=True, null=True, blank=True, editable=False)
+    
+    SAVE_ATTEMPTS = 5
     
     class Meta:
         verbose_name_plural = "Amenities"
@@ -34,6 +42,47 @@ class Amenity(models.Model):
     
     def __str__(self):
         return self.name
+    
+    def save(self, *args, **kwargs):
+        from .amenities import next_free_bit, unique_slug
+        
+        # Slug and bit are picked read-then-write; the unique constraints catch a
+        # concurrent save that picked the same, and the pick is simply made again
+        pick_slug, pick_bit = not self.slug, self.bit is None
+        for attempt in range(self.SAVE_ATTEMPTS):
+            if pick_slug:
+                self.slug = unique_slug(self.name, self.pk)
+            if pick_bit:
+                self.bit = next_free_bit()
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                return
+            except IntegrityError:
+                if not (pick_slug or pick_bit) or attempt == self.SAVE_ATTEMPTS - 1:
+                    raise
+
+
+def listing_card_prefetches(prefix=''):
+    """Prefetches for everything a listing card renders, optionally through a relation"""
+    return [
+        models.Prefetch(
+            f'{prefix}images',
+            queryset=ListingImage.objects.filter(is_primary=True),
+            to_attr='primary_images',
+        ),
+        models.Prefetch(f'{prefix}amenities', queryset=Amenity.objects.all()),
+    ]
+
+
+class ListingQuerySet(models.QuerySet):
+    def published(self):
+        """Listings visible to guests"""
+        return self.filter(is_active=True, is_approved=True)
+    
+    def for_cards(self):
+        """Load host, category, primary image and amenities in a fixed number of queries"""
+        return self.select_related('host', 'category').prefetch_related(*listing_card_prefetches())
 
 
 class Listing(models.Model):
@@ -48,6 +97,20 @@ class Listing(models.Model):
     # Pricing
     price_per_day = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     currency = models.CharField(max_length=3, default='USD')
+    # Pricing rules (see bookings.pricing)
+    weekend_price_per_day = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True, validators=[MinValueValidator(0)],
+        help_text='Nightly rate for Friday and Saturday nights'
+    )
+    cleaning_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)])
+    weekly_discount = models.DecimalField(
+        max_digits=5, decimal_places=2, default=0, validators=[MinValueValidator(0), MaxValueValidator(100)],
+        help_text='Percent off stays of 7 nights or more'
+    )
+    monthly_discount = models.DecimalField(
+        max_digits=5, decimal_places=2, default=0, validators=[MinValueValidator(0), MaxValueValidator(100)],
+        help_text='Percent off stays of 28 nights or more'
+    )
     
     # Location
     address = models.CharField(max_length=255, blank=True)
@@ -57,9 +120,11 @@ class Listing(models.Model):
     zip_code = models.CharField(max_length=20, blank=True)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    geo_cell = models.PositiveIntegerField(null=True, blank=True, editable=False)  # see listings.geo
     
     # Details
     amenities = models.ManyToManyField(Amenity, blank=True, related_name='listings')
+    amenity_mask = models.BigIntegerField(default=0, editable=False)  # see listings.amenities
     max_guests = models.PositiveIntegerField(default=1)
     bedrooms = models.PositiveIntegerField(default=1)
     bathrooms = models.PositiveIntegerField(default=1)
@@ -76,11 +141,21 @@ class Listing(models.Model):
     minimum_stay = models.PositiveIntegerField(default=1)
     maximum_stay = models.PositiveIntegerField(null=True, blank=True)
     
+    # Rating aggregates, maintained from reviews (see reviews.signals)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_average = models.DecimalField(max_digits=3, decimal_places=2, null=True, blank=True)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     last_booked = models.DateTimeField(null=True, blank=True)
     
+    # Text fields covered by the search index (see listings.search)
+    SEARCH_FIELDS = ('title', 'description', 'city', 'country')
+    
+    objects = ListingQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
@@ -89,6 +164,9 @@ class Listing(models.Model):
             models.Index(fields=['city', 'country']),
             models.Index(fields=['price_per_day']),
             models.Index(fields=['is_active', 'is_approved']),
+            models.Index(fields=['is_active', 'is_approved', 'geo_cell']),
+            models.Index(fields=['is_active', 'is_approved', 'created_at', 'id']),
+            models.Index(fields=['is_active', 'is_approved', 'amenity_mask']),
         ]
     
     def __str__(self):
@@ -97,22 +175,125 @@ class Listing(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
+        
+        from .geo import cell_for
+        self.geo_cell = cell_for(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geo_cell'}
+        
         super().save(*args, **kwargs)
+        
+        # Keep the search index in step with the text fields
+        if update_fields is None or set(update_fields) & set(self.SEARCH_FIELDS):
+            from .search import index_listing
+            index_listing(self)
+    
+    @property
+    def primary_image(self):
+        """Primary image, served from the for_cards() prefetch when available"""
+        if hasattr(self, 'primary_images'):
+            return self.primary_images[0] if self.primary_images else None
+        return self.images.filter(is_primary=True).first()
     
     @property
     def average_rating(self):
-        """Calculate average rating from reviews."""
-        from reviews.models import Review
-        reviews = Review.objects.filter(listing=self)
-        if reviews.exists():
-            return reviews.aggregate(models.Avg('rating'))['rating__avg']
-        return None
+        """Average rating from reviews (stored on the listing)."""
+        if not self.rating_count:
+            return None
+        return self.rating_average
     
     @property
     def total_reviews(self):
-        """Count total reviews."""
+        """Count total reviews (stored on the listing)."""
+        return self.rating_count
+    
+    @classmethod
+    def adjust_rating(cls, listing_id, rating_delta, count_delta):
+        """Apply a review change to the stored rating aggregates in SQL."""
+        with transaction.atomic():
+            updated = cls.objects.filter(pk=listing_id).update(
+                rating_sum=models.F('rating_sum') + rating_delta,
+                rating_count=models.F('rating_count') + count_delta,
+            )
+            if updated:
+                # Separate statement so the average reads the new sum/count on every backend
+                cls.objects.filter(pk=listing_id).update(rating_average=cls._average_expression())
+        if updated:
+            invalidate_listing(listing_id)
+    
+    @classmethod
+    def rebuild_rating_aggregates(cls, batch_size=1000):
+        """Recompute rating aggregates for every listing from reviews. Returns rows updated."""
         from reviews.models import Review
-        return Review.objects.filter(listing=self).count()
+        totals = {
+            row['listing_id']: row
+            for row in Review.objects.values('listing_id').order_by().annotate(
+                total=models.Sum('rating'), count=models.Count('id')
+            )
+        }
+        updated = 0
+        batch = []
+        fields = ['id', 'rating_sum', 'rating_count', 'rating_average']
+        for listing in cls.objects.only(*fields).order_by().iterator(chunk_size=batch_size):
+            row = totals.get(listing.id)
+            rating_sum = row['total'] if row else 0
+            rating_count = row['count'] if row else 0
+            rating_average = (
+                (Decimal(rating_sum) / rating_count).quantize(Decimal('0.01'), ROUND_HALF_UP) if rating_count else None
+            )
+            if (listing.rating_sum, listing.rating_count, listing.rating_average) == (
+                rating_sum, rating_count, rating_average
+            ):
+                continue
+            listing.rating_sum = rating_sum
+            listing.rating_count = rating_count
+            listing.rating_average = rating_average
+            batch.append(listing)
+            if len(batch) >= batch_size:
+                cls.objects.bulk_update(batch, fields[1:])
+                updated += len(batch)
+                batch = []
+        if batch:
+            cls.objects.bulk_update(batch, fields[1:])
+            updated += len(batch)
+        if updated:
+            invalidate_all()
+        return updated
+    
+    @staticmethod
+    def _average_expression():
+        # Whole cents rounded half-up in integer arithmetic, like rebuild_rating_aggregates;
+        # only the exact cents then go through a float
+        cents = Floor(
+            (models.F('rating_sum') * 200 + models.F('rating_count')) / (models.F('rating_count') * 2)
+        )
+        return models.Case(
+            models.When(rating_count=0, then=models.Value(None)),
+            default=Cast(
+                Cast(cents, models.FloatField()) / models.Value(100.0),
+                output_field=models.DecimalField(max_digits=3, decimal_places=2),
+            ),
+            output_field=models.DecimalField(max_digits=3, decimal_places=2),
+        )
+
+
+class SeasonalRate(models.Model):
+    """Nightly rate override for a date range (both ends inclusive)"""
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='seasonal_rates')
+    name = models.CharField(max_length=100, blank=True)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    price_per_day = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    
+    class Meta:
+        ordering = ['start_date']
+        indexes = [
+            models.Index(fields=['listing', 'start_date', 'end_date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.name or 'Season'} for {self.listing.title} ({self.start_date} to {self.end_date})"
 
 
 class ListingImage(models.Model):
@@ -121,9 +302,54 @@ class ListingImage(models.Model):
     caption = models.CharField(max_length=200, blank=True)
     is_primary = models.BooleanField(default=False)
     order = models.PositiveIntegerField(default=0)
+    # Bitmask of the variants in storage (listings.images.spec_bit)
+    rendered_variants = models.PositiveSmallIntegerField(default=0, editable=False)
     
     class Meta:
         ordering = ['order', '-is_primary']
     
     def __str__(self):
         return f"Image for {self.listing.title}"
+    
+    def save(self, *args, **kwargs):
+        if self.pk and self.rendered_variants:
+            # A replaced photo has none of its variants yet
+            stored = ListingImage.objects.filter(pk=self.pk).values_list('image', flat=True).first()
+            if stored != self.image.name:
+                self.rendered_variants = 0
+        super().save(*args, **kwargs)
+    
+    def variant_url(self, variant, fmt='jpg'):
+        from .images import variant_url
+        return variant_url(self, variant, fmt)
+    
+    @property
+    def thumb_url(self):
+        return self.variant_url('thumb')
+    
+    @property
+    def card_url(self):
+        return self.variant_url('card')
+    
+    @property
+    def srcset(self):
+        from .images import srcset
+        return srcset(self)
+    
+    @property
+    def webp_srcset(self):
+        from .images import srcset
+        return srcset(self, 'webp')
+
+
+class ListingSearchTerm(models.Model):
+    """Inverted index entry: one row per (term, listing) with its weight"""
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=64)
+    weight = models.FloatField(default=1.0)
+    
+    class Meta:
+        unique_together = ['term', 'listing']
+    
+    def __str__(self):
+        return f"{self.term} -> {self.listing_id}"
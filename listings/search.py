@@ -0,0 +1,127 @@
+"""
+Full-text search for listings.
+
+Listings are tokenized into an inverted index (``ListingSearchTerm`` rows keyed
+by term) so a search becomes an indexed ``term IN (...)`` lookup instead of a
+``LIKE '%x%'`` scan over every text column. Results are ranked with a TF-IDF
+style score that favours matches in the title and location.
+"""
+import math
+import re
+import unicodedata
+from collections import Counter
+
+from django.db import models, transaction
+from django.db.models import Case, When, Value, F, Sum, FloatField
+
+from .models import Listing, ListingSearchTerm
+
+
+# Fields that feed the index and how much a match in each one is worth
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'city': 2.0,
+    'country': 2.0,
+    'description': 1.0,
+}
+
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in',
+    'is', 'it', 'of', 'on', 'or', 'the', 'to', 'with',
+}
+
+MAX_TERM_LENGTH = 64
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Split text into normalized search terms"""
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in TOKEN_RE.findall(text)
+        if len(token) > 1 and token not in STOP_WORDS
+    ]
+
+
+def build_terms(listing):
+    """Return {term: weight} for a listing across all indexed fields"""
+    weights = Counter()
+    for field, field_weight in FIELD_WEIGHTS.items():
+        tokens = tokenize(getattr(listing, field, ''))
+        if not tokens:
+            continue
+        counts = Counter(tokens)
+        # Dampen long descriptions so repeating a word does not dominate
+        for term, count in counts.items():
+            weights[term] += field_weight * (1 + math.log(count))
+    return weights
+
+
+def index_listing(listing):
+    """Replace the index rows for a single listing"""
+    weights = build_terms(listing)
+    with transaction.atomic():
+        ListingSearchTerm.objects.filter(listing=listing).delete()
+        ListingSearchTerm.objects.bulk_create([
+            ListingSearchTerm(listing=listing, term=term, weight=weight)
+            for term, weight in weights.items()
+        ])
+
+
+def rebuild_index(batch_size=500):
+    """Rebuild the whole index from scratch. Returns the number of listings indexed."""
+    fields = ['id'] + list(FIELD_WEIGHTS)
+    indexed = 0
+    with transaction.atomic():
+        ListingSearchTerm.objects.all().delete()
+        rows = []
+        for listing in Listing.objects.only(*fields).order_by().iterator(chunk_size=batch_size):
+            rows.extend(
+                ListingSearchTerm(listing_id=listing.id, term=term, weight=weight)
+                for term, weight in build_terms(listing).items()
+            )
+            indexed += 1
+            if len(rows) >= batch_size * 20:
+                ListingSearchTerm.objects.bulk_create(rows, batch_size=batch_size * 2)
+                rows = []
+        ListingSearchTerm.objects.bulk_create(rows, batch_size=batch_size * 2)
+    return indexed
+
+
+def term_idf(terms):
+    """Inverse document frequency for each query term (one grouped query)"""
+    total = Listing.objects.count() or 1
+    doc_freq = dict(
+        ListingSearchTerm.objects.filter(term__in=terms)
+        .values_list('term')
+        .annotate(df=models.Count('id'))
+        .order_by()
+    )
+    return {term: math.log(1 + total / (1 + doc_freq.get(term, 0))) for term in terms}
+
+
+def search_listings(queryset, query):
+    """
+    Restrict a listing queryset to documents matching ``query`` and annotate
+    ``search_rank``. Any filters already applied to ``queryset`` still apply.
+
+    Returns ``None`` when the query has no searchable terms so callers can
+    fall back to their own behaviour.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return None
+
+    idf = term_idf(terms)
+    rank = Case(
+        *[When(search_terms__term=term, then=F('search_terms__weight') * Value(idf[term]))
+          for term in terms],
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+    return queryset.filter(search_terms__term__in=terms).annotate(search_rank=Sum(rank))
@@ -0,0 +1,65 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .amenities import refresh_mask, set_bit, clear_bit
+from .cache import invalidate_listing, invalidate_all
+from .images import schedule_variants
+from .models import Listing, ListingImage, SeasonalRate, Category, Amenity
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+def listing_changed(sender, instance, **kwargs):
+    invalidate_listing(instance.pk)
+
+
+@receiver(post_save, sender=ListingImage)
+@receiver(post_delete, sender=ListingImage)
+@receiver(post_save, sender=SeasonalRate)
+@receiver(post_delete, sender=SeasonalRate)
+def listing_related_changed(sender, instance, **kwargs):
+    invalidate_listing(instance.listing_id)
+
+
+@receiver(post_save, sender=ListingImage)
+def render_image_variants(sender, instance, **kwargs):
+    schedule_variants(instance)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Amenity)
+@receiver(post_delete, sender=Amenity)
+def taxonomy_changed(sender, **kwargs):
+    invalidate_all()
+
+
+@receiver(post_delete, sender=Amenity)
+def amenity_deleted(sender, instance, **kwargs):
+    # The M2M rows go with it without an m2m_changed signal
+    clear_bit(instance.bit)
+
+
+@receiver(m2m_changed, sender=Listing.amenities.through)
+def listing_amenities_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    
+    # Keep Listing.amenity_mask in step (see listings.amenities)
+    if not reverse:
+        refresh_mask(instance)
+    elif action == 'post_add':
+        set_bit(pk_set, instance.bit)
+    elif action == 'post_remove':
+        clear_bit(instance.bit, pk_set)
+    else:
+        clear_bit(instance.bit)
+    
+    if reverse:
+        # Changed from the amenity side (amenity.listings.add(...))
+        for listing_id in pk_set or ():
+            invalidate_listing(listing_id)
+        if action == 'post_clear':
+            invalidate_all()
+    else:
+        invalidate_listing(instance.pk)
@@ -0,0 +1,17 @@
+from celery import shared_task
+
+from .cache import invalidate_listing
+from .images import render_missing
+from .models import ListingImage
+
+
+@shared_task(acks_late=True, ignore_result=True)
+def render_image_variants(image_id):
+    """Render and store the missing variants of one listing photo"""
+    listing_image = ListingImage.objects.filter(pk=image_id).first()
+    if listing_image is None or not listing_image.image:
+        return 0
+    rendered = render_missing(listing_image)
+    # Cached pages still point at the on-demand view
+    invalidate_listing(listing_image.listing_id)
+    return rendered
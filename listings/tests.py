@@ -1,3 +1,683 @@
-from django.test import TestCase
+import datetime
+import io
+import math
+import random
+import re
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.middleware.csrf import _does_token_match
+from django.template import RequestContext, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+from api.serializers import ListingSerializer
+from bookings.models import Booking
+from core.pagination import keyset_paginate
+from reviews.models import Review
+from . import catalog, geo
+from .cache import cached_response, detail_cache_key, list_cache_key
+from .facets import PRICE_BUCKETS, compute_facets, get_facets
+from .filters import filter_listings
+from .images import ALL_RENDERED, VARIANTS, all_specs, srcset, variant_name
+from .models import Listing, ListingImage, ListingSearchTerm, Category, Amenity
+from .search import rebuild_index, search_listings, tokenize
+from .tasks import render_image_variants
+from .views import ListingListView
+
+
+class ListingCardQueryTests(TestCase):
+    """Rendering listing cards must cost the same number of queries for any page size"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(
+            email='host@example.com', password='secret', first_name='Host', last_name='User'
+        )
+        cls.category = Category.objects.create(name='Apartment')
+        cls.amenities = [Amenity.objects.create(name=name) for name in ('wifi', 'parking', 'pool')]
+    
+    def create_listings(self, count):
+        start = Listing.objects.count()
+        for index in range(start, start + count):
+            listing = Listing.objects.create(
+                title=f'Listing {index}',
+                description='Sunny and central',
+                host=self.host,
+                category=self.category,
+                price_per_day=100,
+                city='Cape Town',
+                country='South Africa',
+                is_approved=True,
+            )
+            listing.amenities.set(self.amenities[:index % 3 + 1])
+            ListingImage.objects.create(listing=listing, image=f'listings/{index}.jpg', is_primary=True)
+            ListingImage.objects.create(listing=listing, image=f'listings/{index}-b.jpg')
+    
+    def render_cards(self):
+        return [
+            (
+                listing.title,
+                listing.host.full_name,
+                listing.category.name,
+                listing.primary_image.image.url,
+                [amenity.name for amenity in listing.amenities.all()],
+                listing.average_rating,
+                listing.total_reviews,
+            )
+            for listing in Listing.objects.published().for_cards()
+        ]
+    
+    def test_card_queries_do_not_grow_with_page_size(self):
+        self.create_listings(2)
+        with self.assertNumQueries(3):
+            small = self.render_cards()
+        
+        self.create_listings(10)
+        with self.assertNumQueries(3):
+            large = self.render_cards()
+        
+        self.assertEqual(len(small), 2)
+        self.assertEqual(len(large), 12)
+    
+    def test_primary_image_comes_from_prefetch(self):
+        self.create_listings(1)
+        listing = Listing.objects.for_cards().get()
+        with self.assertNumQueries(0):
+            self.assertTrue(listing.primary_image.is_primary)
+    
+    def test_serializer_query_count_is_fixed(self):
+        self.create_listings(12)
+        with self.assertNumQueries(3):
+            data = ListingSerializer(Listing.objects.published().for_cards(), many=True).data
+        self.assertEqual(len(data), 12)
+        self.assertEqual(data[0]['category'], 'apartment')
+        self.assertTrue(data[0]['primary_image'].endswith('.jpg'))
+
+
+class AmenityMaskTests(TestCase):
+    """Listing.amenity_mask follows the amenities M2M from either side"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(
+            email='host@example.com', password='secret', first_name='Host', last_name='User'
+        )
+        cls.wifi, cls.parking, cls.pool = [
+            Amenity.objects.create(name=name) for name in ('WiFi', 'Parking', 'Pool')
+        ]
+        cls.listings = [
+            Listing.objects.create(
+                title=f'Listing {index}',
+                description='Sunny and central',
+                host=cls.host,
+                price_per_day=100,
+                city='Cape Town',
+                country='South Africa',
+                is_approved=True,
+            )
+            for index in range(3)
+        ]
+    
+    def filtered(self, amenities):
+        queryset, _ = filter_listings(Listing.objects.published(), {'amenities': amenities})
+        return sorted(listing.title for listing in queryset)
+    
+    def test_filter_requires_every_amenity(self):
+        first, second, third = self.listings
+        first.amenities.set([self.wifi, self.parking])
+        second.amenities.add(self.wifi)
+        self.pool.listings.add(first, third)
+        
+        self.assertEqual(self.filtered('wifi,parking'), ['Listing 0'])
+        self.assertEqual(self.filtered('pool'), ['Listing 0', 'Listing 2'])
+        self.assertEqual(self.filtered('wifi, POOL'), ['Listing 0'])
+        self.assertEqual(self.filtered('sauna'), [])
+    
+    def test_clashing_names_get_distinct_slugs(self):
+        clashes = [Amenity.objects.create(name=name) for name in ('Wi-Fi', 'Wi Fi', 'wi fi!')]
+        self.assertEqual([amenity.slug for amenity in clashes], ['wi-fi', 'wi-fi-2', 'wi-fi-3'])
+        self.assertEqual(len({amenity.bit for amenity in clashes} | {self.wifi.bit}), 4)
+    
+    def test_bit_taken_concurrently_is_picked_again(self):
+        # Another save took the free bit between this one's read and its insert
+        taken = self.pool.bit
+        with mock.patch('listings.amenities.next_free_bit', side_effect=[taken, taken + 1]):
+            sauna = Amenity.objects.create(name='Sauna')
+        self.assertEqual(sauna.bit, taken + 1)
+    
+    def test_mask_follows_removals(self):
+        first = self.listings[0]
+        first.amenities.set([self.wifi, self.parking, self.pool])
+        first.amenities.remove(self.parking)
+        first.refresh_from_db()
+        self.assertEqual(first.amenity_mask, (1 << self.wifi.bit) | (1 << self.pool.bit))
+        
+        self.wifi.listings.clear()
+        first.refresh_from_db()
+        self.assertEqual(first.amenity_mask, 1 << self.pool.bit)
+        
+        self.pool.delete()
+        first.refresh_from_db()
+        self.assertEqual(first.amenity_mask, 0)
+        self.assertEqual(self.filtered('wifi'), [])
+
+
+@override_settings(LISTING_CATALOG_ENABLED=True, LISTING_CATALOG_REFRESH_SECONDS=0)
+class ListingCatalogTests(TestCase):
+    """Catalog pages must match the SQL pages, cursor for cursor"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user(
+            email='host@example.com', password='secret', first_name='Host', last_name='User'
+        )
+        cls.category = Category.objects.create(name='Apartment')
+        for index in range(30):
+            Listing.objects.create(
+                title=f'Listing {index}',
+                description='Sunny and central',
+                host=host,
+                category=cls.category if index % 2 else None,
+                price_per_day=50 + (index * 37) % 200,
+                city=('Cape Town', 'Durban', 'Johannesburg')[index % 3],
+                country='South Africa',
+                bedrooms=index % 4 + 1,
+                bathrooms=index % 2 + 1,
+                max_guests=index % 6 + 1,
+                is_approved=index % 7 != 0,
+            )
+    
+    def setUp(self):
+        catalog._catalog = None
+    
+    def walk(self, params, use_catalog):
+        queryset, ordering = filter_listings(Listing.objects.published(), params)
+        paginate = catalog.paginate_listings if use_catalog else keyset_paginate
+        extra = (params,) if use_catalog else ()
+        titles, cursor = [], None
+        while True:
+            page = paginate(queryset, *extra, cursor=cursor, page_size=4, ordering=ordering)
+            titles.append([listing.title for listing in page])
+            if not page.has_next():
+                return titles, page
+            cursor = page.next_cursor
+    
+    def test_pages_match_sql(self):
+        for params in (
+            {},
+            {'sort': 'price'},
+            {'sort': '-price', 'city': 'cape town'},
+            {'min_price': '80', 'max_price': '180', 'bedrooms': '2'},
+            {'category': 'apartment', 'guests': '3', 'bathrooms': '2'},
+            {'city': 'Nowhere'},
+        ):
+            with self.subTest(params=params):
+                expected, _ = self.walk(params, use_catalog=False)
+                actual, _ = self.walk(params, use_catalog=True)
+                _, ordering = filter_listings(Listing.objects.all(), params)
+                self.assertIsNotNone(catalog.get_catalog().page_ids(params, ordering)[0])
+                self.assertEqual(actual, expected)
+        
+        # Walking back from the last page with a catalog cursor
+        _, last_page = self.walk({'sort': 'price'}, use_catalog=True)
+        queryset, ordering = filter_listings(Listing.objects.published(), {'sort': 'price'})
+        previous = keyset_paginate(queryset, last_page.previous_cursor, 4, ordering)
+        from_catalog = catalog.paginate_listings(queryset, {'sort': 'price'}, last_page.previous_cursor, 4, ordering)
+        self.assertEqual(list(from_catalog), list(previous))
+    
+    def test_picks_up_changes_and_falls_back(self):
+        listing = Listing.objects.get(title='Listing 1')
+        self.walk({}, use_catalog=True)
+        listing.city = 'Pretoria'
+        listing.save()
+        Listing.objects.filter(title='Listing 2').delete()
+        self.assertEqual(
+            self.walk({'city': 'pretoria'}, use_catalog=True)[0],
+            [['Listing 1']],
+        )
+        self.assertNotIn(
+            'Listing 2',
+            sum(self.walk({}, use_catalog=True)[0], []),
+        )
+        self.assertEqual(catalog.get_catalog().page_ids({'q': 'sunny'}, ['-created_at', '-id']), (None, None))
+    
+    def test_stale_rows_do_not_end_pagination_early(self):
+        self.walk({}, use_catalog=True)
+        # Changed after the last refresh, so the catalog still lists these
+        catalog.get_catalog().refresh_seconds = 3600
+        Listing.objects.filter(title__in=[f'Listing {index}' for index in range(10, 26)]).update(is_active=False)
+        expected, _ = self.walk({}, use_catalog=False)
+        actual, _ = self.walk({}, use_catalog=True)
+        self.assertEqual(actual, expected)
+
+
+class StayFilterTests(TestCase):
+    """check_in/check_out drop listings that are booked or cannot take the stay"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user(
+            email='host@example.com', password='secret', first_name='Host', last_name='User'
+        )
+        cls.free, cls.booked, cls.cancelled, cls.long_stay = [
+            Listing.objects.create(
+                title=title,
+                description='Sunny and central',
+                host=host,
+                price_per_day=100,
+                city='Cape Town',
+                country='South Africa',
+                max_guests=4,
+                minimum_stay=minimum_stay,
+                is_approved=True,
+            )
+            for title, minimum_stay in (('Free', 1), ('Booked', 1), ('Cancelled', 1), ('Long stay', 14))
+        ]
+        for listing, status in ((cls.booked, 'confirmed'), (cls.cancelled, 'cancelled')):
+            Booking.objects.create(
+                user=host,
+                listing=listing,
+                check_in=datetime.date(2030, 3, 15),
+                check_out=datetime.date(2030, 3, 22),
+                total_price=700,
+                status=status,
+            )
+    
+    def titles(self, params, strict=False):
+        queryset, _ = filter_listings(Listing.objects.published(), params, strict=strict)
+        return sorted(listing.title for listing in queryset)
+    
+    def test_excludes_overlapping_bookings(self):
+        stay = {'city': 'cape town', 'check_in': '2030-03-12', 'check_out': '2030-03-19', 'guests': '4'}
+        self.assertEqual(self.titles(stay), ['Cancelled', 'Free'])
+        # Checking in on the day the booking checks out is fine
+        stay.update(check_in='2030-03-22', check_out='2030-04-10')
+        self.assertEqual(self.titles(stay), ['Booked', 'Cancelled', 'Free', 'Long stay'])
+        self.assertEqual(self.titles(dict(stay, guests='5')), [])
+    
+    def test_invalid_dates(self):
+        stay = {'check_in': '2030-03-19', 'check_out': '2030-03-12'}
+        self.assertEqual(len(self.titles(stay)), 4)
+        with self.assertRaises(ValueError):
+            self.titles(stay, strict=True)
+
+
+class ListingSearchTests(TestCase):
+    """The inverted index ranks title and location matches above description matches"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(
+            email='host@example.com', password='secret', first_name='Host', last_name='User'
+        )
+        cls.cottage, cls.flat, cls.villa = [
+            Listing.objects.create(
+                title=title,
+                description=description,
+                host=cls.host,
+                price_per_day=100,
+                city=city,
+                country='South Africa',
+                is_approved=True,
+            )
+            for title, description, city in (
+                ('Garden Cottage', 'Quiet cottage near the beach', 'Knysna'),
+                ('City Flat', 'Walk to the beach and the garden route', 'Cape Town'),
+                ('Beach Villa', 'Pool and sea views', 'Durban'),
+            )
+        ]
+    
+    def ranked(self, query):
+        results = search_listings(Listing.objects.all(), query).order_by('-search_rank', 'id')
+        return [listing.title for listing in results]
+    
+    def test_tokenize_normalizes_text(self):
+        self.assertEqual(tokenize('The Café, on the BEACH!'), ['cafe', 'beach'])
+        self.assertEqual(tokenize(''), [])
+        self.assertIsNone(search_listings(Listing.objects.all(), 'the a'))
+    
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.ranked('beach'), ['Beach Villa', 'Garden Cottage', 'City Flat'])
+        self.assertEqual(self.ranked('garden'), ['Garden Cottage', 'City Flat'])
+        # Every listing matching one of the terms is returned once
+        self.assertEqual(sorted(self.ranked('cottage durban')), ['Beach Villa', 'Garden Cottage'])
+        self.assertEqual(self.ranked('nowhere'), [])
+    
+    def test_saving_a_title_reindexes(self):
+        self.flat.title = 'Harbour Loft'
+        self.flat.save()
+        self.assertEqual(self.ranked('harbour'), ['Harbour Loft'])
+        self.assertNotIn('Harbour Loft', self.ranked('flat'))
+        
+        # Saves that do not touch indexed text leave the rows alone
+        before = ListingSearchTerm.objects.count()
+        self.flat.price_per_day = 120
+        self.flat.save(update_fields=['price_per_day'])
+        self.assertEqual(ListingSearchTerm.objects.count(), before)
+        
+        ListingSearchTerm.objects.all().delete()
+        self.assertEqual(rebuild_index(), 3)
+        self.assertEqual(self.ranked('harbour'), ['Harbour Loft'])
+
+
+class GeoSearchTests(TestCase):
+    """Grid-cell lookups return exactly what a brute-force distance filter does"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user(
+            email='host@example.com', password='secret', first_name='Host', last_name='User'
+        )
+        generator = random.Random(7)
+        points = [
+            (-33.92 + generator.uniform(-1, 1), 18.42 + generator.uniform(-1, 1)) for _ in range(80)
+        ] + [(-16.5 + generator.uniform(-1, 1), generator.choice((179.6, -179.6))) for _ in range(20)]
+        for index, (latitude, longitude) in enumerate(points):
+            Listing.objects.create(
+                title=f'Listing {index}',
+                description='Sunny and central',
+                host=host,
+                price_per_day=100,
+                city='Somewhere',
+                country='Earth',
+                latitude=round(latitude, 6),
+                longitude=round(longitude, 6),
+                is_approved=True,
+            )
+        Listing.objects.create(
+            title='No coordinates', description='Nowhere', host=host, price_per_day=100,
+            city='Somewhere', country='Earth', is_approved=True,
+        )
+        cls.points = {
+            listing.pk: (float(listing.latitude), float(listing.longitude))
+            for listing in Listing.objects.exclude(latitude=None)
+        }
+    
+    def haversine(self, first, second):
+        lat1, lng1, lat2, lng2 = map(math.radians, first + second)
+        a = (math.sin((lat2 - lat1) / 2) ** 2
+             + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+        return 2 * geo.EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+    
+    def test_radius_matches_brute_force(self):
+        for centre, radius_km in (((-33.92, 18.42), 25), ((-33.5, 18.9), 60), ((-16.5, 179.9), 80)):
+            found = set(geo.within_radius(Listing.objects.all(), *centre, radius_km).values_list('pk', flat=True))
+            expected = {pk for pk, point in self.points.items() if self.haversine(centre, point) <= radius_km}
+            self.assertTrue(expected)
+            # Rounding in the SQL trigonometry may only matter right on the edge
+            edge = {pk for pk, point in self.points.items()
+                    if abs(self.haversine(centre, point) - radius_km) < 0.01}
+            self.assertEqual(found - edge, expected - edge)
+    
+    def test_bbox_matches_brute_force(self):
+        for south, west, north, east in ((-34.5, 18.0, -33.5, 19.0), (-17.5, 179.0, -15.5, -179.0)):
+            box = geo.within_bbox(Listing.objects.all(), south, west, north, east)
+            found = set(box.values_list('pk', flat=True))
+            expected = {
+                pk for pk, (latitude, longitude) in self.points.items()
+                if south <= latitude <= north
+                and (west <= longitude <= east if west <= east else (longitude >= west or longitude <= east))
+            }
+            self.assertTrue(expected)
+            self.assertEqual(found, expected)
+
+
+class FacetCountTests(TestCase):
+    """Facet counts from the grouped queries equal one count() per value"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user(
+            email='host@example.com', password='secret', first_name='Host', last_name='User'
+        )
+        categories = [Category.objects.create(name=name) for name in ('Apartment', 'Cabin')]
+        amenities = [Amenity.objects.create(name=name) for name in ('WiFi', 'Parking', 'Pool')]
+        generator = random.Random(3)
+        for index in range(40):
+            listing = Listing.objects.create(
+                title=f'Listing {index}',
+                description='Sunny and central',
+                host=host,
+                category=generator.choice(categories + [None]),
+                price_per_day=generator.choice((20, 50, 99, 100, 250, 500, 900)),
+                bedrooms=generator.randint(1, 4),
+                max_guests=generator.randint(1, 6),
+                city=generator.choice(('Cape Town', 'Durban')),
+                country='South Africa',
+                is_approved=True,
+            )
+            listing.amenities.set(generator.sample(amenities, generator.randint(0, 3)))
+    
+    def assert_facets_match(self, queryset):
+        facets = compute_facets(queryset)
+        self.assertEqual(facets['total'], queryset.count())
+        for entry in facets['categories']:
+            self.assertEqual(entry['count'], queryset.filter(category__slug=entry['slug']).count())
+        self.assertEqual(
+            sum(entry['count'] for entry in facets['categories']), queryset.exclude(category=None).count()
+        )
+        for entry, (low, high) in zip(facets['price'], PRICE_BUCKETS):
+            bucket = queryset.filter(price_per_day__gte=low)
+            if high is not None:
+                bucket = bucket.filter(price_per_day__lt=high)
+            self.assertEqual(entry['count'], bucket.count(), entry['label'])
+        for facet, field in (('bedrooms', 'bedrooms'), ('max_guests', 'max_guests')):
+            self.assertEqual(sum(entry['count'] for entry in facets[facet]), queryset.count())
+            for entry in facets[facet]:
+                self.assertEqual(entry['count'], queryset.filter(**{field: entry['value']}).count())
+        for entry in facets['amenities']:
+            self.assertEqual(entry['count'], queryset.filter(amenities__id=entry['id']).count())
+        return facets
+    
+    def test_counts_match_count_queries(self):
+        self.assert_facets_match(Listing.objects.published())
+        filtered, _ = filter_listings(Listing.objects.published(), {'city': 'Durban', 'bedrooms': '2'})
+        self.assertLess(self.assert_facets_match(filtered)['total'], Listing.objects.count())
+    
+    def test_cached_facets_drop_after_a_change(self):
+        params = {'city': 'Durban'}
+        queryset, _ = filter_listings(Listing.objects.published(), params)
+        before = get_facets(params, queryset)['total']
+        listing = Listing.objects.filter(city='Cape Town').first()
+        listing.city = 'Durban'
+        listing.save()
+        queryset, _ = filter_listings(Listing.objects.published(), params)
+        self.assertEqual(get_facets(params, queryset)['total'], before + 1)
+
+
+class ListingListContextTests(TestCase):
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(
+            email='host@example.com', password='secret', first_name='Host', last_name='User'
+        )
+        cls.categories = [
+            Category.objects.create(name=name, slug=name.lower()) for name in ('Apartment', 'Cottage')
+        ]
+        Listing.objects.create(
+            title='Sea Point Flat', description='Sunny and central', host=cls.host, price_per_day=100,
+            city='Cape Town', country='South Africa', category=cls.categories[0], is_approved=True,
+        )
+    
+    def test_category_filter_keeps_every_category_in_the_sidebar(self):
+        request = RequestFactory().get(reverse('listings:list'), {'category': 'apartment'})
+        # Signed in, so the page is not served from the page cache
+        request.user = self.host
+        context = ListingListView.as_view()(request).context_data
+        self.assertEqual(list(context['categories']), sorted(self.categories, key=lambda category: category.name))
+        self.assertEqual([row['slug'] for row in context['facets']['categories']], ['apartment'])
+
+
+CSRF_TOKEN_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+class PageCacheTests(TestCase):
+    """Anonymous list and detail pages come from the versioned page cache"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(
+            email='host@example.com', password='secret', first_name='Host', last_name='User'
+        )
+        cls.listing, cls.other = [
+            Listing.objects.create(
+                title=title,
+                description='Sunny and central',
+                host=cls.host,
+                price_per_day=100,
+                city='Cape Town',
+                country='South Africa',
+                is_approved=True,
+            )
+            for title in ('Sea Point Flat', 'Observatory House')
+        ]
+    
+    def setUp(self):
+        cache.clear()
+        self.list_url = reverse('listings:list')
+        self.detail_url = reverse('listings:detail', args=[self.listing.pk])
+    
+    def cache_status(self, url, client=None):
+        response = (client or self.client).get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['X-Cache']
+    
+    def test_saving_or_reviewing_invalidates_pages(self):
+        other_url = reverse('listings:detail', args=[self.other.pk])
+        for url in (self.detail_url, other_url):
+            self.assertEqual(self.cache_status(url), 'MISS')
+            self.assertEqual(self.cache_status(url), 'HIT')
+        list_key = list_cache_key({}, self.list_url)
+        
+        self.listing.title = 'Sea Point Loft'
+        self.listing.save()
+        self.assertEqual(self.cache_status(self.detail_url), 'MISS')
+        self.assertIn(b'Sea Point Loft', self.client.get(self.detail_url).content)
+        # Other detail pages keep their entries; list pages move to a new key
+        self.assertEqual(self.cache_status(other_url), 'HIT')
+        self.assertNotEqual(list_cache_key({}, self.list_url), list_key)
+        list_key = list_cache_key({}, self.list_url)
+        
+        Review.objects.create(listing=self.listing, reviewer=self.host, rating=4)
+        self.assertEqual(self.cache_status(self.detail_url), 'MISS')
+        self.assertNotEqual(list_cache_key({}, self.list_url), list_key)
+    
+    def test_cursors_are_not_case_folded(self):
+        self.assertNotEqual(
+            list_cache_key({'cursor': 'eyJ2IjpbMV19'}, self.list_url),
+            list_cache_key({'cursor': 'EYJ2IJPBMV19'}, self.list_url),
+        )
+        self.assertEqual(
+            list_cache_key({'city': 'Cape Town '}, self.list_url),
+            list_cache_key({'city': 'cape town'}, self.list_url),
+        )
+    
+    def test_stale_copy_is_served_while_another_request_refreshes(self):
+        self.cache_status(self.detail_url)
+        key = detail_cache_key(self.listing.pk, self.detail_url)
+        entry = cache.get(key)
+        entry['expires'] = 0
+        cache.set(key, entry)
+        
+        cache.add(f'{key}:lock', 1)
+        self.assertEqual(self.cache_status(self.detail_url), 'STALE')
+        cache.delete(f'{key}:lock')
+        self.assertEqual(self.cache_status(self.detail_url), 'MISS')
+        self.assertEqual(self.cache_status(self.detail_url), 'HIT')
+    
+    def test_cached_page_carries_each_visitors_csrf_token(self):
+        template = Template('<form method="post">{% csrf_token %}</form>')
+        
+        def render(request):
+            return HttpResponse(template.render(RequestContext(request)))
+        
+        key = detail_cache_key(self.listing.pk, self.detail_url)
+        first, second = RequestFactory().get(self.detail_url), RequestFactory().get(self.detail_url)
+        response = cached_response(first, key, lambda: render(first))
+        self.assertEqual(response['X-Cache'], 'MISS')
+        first_token = CSRF_TOKEN_RE.search(response.content.decode()).group(1)
+        response = cached_response(second, key, lambda: render(second))
+        self.assertEqual(response['X-Cache'], 'HIT')
+        
+        # The stored copy holds a placeholder, never the first visitor's token
+        self.assertNotIn(first_token.encode(), cache.get(key)['content'])
+        self.assertNotIn(first_token.encode(), response.content)
+        token = CSRF_TOKEN_RE.search(response.content.decode()).group(1)
+        self.assertTrue(_does_token_match(token, second.META['CSRF_COOKIE']))
+        self.assertFalse(_does_token_match(token, first.META['CSRF_COOKIE']))
+
+
+class ImageVariantTests(TestCase):
+    """Variant URLs come from the stored mask, never from storage lookups"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(
+            email='host@example.com', password='secret', first_name='Host', last_name='User'
+        )
+        cls.listing = Listing.objects.create(
+            title='Sea Point Flat', description='Sunny and central', host=cls.host, price_per_day=100,
+            city='Cape Town', country='South Africa', is_approved=True,
+        )
+    
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(MEDIA_ROOT=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+        
+        self.image = ListingImage.objects.create(listing=self.listing, image=self.photo('teal'))
+        self.view_url = reverse('listings:image_variant', args=[self.image.pk, 'card', 'jpg'])
+    
+    def photo(self, color):
+        from PIL import Image
+        
+        output = io.BytesIO()
+        Image.new('RGB', (1000, 500), color).save(output, 'JPEG')
+        return SimpleUploadedFile(f'{color}.jpg', output.getvalue(), 'image/jpeg')
+    
+    def test_rendered_variants_are_served_from_storage(self):
+        self.assertEqual(self.image.card_url, self.view_url)
+        
+        response = self.client.get(self.view_url)
+        name = variant_name(self.image.image.name, 'card', 'jpg')
+        self.assertRedirects(response, default_storage.url(name), fetch_redirect_response=False)
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.card_url, default_storage.url(name))
+        
+        # Built from the stored mask alone: storage is not asked again
+        default_storage.delete(name)
+        self.assertEqual(self.image.card_url, default_storage.url(name))
+        urls = [entry.rsplit(' ', 1)[0] for entry in srcset(self.image).split(', ')]
+        self.assertEqual(len(urls), len(VARIANTS))
+        self.assertEqual(urls[1], default_storage.url(name))
+        self.assertIn(reverse('listings:image_variant', args=[self.image.pk, 'full', 'jpg']), urls)
+    
+    def test_task_renders_every_variant_and_a_new_photo_starts_over(self):
+        self.assertEqual(render_image_variants(self.image.pk), len(all_specs()))
+        self.assertEqual(render_image_variants(self.image.pk), 0)
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.rendered_variants, ALL_RENDERED)
+        for variant, fmt in all_specs():
+            self.assertTrue(default_storage.exists(variant_name(self.image.image.name, variant, fmt)))
+        
+        self.image.image = self.photo('navy')
+        self.image.save()
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.rendered_variants, 0)
+        self.assertEqual(self.image.card_url, self.view_url)
+    
+    def test_variants_of_unpublished_listings_are_not_rendered(self):
+        for changes in ({'is_approved': False}, {'is_active': False}):
+            Listing.objects.filter(pk=self.listing.pk).update(**{'is_approved': True, 'is_active': True, **changes})
+            self.assertEqual(self.client.get(self.view_url).status_code, 404)
+        self.assertFalse(default_storage.exists(variant_name(self.image.image.name, 'card', 'jpg')))
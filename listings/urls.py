@@ -8,4 +8,5 @@ urlpatterns = [
     path('<int:pk>/', views.ListingDetailView.as_view(), name='detail'),
     path('<int:pk>/<slug:slug>/', views.ListingDetailView.as_view(), name='detail_slug'),
     path('category/<slug:category_slug>/', views.ListingListView.as_view(), name='category'),
+    path('images/<int:pk>/<slug:variant>.<slug:fmt>', views.image_variant, name='image_variant'),
 ]
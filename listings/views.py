@@ -1,61 +1,85 @@
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import render, get_object_or_404, redirect
+from django.http import Http404
+from django.core.files.storage import default_storage
 from django.views.generic import ListView, DetailView
-from .models import Listing, Category
-from django.db.models import Q
+from .models import Listing, Category, ListingImage
+from .images import VARIANTS, FORMATS, ensure_variant
+from .filters import filter_listings, parse_stay
+from .facets import get_facets
+from .cache import CachedPageMixin, list_cache_key, detail_cache_key
+from .catalog import paginate_listings
+from bookings.pricing import attach_quotes
+from core.pagination import InvalidCursor
 from django.utils import timezone
 
 
-class ListingListView(ListView):
+class ListingListView(CachedPageMixin, ListView):
     model = Listing
     template_name = 'listings/listing_list.html'
     context_object_name = 'listings'
     paginate_by = 12
     
+    def get_page_cache_key(self):
+        return list_cache_key(self.request.GET, self.request.path)
+    
     def get_queryset(self):
-        queryset = Listing.objects.filter(is_active=True, is_approved=True)
-        
-        # Search functionality
-        search_query = self.request.GET.get('q')
-        if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(city__icontains=search_query) |
-                Q(country__icontains=search_query)
+        queryset = Listing.objects.published().for_cards()
+        queryset, self.page_ordering = filter_listings(queryset, self.request.GET)
+        return queryset.order_by(*self.page_ordering)
+    
+    def paginate_queryset(self, queryset, page_size):
+        """Keyset pagination (?cursor=) instead of OFFSET plus COUNT(*)"""
+        try:
+            page = paginate_listings(
+                queryset,
+                self.request.GET,
+                cursor=self.request.GET.get('cursor'),
+                page_size=page_size,
+                ordering=self.page_ordering,
+                with_total=self.request.GET.get('total') == '1',
             )
-        
-        # Category filter
-        category_slug = self.request.GET.get('category')
-        if category_slug:
-            queryset = queryset.filter(category__slug=category_slug)
-        
-        # Price range filter
-        min_price = self.request.GET.get('min_price')
-        max_price = self.request.GET.get('max_price')
-        if min_price:
-            queryset = queryset.filter(price_per_day__gte=min_price)
-        if max_price:
-            queryset = queryset.filter(price_per_day__lte=max_price)
-        
-        return queryset.order_by('-created_at')
+        except InvalidCursor:
+            raise Http404('Invalid cursor')
+        # Totals for the searched stay, priced for the whole page at once
+        stay = parse_stay(self.request.GET)
+        if stay and page.object_list:
+            attach_quotes(page.object_list, *stay)
+        return (None, page, page.object_list, page.has_other_pages())
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context['facets'] = get_facets(self.request.GET, self.object_list)
         context['categories'] = Category.objects.all()
         context['search_query'] = self.request.GET.get('q', '')
         return context
 
 
-class ListingDetailView(DetailView):
+class ListingDetailView(CachedPageMixin, DetailView):
     model = Listing
     template_name = 'listings/listing_detail.html'
     context_object_name = 'listing'
     
+    def get_page_cache_key(self):
+        return detail_cache_key(self.kwargs['pk'], self.request.path)
+    
     def get_queryset(self):
-        return Listing.objects.filter(is_active=True, is_approved=True)
+        return Listing.objects.published().select_related('host', 'category').prefetch_related('images', 'amenities')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['today'] = timezone.now().date()
         context['tomorrow'] = timezone.now().date() + timezone.timedelta(days=1)
         return context
+
+
+def image_variant(request, pk, variant, fmt):
+    """Render a missing image variant on demand and redirect to the stored file"""
+    if variant not in VARIANTS or fmt not in FORMATS:
+        raise Http404('Unknown image variant')
+    listing_image = get_object_or_404(
+        ListingImage, pk=pk, listing__is_active=True, listing__is_approved=True,
+    )
+    if not listing_image.image:
+        raise Http404('Image has no file')
+    name = ensure_variant(listing_image, variant, fmt)
+    return redirect(default_storage.url(name))
@@ -0,0 +1,100 @@
+# Generated by Django 4.2 on 2026-10-17 20:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaintenanceCategory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('description', models.TextField(blank=True)),
+                ('icon', models.CharField(blank=True, max_length=50)),
+                ('estimated_duration', models.PositiveIntegerField(default=60, help_text='Default duration in minutes')),
+                ('average_cost', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Maintenance Categories',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MaintenanceSchedule',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('property_id', models.UUIDField()),
+                ('property_name', models.CharField(max_length=200)),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField(blank=True)),
+                ('frequency', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly'), ('quarterly', 'Quarterly'), ('biannually', 'Biannually'), ('annually', 'Annually'), ('custom', 'Custom')], default='monthly', max_length=20)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('last_performed', models.DateField(blank=True, null=True)),
+                ('next_due', models.DateField()),
+                ('estimated_duration', models.PositiveIntegerField(default=60, help_text='Duration in minutes')),
+                ('estimated_cost', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('requirements', models.TextField(blank=True)),
+                ('contractor_required', models.BooleanField(default=False)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['next_due'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MaintenanceRequest',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('property_id', models.UUIDField()),
+                ('property_name', models.CharField(max_length=200)),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField()),
+                ('priority', models.CharField(choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High'), ('urgent', 'Urgent')], default='medium', max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], default='pending', max_length=20)),
+                ('reported_date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('due_date', models.DateField(blank=True, null=True)),
+                ('completed_date', models.DateTimeField(blank=True, null=True)),
+                ('estimated_cost', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('actual_cost', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('category', models.CharField(blank=True, max_length=100)),
+                ('location', models.CharField(blank=True, max_length=200)),
+                ('contractor_info', models.TextField(blank=True)),
+                ('notes', models.TextField(blank=True)),
+                ('attachment', models.FileField(blank=True, null=True, upload_to='maintenance_attachments/')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('assigned_to', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='assigned_maintenance', to=settings.AUTH_USER_MODEL)),
+                ('submitted_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submitted_maintenance', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-reported_date', 'priority'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='maintenancerequest',
+            index=models.Index(fields=['property_id', 'status'], name='maintenance_propert_ef7a40_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maintenancerequest',
+            index=models.Index(fields=['priority', 'due_date'], name='maintenance_priorit_04be24_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maintenancerequest',
+            index=models.Index(fields=['submitted_by', 'status'], name='maintenance_submitt_dbaefd_idx'),
+        ),
+    ]
@@ -32,6 +32,14 @@ class NotificationService:
         
         return notification
     
+    @staticmethod
+    def create_bulk_notifications(notifications, batch_size=1000):
+        """
+        Insert many unsaved Notification objects at once. Delivery to other
+        platforms is left to the regular senders (is_sent stays False).
+        """
+        return Notification.objects.bulk_create(notifications, batch_size=batch_size)
+    
     @staticmethod
     def send_real_time_notification(notification):
         """Send notification via WebSocket."""
@@ -0,0 +1,196 @@
+"""
+Recurring charge billing runs.
+
+A billing run for a month finds every recurring charge that falls due in it
+and creates the new ``Payment`` rows (and optionally ``Invoice`` rows) in
+bulk:
+
+* the latest recurring payment of the past year per (tenant, payment type)
+  of an active, still-leased tenant is the template, read in one streaming
+  query,
+* it is due when the month is a whole number of periods (1, 3 or 12 months)
+  after the template's due month,
+* new rows copy its amount and discount, with ``net_amount`` computed here
+  because ``bulk_create`` does not call ``Payment.save``, and are posted to
+  the tenant ledger (payments.ledger) in the same transaction as each chunk.
+
+Generated rows carry ``billing_period``, which is unique per tenant and
+payment type, so re-running a period skips what exists and a concurrent
+run cannot insert the same charge twice. A recurring charge entered by hand
+(no ``billing_period``) that is due in the month counts as billed too.
+"""
+import calendar
+import time
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .ledger import payment_postings, payment_state, post
+from .models import Invoice, Payment
+
+FREQUENCY_MONTHS = {
+    'monthly': 1,
+    'quarterly': 3,
+    'annually': 12,
+}
+
+DEFAULT_CHUNK_SIZE = 1000
+
+TEMPLATE_FIELDS = (
+    'tenant_id', 'rental_property_id', 'payment_type', 'amount', 'discount', 'currency', 'due_date',
+    'payment_method', 'recurring_frequency',
+)
+
+
+def month_index(day):
+    return day.year * 12 + day.month - 1
+
+
+def next_period(period):
+    year, month = divmod(month_index(period) + 1, 12)
+    return period.replace(year=year, month=month + 1)
+
+
+def due_in_period(day, period):
+    """Day ``day`` of the ``period`` month, clamped to its length"""
+    last = calendar.monthrange(period.year, period.month)[1]
+    return period.replace(day=min(day, last))
+
+
+def templates(period):
+    """
+    Latest recurring payment per (tenant, payment type) due in the year
+    before ``period``, streamed in key order. ``day`` is the latest day of
+    month seen in that year, so a charge clamped to a short month goes back
+    to the 31st afterwards.
+    """
+    rows = Payment.objects.filter(
+        is_recurring=True,
+        recurring_frequency__in=FREQUENCY_MONTHS,
+        tenant__status='active',
+        tenant__lease_end_date__gte=period,
+        due_date__gte=period.replace(year=period.year - 1),
+        due_date__lt=period,
+    ).order_by('tenant_id', 'payment_type', '-due_date', '-created_at').values_list(*TEMPLATE_FIELDS)
+    template = None
+    for row in rows.iterator(chunk_size=DEFAULT_CHUNK_SIZE):
+        current = dict(zip(TEMPLATE_FIELDS, row))
+        if template and (current['tenant_id'], current['payment_type']) == (
+            template['tenant_id'], template['payment_type']
+        ):
+            template['day'] = max(template['day'], current['due_date'].day)
+            continue
+        if template:
+            yield template
+        template = dict(current, day=current['due_date'].day)
+    if template:
+        yield template
+
+
+def is_due(template, period):
+    months = month_index(period) - month_index(template['due_date'])
+    return months > 0 and months % FREQUENCY_MONTHS[template['recurring_frequency']] == 0
+
+
+def new_charge(template, period):
+    due_date = due_in_period(template['day'], period)
+    return Payment(
+        rental_property_id=template['rental_property_id'],
+        tenant_id=template['tenant_id'],
+        payment_type=template['payment_type'],
+        amount=template['amount'],
+        discount=template['discount'],
+        net_amount=template['amount'] - template['discount'],
+        currency=template['currency'],
+        payment_date=due_date,
+        due_date=due_date,
+        payment_method=template['payment_method'],
+        status='pending',
+        is_recurring=True,
+        recurring_frequency=template['recurring_frequency'],
+        billing_period=period,
+        notes=f'Billing run {period:%Y-%m}',
+    )
+
+
+def new_invoice(payment, period):
+    return Invoice(
+        rental_property_id=payment.rental_property_id,
+        tenant_id=payment.tenant_id,
+        invoice_number=f'INV-{period:%Y%m}-{payment.pk.hex[:12].upper()}',
+        invoice_date=timezone.now().date(),
+        due_date=payment.due_date,
+        status='sent',
+        subtotal=payment.net_amount,
+        total_amount=payment.net_amount,
+        description=f'{payment.get_payment_type_display()} for {period:%B %Y}',
+    )
+
+
+def existing_keys(period, charges):
+    """
+    (tenant, payment type) pairs of ``charges`` already billed for the period,
+    by a run or by a recurring charge entered by hand and due in the month
+    """
+    return set(Payment.objects.filter(
+        Q(billing_period=period) | Q(
+            billing_period__isnull=True, is_recurring=True,
+            due_date__gte=period, due_date__lt=next_period(period),
+        ),
+        tenant_id__in={charge.tenant_id for charge in charges},
+    ).values_list('tenant_id', 'payment_type'))
+
+
+def create_chunk(period, charges, with_invoices):
+    """Insert one chunk; returns (payments created, invoices created)"""
+    for _ in range(2):
+        billed = existing_keys(period, charges)
+        charges = [charge for charge in charges if (charge.tenant_id, charge.payment_type) not in billed]
+        if not charges:
+            return 0, 0
+        try:
+            with transaction.atomic():
+                Payment.objects.bulk_create(charges)
+                invoices = Invoice.objects.bulk_create(
+                    [new_invoice(charge, period) for charge in charges]
+                ) if with_invoices else []
+                post([posting for charge in charges
+                      for posting in payment_postings(None, payment_state(charge), charge.pk)])
+            return len(charges), len(invoices)
+        except IntegrityError:
+            # A concurrent run billed some of them; drop those and try once more
+            continue
+    raise IntegrityError('Billing run kept colliding with another run for the same period')
+
+
+def run(period, with_invoices=False, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+    """
+    Bill the recurring charges due in the month starting ``period``.
+
+    Returns counts and throughput: ``templates`` examined, ``due``, ``created``
+    (new payments), ``skipped`` (already billed), ``invoices``, ``seconds`` and
+    ``per_second``.
+    """
+    period = period.replace(day=1)
+    started = time.perf_counter()
+    report = {'period': period.strftime('%Y-%m'), 'templates': 0, 'due': 0, 'created': 0, 'invoices': 0}
+
+    # Finish reading before writing; some backends cannot interleave the two on one connection
+    due = []
+    for template in templates(period):
+        report['templates'] += 1
+        if is_due(template, period):
+            due.append(new_charge(template, period))
+    report['due'] = len(due)
+
+    if not dry_run:
+        for offset in range(0, len(due), chunk_size):
+            created, invoices = create_chunk(period, due[offset:offset + chunk_size], with_invoices)
+            report['created'] += created
+            report['invoices'] += invoices
+
+    report['skipped'] = 0 if dry_run else report['due'] - report['created']
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    report['per_second'] = round(report['created'] / report['seconds']) if report['seconds'] else 0
+    return report
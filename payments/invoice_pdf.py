@@ -0,0 +1,259 @@
+"""
+Invoice PDFs.
+
+An invoice is first reduced to its *document*: a flat dict of the strings
+printed on it, read for many invoices in one query. The SHA-256 of the
+document (plus ``RENDERER_VERSION``) names the cached file, so an unchanged
+invoice is never rendered twice, and any edit that changes what is printed
+produces a new file rather than serving a stale one.
+
+PDFs are drawn with reportlab on one A4 page in the TrueType fonts of
+``INVOICE_PDF_FONT`` and ``INVOICE_PDF_BOLD_FONT``, embedded as subsets so
+any name or address prints as typed. Output is invariant (no timestamps or
+random ids), so the same document always yields the same bytes. Files are
+written straight into the cache directory, atomically via a temporary file.
+
+``invoice_pdf_path`` renders on demand for a single invoice;
+``render_invoices`` fills the cache for month-end runs by queueing chunks
+of the missing invoices to the Celery workers (payments.tasks).
+"""
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+# Bump when the layout changes so every invoice is rendered afresh
+RENDERER_VERSION = '2'
+
+DEFAULT_CHUNK_SIZE = 200
+
+DOCUMENT_FIELDS = (
+    'pk', 'invoice_number', 'invoice_date', 'due_date', 'paid_date', 'status', 'subtotal', 'tax_amount',
+    'total_amount', 'description', 'notes', 'payment_link', 'rental_property__title',
+    'rental_property__address', 'rental_property__city', 'rental_property__state', 'tenant__first_name',
+    'tenant__last_name', 'tenant__email',
+)
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+MARGIN = 56
+MAX_TEXT_LINES = 30
+
+# Names the TrueType fonts are registered under
+FONT, BOLD_FONT = 'InvoiceSans', 'InvoiceSans-Bold'
+
+
+def cache_root():
+    return str(getattr(settings, 'INVOICE_PDF_ROOT', os.path.join(settings.MEDIA_ROOT, 'invoices')))
+
+
+def invoice_documents(invoices):
+    """Documents of an invoice queryset, streamed"""
+    for row in invoices.order_by('pk').values_list(*DOCUMENT_FIELDS).iterator(chunk_size=DEFAULT_CHUNK_SIZE):
+        yield {field: '' if value is None else str(value) for field, value in zip(DOCUMENT_FIELDS, row)}
+
+
+def content_hash(document):
+    fonts = [os.path.basename(settings.INVOICE_PDF_FONT), os.path.basename(settings.INVOICE_PDF_BOLD_FONT)]
+    payload = json.dumps([RENDERER_VERSION, fonts, document], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def cache_path(root, digest):
+    return os.path.join(root, digest[:2], f'{digest}.pdf')
+
+
+def money(value):
+    return f'{Decimal(value or 0):,.2f}'
+
+
+def register_fonts():
+    """Register the invoice fonts with reportlab once per process"""
+    if FONT not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT, settings.INVOICE_PDF_FONT))
+        pdfmetrics.registerFont(TTFont(BOLD_FONT, settings.INVOICE_PDF_BOLD_FONT))
+
+
+def render_pdf(document):
+    """PDF bytes of an invoice document"""
+    register_fonts()
+    output = io.BytesIO()
+    # Invariant output leaves out the creation date and random file id
+    pdf = canvas.Canvas(output, pagesize=(PAGE_WIDTH, PAGE_HEIGHT), invariant=True)
+    pdf.setTitle(f"Invoice {document['invoice_number']}")
+    pdf.setProducer('Rentala')
+
+    def text(x, y, value, font=FONT, size=10):
+        pdf.setFont(font, size)
+        pdf.drawString(x, y, value)
+
+    def wrap(value, width):
+        return simpleSplit(value, FONT, 10, width)[:MAX_TEXT_LINES]
+
+    right = PAGE_WIDTH - MARGIN - 200
+    amount_x = PAGE_WIDTH - MARGIN - 80
+    y = PAGE_HEIGHT - MARGIN - 14
+    text(MARGIN, y, 'INVOICE', BOLD_FONT, 22)
+    for label, value in (
+        ('Invoice', document['invoice_number']),
+        ('Date', document['invoice_date']),
+        ('Due', document['due_date']),
+        ('Status', document['status'].title()),
+    ):
+        text(right, y, label, BOLD_FONT)
+        text(right + 60, y, value)
+        y -= 14
+
+    y -= 20
+    text(MARGIN, y, 'From', BOLD_FONT)
+    text(right, y, 'Bill to', BOLD_FONT)
+    y -= 14
+    property_lines = [
+        document['rental_property__title'],
+        document['rental_property__address'],
+        ', '.join(filter(None, (document['rental_property__city'], document['rental_property__state']))),
+    ]
+    tenant_lines = [
+        f"{document['tenant__first_name']} {document['tenant__last_name']}".strip(),
+        document['tenant__email'],
+    ]
+    for index in range(max(len(property_lines), len(tenant_lines))):
+        if index < len(property_lines):
+            text(MARGIN, y, property_lines[index])
+        if index < len(tenant_lines):
+            text(right, y, tenant_lines[index])
+        y -= 14
+
+    y -= 20
+    text(MARGIN, y, 'Description', BOLD_FONT)
+    text(amount_x, y, 'Amount', BOLD_FONT)
+    pdf.line(MARGIN, y - 6, PAGE_WIDTH - MARGIN, y - 6)
+    y -= 22
+    description = wrap(document['description'] or 'Invoice', amount_x - MARGIN - 20) or ['']
+    for index, line in enumerate(description):
+        text(MARGIN, y, line)
+        if index == 0:
+            text(amount_x, y, money(document['subtotal']))
+        y -= 14
+
+    y -= 10
+    for label, value, font in (
+        ('Subtotal', document['subtotal'], FONT),
+        ('Tax', document['tax_amount'], FONT),
+        ('Total', document['total_amount'], BOLD_FONT),
+    ):
+        text(right, y, label, font)
+        text(amount_x, y, money(value), font)
+        y -= 14
+    if document['paid_date']:
+        text(right, y, f"Paid on {document['paid_date']}", BOLD_FONT)
+        y -= 14
+
+    notes = wrap(document['notes'], PAGE_WIDTH - 2 * MARGIN)
+    if notes:
+        y -= 20
+        text(MARGIN, y, 'Notes', BOLD_FONT)
+        y -= 14
+        for line in notes:
+            if y < MARGIN + 28:
+                break
+            text(MARGIN, y, line)
+            y -= 14
+    if document['payment_link']:
+        text(MARGIN, MARGIN, f"Pay online: {document['payment_link']}")
+
+    pdf.showPage()
+    pdf.save()
+    return output.getvalue()
+
+
+def write_pdf(root, document):
+    """Render a document into the cache unless it is there; returns its path"""
+    path = cache_path(root, content_hash(document))
+    if os.path.exists(path):
+        return path
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as output:
+            output.write(render_pdf(document))
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return path
+
+
+def render_chunk(root, documents):
+    """Render documents into the cache; returns how many"""
+    count = 0
+    for document in documents:
+        write_pdf(root, document)
+        count += 1
+    return count
+
+
+def invoice_pdf_path(invoice, root=None):
+    """Cached PDF of one invoice, rendered now if missing; returns (path, content hash)"""
+    from .models import Invoice
+
+    document = next(invoice_documents(Invoice.objects.filter(pk=invoice.pk)))
+    root = root or cache_root()
+    return write_pdf(root, document), content_hash(document)
+
+
+def render_invoices(invoices, chunk_size=DEFAULT_CHUNK_SIZE, root=None, now=False):
+    """
+    Make sure every invoice of a queryset has a cached PDF: the missing ones
+    are queued to the Celery workers in chunks of ``chunk_size``, or
+    rendered in this process with ``now``.
+
+    Returns ``invoices`` seen, ``cached`` (already on disk), ``missing``,
+    ``rendered`` (here), ``seconds`` and ``per_second``.
+    """
+    from .tasks import render_invoice_pdfs
+
+    directory = root or cache_root()
+    started = time.perf_counter()
+    report = {'invoices': 0, 'cached': 0, 'missing': 0, 'rendered': 0}
+
+    missing = []
+    for document in invoice_documents(invoices):
+        report['invoices'] += 1
+        if os.path.exists(cache_path(directory, content_hash(document))):
+            report['cached'] += 1
+        else:
+            missing.append(document)
+    report['missing'] = len(missing)
+
+    if now:
+        report['rendered'] = render_chunk(directory, missing)
+    else:
+        for offset in range(0, len(missing), chunk_size):
+            render_invoice_pdfs.delay([document['pk'] for document in missing[offset:offset + chunk_size]], root)
+
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    report['per_second'] = round(report['rendered'] / report['seconds']) if report['seconds'] else 0
+    return report
+
+
+def prune_cache(invoices, root=None):
+    """Delete cached PDFs no invoice of the queryset renders to any more; returns how many"""
+    root = root or cache_root()
+    current = {content_hash(document) for document in invoice_documents(invoices)}
+    removed = 0
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name.endswith('.pdf') and name[:-4] not in current:
+                os.unlink(os.path.join(directory, name))
+                removed += 1
+    return removed
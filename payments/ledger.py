@@ -0,0 +1,217 @@
+"""
+Tenant ledger and arrears.
+
+Every change to a ``Payment`` is posted to the tenant's ledger inside the
+same transaction as the payment row:
+
+* a payment's charge is its ``net_amount`` unless it is cancelled or refunded,
+* it is received once its status is ``completed``,
+
+and a save posts the difference between the stored and the new state as
+``LedgerEntry`` rows. Posting locks the tenant's ``TenantBalance`` row, so
+each entry carries the running ``balance_after`` and the materialized
+balance never needs a ``SUM`` over history.
+
+Arrears are read with grouped SQL over the open payments: one ``GROUP BY``
+per tenant (or property) with conditional sums for the 0-30/31-60/61-90/90+
+day buckets, on the (status, due_date) index, instead of calling
+``is_overdue``/``days_overdue`` row by row.
+"""
+import datetime
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import LedgerEntry, Payment, TenantBalance
+
+# Statuses whose charge no longer stands
+VOID_STATUSES = ('cancelled', 'refunded')
+
+# Statuses of charges still owed
+OPEN_STATUSES = ('pending', 'failed')
+
+PAYMENT_FIELDS = ('tenant_id', 'rental_property_id', 'status', 'net_amount', 'due_date', 'received_date',
+                  'payment_date', 'reference_number')
+
+# (name, fewest, most) days past due
+AGING_BUCKETS = (
+    ('days_0_30', None, 30),
+    ('days_31_60', 31, 60),
+    ('days_61_90', 61, 90),
+    ('days_90_plus', 91, None),
+)
+
+Posting = namedtuple('Posting', 'tenant_id rental_property_id payment_id entry_type amount effective_date memo')
+
+PaymentState = namedtuple('PaymentState', PAYMENT_FIELDS)
+
+
+def payment_state(payment):
+    return PaymentState(*(getattr(payment, field) for field in PAYMENT_FIELDS))
+
+
+def stored_payment(pk):
+    """The saved state of a payment, locked until the transaction ends"""
+    row = Payment.objects.select_for_update().filter(pk=pk).values_list(*PAYMENT_FIELDS).first()
+    return PaymentState(*row) if row else None
+
+
+def charged(state):
+    return Decimal('0') if state.status in VOID_STATUSES else state.net_amount
+
+
+def received(state):
+    return state.net_amount if state.status == 'completed' else Decimal('0')
+
+
+def payment_postings(previous, new, payment_id=None):
+    """Postings that move the ledger from a payment's stored state to its new one (either may be None)"""
+    if previous is not None and new is not None and previous.tenant_id == new.tenant_id:
+        # Same account: post only what changed
+        changes = [(new, charged(new) - charged(previous), received(new) - received(previous), False)]
+    else:
+        changes = []
+        if previous is not None:
+            changes.append((previous, -charged(previous), -received(previous), False))
+        if new is not None:
+            changes.append((new, charged(new), received(new), True))
+
+    postings = []
+    for state, charge, receipt, opening in changes:
+        memo = f'Payment {state.reference_number}' if state.reference_number else 'Payment'
+        if charge:
+            postings.append(Posting(
+                state.tenant_id, state.rental_property_id, payment_id,
+                'charge' if opening else 'adjustment', charge, state.due_date, memo,
+            ))
+        if receipt:
+            postings.append(Posting(
+                state.tenant_id, state.rental_property_id, payment_id,
+                'receipt' if receipt > 0 else 'adjustment', -receipt,
+                state.received_date or state.payment_date, memo,
+            ))
+    return postings
+
+
+def lock_balances(tenant_ids):
+    """``{tenant_id: TenantBalance}`` locked in tenant order, created when missing"""
+    tenant_ids = sorted(set(tenant_ids))
+    TenantBalance.objects.bulk_create(
+        [TenantBalance(tenant_id=tenant_id) for tenant_id in tenant_ids], ignore_conflicts=True,
+    )
+    return TenantBalance.objects.select_for_update().order_by('pk').in_bulk(tenant_ids)
+
+
+def post(postings, batch_size=1000):
+    """Append ledger entries and move the running balances; returns the entries"""
+    postings = [posting for posting in postings if posting.amount]
+    if not postings:
+        return []
+    with transaction.atomic():
+        balances = lock_balances(posting.tenant_id for posting in postings)
+        entries = []
+        for posting in postings:
+            balance = balances[posting.tenant_id]
+            balance.balance += posting.amount
+            entries.append(LedgerEntry(
+                tenant_id=posting.tenant_id,
+                rental_property_id=posting.rental_property_id,
+                payment_id=posting.payment_id,
+                entry_type=posting.entry_type,
+                amount=posting.amount,
+                balance_after=balance.balance,
+                effective_date=posting.effective_date,
+                memo=posting.memo,
+            ))
+        LedgerEntry.objects.bulk_create(entries, batch_size=batch_size)
+        now = timezone.now()
+        for balance in balances.values():
+            balance.updated_at = now
+        TenantBalance.objects.bulk_update(balances.values(), ['balance', 'updated_at'], batch_size=batch_size)
+    return entries
+
+
+def rebuild(tenant_ids=None, batch_size=1000):
+    """Replay the ledger from the payments as they stand; returns the number of entries"""
+    payments = Payment.objects.order_by('tenant_id', 'due_date', 'created_at', 'pk')
+    if tenant_ids is not None:
+        payments = payments.filter(tenant_id__in=tenant_ids)
+    with transaction.atomic():
+        entries = LedgerEntry.objects.all()
+        balances = TenantBalance.objects.all()
+        if tenant_ids is not None:
+            entries = entries.filter(tenant_id__in=tenant_ids)
+            balances = balances.filter(tenant_id__in=tenant_ids)
+        entries.delete()
+        balances.update(balance=0)
+
+        count = 0
+        chunk = []
+        for pk, *state in payments.values_list('pk', *PAYMENT_FIELDS).iterator(chunk_size=batch_size):
+            chunk += payment_postings(None, PaymentState(*state), pk)
+            if len(chunk) >= batch_size:
+                count += len(post(chunk, batch_size))
+                chunk = []
+        count += len(post(chunk, batch_size))
+    return count
+
+
+def aging_annotations(today):
+    """Overdue total, oldest due date and one conditional sum per aging bucket"""
+    zero = Value(Decimal('0'), output_field=DecimalField(max_digits=12, decimal_places=2))
+    annotations = {
+        'overdue': Coalesce(Sum('net_amount'), zero),
+        'oldest_due': Min('due_date'),
+        'overdue_payments': Count('pk'),
+    }
+    for name, fewest, most in AGING_BUCKETS:
+        bucket = Q()
+        if fewest is not None:
+            bucket &= Q(due_date__lte=today - datetime.timedelta(days=fewest))
+        if most is not None:
+            bucket &= Q(due_date__gte=today - datetime.timedelta(days=most))
+        annotations[name] = Coalesce(Sum('net_amount', filter=bucket), zero)
+    return annotations
+
+
+def overdue_payments(today, properties=None):
+    payments = Payment.objects.filter(status__in=OPEN_STATUSES, due_date__lt=today).order_by()
+    if properties is not None:
+        payments = payments.filter(rental_property__in=properties)
+    return payments
+
+
+def with_days_in_arrears(rows, today):
+    for row in rows:
+        row['days_in_arrears'] = (today - row['oldest_due']).days
+    return rows
+
+
+def tenant_arrears(today=None, properties=None, limit=None):
+    """
+    One row per tenant and property in arrears, largest first: ledger
+    balance, days in arrears and aging buckets, in one query.
+    """
+    today = today or timezone.now().date()
+    rows = overdue_payments(today, properties).values(
+        'tenant_id', 'rental_property_id', 'tenant__first_name', 'tenant__last_name',
+        'tenant__ledger_balance__balance',
+    ).annotate(**aging_annotations(today)).order_by('-overdue', 'tenant_id')
+    if limit is not None:
+        rows = rows[:limit]
+    return with_days_in_arrears(list(rows), today)
+
+
+def property_aging(today=None, properties=None):
+    """Aging buckets per property, in one query"""
+    today = today or timezone.now().date()
+    rows = overdue_payments(today, properties).values(
+        'rental_property_id', 'rental_property__title',
+    ).annotate(
+        tenants_in_arrears=Count('tenant_id', distinct=True), **aging_annotations(today)
+    ).order_by('-overdue', 'rental_property_id')
+    return with_days_in_arrears(list(rows), today)
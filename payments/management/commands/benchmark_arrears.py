@@ -0,0 +1,105 @@
+import datetime
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from payments.ledger import payment_postings, payment_state, post, property_aging, tenant_arrears
+from payments.models import Payment
+from properties.models import Property
+from tenants.models import Tenant
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Time the grouped-SQL arrears report against the row-by-row is_overdue/days_overdue loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed-tenants', type=int, default=0,
+                            help='Insert this many tenants with a year of rent first (rolled back afterwards)')
+        parser.add_argument('--properties', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def seed(self, tenant_count, property_count):
+        today = timezone.now().date()
+        properties = Property.objects.bulk_create([
+            Property(title=f'Benchmark {number}', property_type='apartment', address=f'{number} Main Road',
+                     city='Durban', state='KZN', monthly_rent=Decimal('8000'))
+            for number in range(property_count)
+        ])
+        tenants = Tenant.objects.bulk_create([
+            Tenant(rental_property=random.choice(properties), first_name='Tenant', last_name=str(number),
+                   email=f'benchmark-{number}@example.com', phone='000', lease_start_date=today,
+                   lease_end_date=today, monthly_rent=Decimal('8000'))
+            for number in range(tenant_count)
+        ], batch_size=2000)
+
+        batch = []
+        for tenant in tenants:
+            for month in range(12):
+                due = today - datetime.timedelta(days=30 * month)
+                payment = Payment(
+                    rental_property_id=tenant.rental_property_id, tenant=tenant, amount=tenant.monthly_rent,
+                    net_amount=tenant.monthly_rent, payment_date=due, due_date=due,
+                    status='pending' if random.random() < 0.1 else 'completed',
+                )
+                payment.received_date = due if payment.status == 'completed' else None
+                batch.append(payment)
+            if len(batch) >= 5000:
+                self.flush(batch)
+                batch = []
+        self.flush(batch)
+
+    def flush(self, payments):
+        Payment.objects.bulk_create(payments)
+        post([posting for payment in payments
+              for posting in payment_postings(None, payment_state(payment), payment.pk)])
+
+    def row_by_row(self):
+        """The old way: every payment into Python, then is_overdue/days_overdue per row"""
+        buckets = {}
+        for payment in Payment.objects.filter(status='pending'):
+            if payment.is_overdue:
+                days = payment.days_overdue
+                key = (payment.tenant_id, min(days // 30, 3))
+                buckets[key] = buckets.get(key, 0) + payment.net_amount
+        return len({tenant_id for tenant_id, _ in buckets})
+
+    def time_run(self, run, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = run()
+        return (time.perf_counter() - start) / repeat * 1000, result
+
+    def benchmark(self, repeat):
+        self.stdout.write(f'{Tenant.objects.count()} tenants, {Payment.objects.count()} payments, {repeat} runs')
+        loop_ms, loop_tenants = self.time_run(self.row_by_row, repeat)
+        # What the arrears endpoint runs: per property buckets plus the worst tenants
+        report_ms, properties = self.time_run(lambda: (property_aging(), tenant_arrears(limit=100))[0], repeat)
+        all_ms, rows = self.time_run(tenant_arrears, repeat)
+        in_arrears = sum(row['tenants_in_arrears'] for row in properties)
+        self.stdout.write(f"{'approach':<24}{'in arrears':>12}{'ms':>12}")
+        self.stdout.write(f"{'row by row':<24}{loop_tenants:>12}{loop_ms:>12.1f}")
+        self.stdout.write(f"{'grouped SQL report':<24}{in_arrears:>12}{report_ms:>12.1f}")
+        self.stdout.write(f"{'grouped SQL, all rows':<24}{len(rows):>12}{all_ms:>12.1f}")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options['seed_tenants']:
+                    started = time.perf_counter()
+                    self.seed(options['seed_tenants'], options['properties'])
+                    self.stdout.write(
+                        f'Seeded {options["seed_tenants"]} tenants in {time.perf_counter() - started:.1f}s'
+                    )
+                self.benchmark(options['repeat'])
+                if options['seed_tenants']:
+                    raise Rollback
+        except Rollback:
+            self.stdout.write('Seeded rows rolled back')
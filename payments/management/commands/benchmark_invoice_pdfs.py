@@ -0,0 +1,73 @@
+import datetime
+import tempfile
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from payments.invoice_pdf import render_invoices
+from payments.models import Invoice
+from properties.models import Property
+from tenants.models import Tenant
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    # Seeded rows are never committed, so this times a single worker's share
+    # of the work; Celery throughput then scales with the number of workers
+    help = 'Time rendering invoice PDFs in this process, and again from the warm cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invoices', type=int, default=10000,
+                            help='Insert this many invoices first (rolled back afterwards)')
+        parser.add_argument('--chunk-size', type=int, default=200)
+
+    def seed(self, count):
+        today = timezone.now().date()
+        rental_property = Property.objects.create(
+            title='Benchmark Court', property_type='apartment', address='1 Main Road',
+            city='Durban', state='KZN', monthly_rent=Decimal('8000'),
+        )
+        tenants = Tenant.objects.bulk_create([
+            Tenant(rental_property=rental_property, first_name='Tenant', last_name=str(number),
+                   email=f'benchmark-invoice-{number}@example.com', phone='000', lease_start_date=today,
+                   lease_end_date=today, monthly_rent=Decimal('8000'))
+            for number in range(min(count, 1000))
+        ])
+        Invoice.objects.bulk_create([
+            Invoice(rental_property=rental_property, tenant=tenants[number % len(tenants)],
+                    invoice_number=f'BENCH-{number:06d}', invoice_date=today,
+                    due_date=today + datetime.timedelta(days=7), status='sent',
+                    subtotal=Decimal('8000.00'), tax_amount=Decimal('1200.00'), total_amount=Decimal('9200.00'),
+                    description=f'Rent for {today:%B %Y}, unit {number % 1000}')
+            for number in range(count)
+        ], batch_size=2000)
+
+    def run(self, invoices, chunk_size):
+        with tempfile.TemporaryDirectory() as root:
+            report = render_invoices(invoices, chunk_size, root=root, now=True)
+            self.row('cold cache', report['rendered'], report['seconds'])
+            # A second pass over the same directory only hashes and finds every file
+            warm = render_invoices(invoices, chunk_size, root=root, now=True)
+            self.row('warm cache', warm['cached'], warm['seconds'])
+
+    def row(self, label, count, seconds):
+        self.stdout.write(f"{label:<24}{count:>10}{seconds:>10.2f}{count / seconds if seconds else 0:>12.0f}")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                self.seed(options['invoices'])
+                self.stdout.write(f"Seeded {options['invoices']} invoices in {time.perf_counter() - started:.1f}s")
+                invoices = Invoice.objects.filter(invoice_number__startswith='BENCH-')
+                self.stdout.write(f"{'approach':<24}{'PDFs':>10}{'s':>10}{'per s':>12}")
+                self.run(invoices, options['chunk_size'])
+                raise Rollback
+        except Rollback:
+            self.stdout.write('Seeded rows rolled back')
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments.ledger import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Replay every tenant ledger and running balance from the payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', action='append', default=None, help='Only this tenant id; may be repeated')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rebuild(options['tenant'], batch_size=options['batch_size'])
+        self.stdout.write(f'Posted {count} ledger entries in {time.perf_counter() - started:.1f}s')
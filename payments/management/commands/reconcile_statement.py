@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.reconciliation import DEFAULT_BATCH_SIZE, detect_format, import_statement
+
+
+class Command(BaseCommand):
+    help = 'Match a bank statement (CSV or OFX) to open payments and record the lines that did not match'
+
+    def add_arguments(self, parser):
+        parser.add_argument('statement', help='Path of the statement file')
+        parser.add_argument('--format', choices=('csv', 'ofx'), help='Default: guessed from the file name')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['statement']
+        statement_format = options['format'] or detect_format(path)
+        try:
+            with open(path, encoding='utf-8-sig', errors='replace', newline='') as stream:
+                statement = import_statement(
+                    stream, statement_format, path, batch_size=options['batch_size'],
+                )
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+
+        elapsed = (statement.finished_at - statement.started_at).total_seconds()
+        self.stdout.write(
+            f'{statement.lines} lines: {statement.matched} matched, '
+            f'{statement.already_reconciled} already reconciled, {statement.exceptions} exceptions '
+            f'in {elapsed:.1f}s (import {statement.pk})'
+        )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from payments.invoice_pdf import DEFAULT_CHUNK_SIZE, prune_cache, render_invoices
+from payments.models import Invoice
+
+
+class Command(BaseCommand):
+    help = 'Queue rendering of the invoice PDFs missing from the content-hash cache (--now renders here)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', action='append', choices=[status for status, _ in Invoice.INVOICE_STATUS],
+                            help='Only invoices with this status (repeatable)')
+        parser.add_argument('--now', action='store_true', help='Render in this process instead of the Celery workers')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--prune', action='store_true',
+                            help='Afterwards delete cached PDFs that no invoice renders to any more')
+
+    def handle(self, *args, **options):
+        invoices = Invoice.objects.all()
+        if options['status']:
+            invoices = invoices.filter(status__in=options['status'])
+
+        report = render_invoices(invoices, options['chunk_size'], now=options['now'])
+        if options['now']:
+            self.stdout.write(
+                f"{report['invoices']} invoices: {report['cached']} cached, {report['rendered']} rendered "
+                f"in {report['seconds']}s ({report['per_second']}/s)"
+            )
+        else:
+            self.stdout.write(
+                f"{report['invoices']} invoices: {report['cached']} cached, {report['missing']} queued"
+            )
+        if options['prune']:
+            self.stdout.write(f'{prune_cache(Invoice.objects.all())} stale PDFs removed')
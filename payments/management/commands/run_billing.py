@@ -0,0 +1,32 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from payments.billing import DEFAULT_CHUNK_SIZE, run
+
+
+class Command(BaseCommand):
+    help = 'Generate the recurring charges due in a month (safe to re-run for the same month)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', help='Month to bill, YYYY-MM (default: this month)')
+        parser.add_argument('--invoices', action='store_true', help='Also create an invoice per charge')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Only count the charges that are due')
+
+    def handle(self, *args, **options):
+        try:
+            period = (
+                datetime.datetime.strptime(options['period'], '%Y-%m').date()
+                if options['period'] else timezone.now().date()
+            )
+        except ValueError:
+            raise CommandError('--period must look like 2031-03')
+
+        report = run(period, options['invoices'], options['chunk_size'], options['dry_run'])
+        self.stdout.write(
+            f"{report['period']}: {report['due']} due of {report['templates']} recurring charges, "
+            f"{report['created']} created, {report['skipped']} already billed, {report['invoices']} invoices "
+            f"in {report['seconds']}s ({report['per_second']}/s)"
+        )
@@ -0,0 +1,147 @@
+# Generated by Django 4.2 on 2026-10-17 20:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('tenants', '0001_initial'),
+        ('properties', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TenantBalance',
+            fields=[
+                ('tenant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ledger_balance', serialize=False, to='tenants.tenant')),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Payment',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('payment_type', models.CharField(choices=[('rent', 'Rent'), ('security_deposit', 'Security Deposit'), ('pet_deposit', 'Pet Deposit'), ('late_fee', 'Late Fee'), ('maintenance', 'Maintenance Fee'), ('utility', 'Utility Payment'), ('other', 'Other')], default='rent', max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('currency', models.CharField(default='ZAR', max_length=3)),
+                ('payment_date', models.DateField()),
+                ('due_date', models.DateField()),
+                ('received_date', models.DateField(blank=True, null=True)),
+                ('payment_method', models.CharField(choices=[('bank_transfer', 'Bank Transfer'), ('cash', 'Cash'), ('card', 'Credit/Debit Card'), ('check', 'Check'), ('eft', 'EFT'), ('mobile', 'Mobile Payment'), ('other', 'Other')], default='bank_transfer', max_length=20)),
+                ('reference_number', models.CharField(blank=True, max_length=100)),
+                ('transaction_id', models.CharField(blank=True, max_length=100)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed'), ('refunded', 'Refunded'), ('cancelled', 'Cancelled')], default='pending', max_length=20)),
+                ('late_fee', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('discount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('net_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('notes', models.TextField(blank=True)),
+                ('is_recurring', models.BooleanField(default=False)),
+                ('recurring_frequency', models.CharField(blank=True, choices=[('monthly', 'Monthly'), ('quarterly', 'Quarterly'), ('annually', 'Annually')], max_length=20)),
+                ('receipt', models.FileField(blank=True, null=True, upload_to='payment_receipts/')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('rental_property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='properties.property')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='tenants.tenant')),
+            ],
+            options={
+                'ordering': ['-payment_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('charge', 'Charge'), ('receipt', 'Receipt'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('balance_after', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('effective_date', models.DateField()),
+                ('memo', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='payments.payment')),
+                ('rental_property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='properties.property')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='tenants.tenant')),
+            ],
+            options={
+                'verbose_name_plural': 'Ledger entries',
+                'ordering': ['tenant', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Invoice',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('invoice_number', models.CharField(max_length=50, unique=True)),
+                ('invoice_date', models.DateField()),
+                ('due_date', models.DateField()),
+                ('status', models.CharField(choices=[('draft', 'Draft'), ('sent', 'Sent'), ('paid', 'Paid'), ('overdue', 'Overdue'), ('cancelled', 'Cancelled')], default='draft', max_length=20)),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('tax_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('description', models.TextField(blank=True)),
+                ('notes', models.TextField(blank=True)),
+                ('payment_link', models.URLField(blank=True)),
+                ('paid_date', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('rental_property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='invoices', to='properties.property')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='invoices', to='tenants.tenant')),
+            ],
+            options={
+                'ordering': ['-invoice_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Expense',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('category', models.CharField(choices=[('maintenance', 'Maintenance'), ('repair', 'Repair'), ('utility', 'Utility'), ('insurance', 'Insurance'), ('tax', 'Tax'), ('management', 'Management Fee'), ('advertising', 'Advertising'), ('legal', 'Legal Fees'), ('other', 'Other')], default='maintenance', max_length=20)),
+                ('description', models.CharField(max_length=200)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('currency', models.CharField(default='ZAR', max_length=3)),
+                ('expense_date', models.DateField()),
+                ('payment_date', models.DateField(blank=True, null=True)),
+                ('vendor', models.CharField(blank=True, max_length=200)),
+                ('invoice_number', models.CharField(blank=True, max_length=100)),
+                ('payment_method', models.CharField(choices=[('bank_transfer', 'Bank Transfer'), ('cash', 'Cash'), ('card', 'Credit/Debit Card'), ('check', 'Check'), ('eft', 'EFT'), ('mobile', 'Mobile Payment'), ('other', 'Other')], default='bank_transfer', max_length=20)),
+                ('is_paid', models.BooleanField(default=False)),
+                ('receipt', models.FileField(blank=True, null=True, upload_to='expense_receipts/')),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('rental_property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expenses', to='properties.property')),
+            ],
+            options={
+                'ordering': ['-expense_date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['rental_property', 'tenant', 'status'], name='payments_pa_rental__321221_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['payment_date'], name='payments_pa_payment_1d6e55_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'due_date'], name='payments_pa_status_0d3455_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['reference_number'], name='payments_pa_referen_c54e4c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['tenant', 'id'], name='payments_le_tenant__8a7390_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['rental_property', 'effective_date'], name='payments_le_rental__4c8f81_idx'),
+        ),
+    ]
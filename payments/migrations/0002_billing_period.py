@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-17 20:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='billing_period',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['is_recurring', 'tenant', 'payment_type', 'due_date'], name='payments_pa_is_recu_d06545_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(fields=('tenant', 'payment_type', 'billing_period'), name='unique_billing_period_charge'),
+        ),
+    ]
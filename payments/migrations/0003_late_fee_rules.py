@@ -0,0 +1,49 @@
+# Generated by Django 4.2 on 2026-10-17 20:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0001_initial'),
+        ('payments', '0002_billing_period'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LateFeeRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('flat_fee', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('percentage', models.DecimalField(decimal_places=2, default=0, help_text='Percent of the payment amount', max_digits=5)),
+                ('grace_days', models.PositiveIntegerField(default=5)),
+                ('max_fee', models.DecimalField(blank=True, decimal_places=2, help_text='Cap on the late fee of one payment', max_digits=10, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('rental_property', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='late_fee_rule', to='properties.property')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LateFeeAssessment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('previous_fee', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('late_fee', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('days_overdue', models.PositiveIntegerField()),
+                ('assessed_on', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='late_fee_assessments', to='payments.payment')),
+                ('rule', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='assessments', to='payments.latefeerule')),
+            ],
+            options={
+                'ordering': ['-assessed_on', '-id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='latefeeassessment',
+            index=models.Index(fields=['payment', 'assessed_on'], name='payments_la_payment_bb3e64_idx'),
+        ),
+    ]
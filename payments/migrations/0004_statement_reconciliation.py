@@ -0,0 +1,74 @@
+# Generated by Django 4.2 on 2026-10-17 20:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('payments', '0003_late_fee_rules'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line_number', models.PositiveIntegerField()),
+                ('posted_date', models.DateField(blank=True, null=True)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('transaction_id', models.CharField(blank=True, max_length=100)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('reason', models.CharField(choices=[('unreadable', 'Unreadable line'), ('no_match', 'No matching payment'), ('ambiguous', 'Several possible payments'), ('amount_mismatch', 'Amount differs from the payment'), ('duplicate', 'Payment already matched by another line')], max_length=20)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('resolved', 'Resolved'), ('ignored', 'Ignored')], default='open', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['statement_import', 'line_number'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StatementImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255)),
+                ('statement_format', models.CharField(choices=[('csv', 'CSV'), ('ofx', 'OFX')], max_length=3)),
+                ('lines', models.PositiveIntegerField(default=0)),
+                ('matched', models.PositiveIntegerField(default=0)),
+                ('already_reconciled', models.PositiveIntegerField(default=0)),
+                ('exceptions', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['transaction_id'], name='payments_pa_transac_8e9d99_idx'),
+        ),
+        migrations.AddField(
+            model_name='statementimport',
+            name='imported_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='statement_imports', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='reconciliationexception',
+            name='payment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reconciliation_exceptions', to='payments.payment'),
+        ),
+        migrations.AddField(
+            model_name='reconciliationexception',
+            name='statement_import',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exception_lines', to='payments.statementimport'),
+        ),
+        migrations.AddIndex(
+            model_name='reconciliationexception',
+            index=models.Index(fields=['status', 'created_at'], name='payments_re_status_91a212_idx'),
+        ),
+    ]
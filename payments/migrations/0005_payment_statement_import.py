@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-17 21:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_statement_reconciliation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='statement_import',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='completed_payments', to='payments.statementimport'),
+        ),
+    ]
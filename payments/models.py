@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 import uuid
 from properties.models import Property
@@ -108,6 +108,17 @@ class Payment(models.Model):
         ],
         blank=True
     )
+    # Month a billing run generated this charge for (see payments.billing)
+    billing_period = models.DateField(null=True, blank=True)
+    # Statement import that completed this charge (see payments.reconciliation)
+    statement_import = models.ForeignKey(
+        'StatementImport',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='completed_payments'
+    )
     
     # Attachments
     receipt = models.FileField(
@@ -127,12 +138,22 @@ class Payment(models.Model):
             models.Index(fields=['payment_date']),
             models.Index(fields=['status', 'due_date']),
             models.Index(fields=['reference_number']),
+            models.Index(fields=['transaction_id']),
+            models.Index(fields=['is_recurring', 'tenant', 'payment_type', 'due_date']),
+        ]
+        constraints = [
+            # A billing run creates at most one charge per tenant, type and period
+            models.UniqueConstraint(
+                fields=['tenant', 'payment_type', 'billing_period'], name='unique_billing_period_charge'
+            ),
         ]
     
     def __str__(self):
         return f"Payment {self.reference_number or self.id} - {self.tenant.full_name}"
     
     def save(self, *args, **kwargs):
+        from .ledger import payment_postings, payment_state, post, stored_payment
+        
         # Calculate net amount
         self.net_amount = self.amount + self.late_fee - self.discount
         
@@ -140,7 +161,21 @@ class Payment(models.Model):
         if self.status == 'completed' and not self.received_date:
             self.received_date = self.payment_date
         
-        super().save(*args, **kwargs)
+        # The ledger moves in the same transaction as the payment row
+        with transaction.atomic():
+            previous = None if self._state.adding else stored_payment(self.pk)
+            super().save(*args, **kwargs)
+            post(payment_postings(previous, payment_state(self), self.pk))
+    
+    def delete(self, *args, **kwargs):
+        from .ledger import payment_postings, post, stored_payment
+        
+        with transaction.atomic():
+            previous = stored_payment(self.pk)
+            result = super().delete(*args, **kwargs)
+            # The entries keep their history; the payment link is cleared with the row
+            post(payment_postings(previous, None))
+        return result
     
     @property
     def is_overdue(self):
@@ -159,6 +194,219 @@ class Payment(models.Model):
         return 0
 
 
+class TenantBalance(models.Model):
+    """Materialized running balance of a tenant's ledger (see payments.ledger)"""
+    
+    tenant = models.OneToOneField(
+        Tenant,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ledger_balance'
+    )
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.tenant.full_name}: {self.balance}"
+
+
+class LedgerEntry(models.Model):
+    """One charge, receipt or adjustment on a tenant's account"""
+    
+    ENTRY_TYPES = [
+        ('charge', 'Charge'),
+        ('receipt', 'Receipt'),
+        ('adjustment', 'Adjustment'),
+    ]
+    
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name='ledger_entries'
+    )
+    rental_property = models.ForeignKey(
+        Property,
+        on_delete=models.CASCADE,
+        related_name='ledger_entries'
+    )
+    payment = models.ForeignKey(
+        Payment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ledger_entries'
+    )
+    
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPES)
+    # Positive amounts increase what the tenant owes, receipts are negative
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    balance_after = models.DecimalField(max_digits=12, decimal_places=2)
+    effective_date = models.DateField()
+    memo = models.CharField(max_length=255, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['tenant', 'id']
+        verbose_name_plural = 'Ledger entries'
+        indexes = [
+            models.Index(fields=['tenant', 'id']),
+            models.Index(fields=['rental_property', 'effective_date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_entry_type_display()} {self.amount} - {self.tenant.full_name}"
+
+
+class LateFeeRule(models.Model):
+    """
+    Late fee terms for a property, or the portfolio default when no property
+    is set (see payments.late_fees).
+    """
+    
+    rental_property = models.OneToOneField(
+        Property,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='late_fee_rule'
+    )
+    flat_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    percentage = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        default=0,
+        help_text="Percent of the payment amount"
+    )
+    grace_days = models.PositiveIntegerField(default=5)
+    max_fee = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        help_text="Cap on the late fee of one payment"
+    )
+    is_active = models.BooleanField(default=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        target = self.rental_property.title if self.rental_property_id else 'Portfolio default'
+        return f"Late fee rule - {target}"
+
+
+class LateFeeAssessment(models.Model):
+    """Audit trail of a late fee applied to a payment"""
+    
+    payment = models.ForeignKey(
+        Payment,
+        on_delete=models.CASCADE,
+        related_name='late_fee_assessments'
+    )
+    rule = models.ForeignKey(
+        LateFeeRule,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='assessments'
+    )
+    previous_fee = models.DecimalField(max_digits=10, decimal_places=2)
+    late_fee = models.DecimalField(max_digits=10, decimal_places=2)
+    days_overdue = models.PositiveIntegerField()
+    assessed_on = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-assessed_on', '-id']
+        indexes = [
+            models.Index(fields=['payment', 'assessed_on']),
+        ]
+    
+    def __str__(self):
+        return f"Late fee {self.late_fee} on {self.payment_id}"
+
+
+class StatementImport(models.Model):
+    """One bank statement run through reconciliation (see payments.reconciliation)"""
+    
+    FORMATS = [
+        ('csv', 'CSV'),
+        ('ofx', 'OFX'),
+    ]
+    
+    source = models.CharField(max_length=255)
+    statement_format = models.CharField(max_length=3, choices=FORMATS)
+    lines = models.PositiveIntegerField(default=0)
+    matched = models.PositiveIntegerField(default=0)
+    already_reconciled = models.PositiveIntegerField(default=0)
+    exceptions = models.PositiveIntegerField(default=0)
+    imported_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='statement_imports'
+    )
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-started_at']
+    
+    def __str__(self):
+        return f"Statement {self.source} ({self.matched}/{self.lines} matched)"
+
+
+class ReconciliationException(models.Model):
+    """A statement line that could not be matched to a payment, kept for review"""
+    
+    REASONS = [
+        ('unreadable', 'Unreadable line'),
+        ('no_match', 'No matching payment'),
+        ('ambiguous', 'Several possible payments'),
+        ('amount_mismatch', 'Amount differs from the payment'),
+        ('duplicate', 'Payment already matched by another line'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('resolved', 'Resolved'),
+        ('ignored', 'Ignored'),
+    ]
+    
+    statement_import = models.ForeignKey(
+        StatementImport,
+        on_delete=models.CASCADE,
+        related_name='exception_lines'
+    )
+    line_number = models.PositiveIntegerField()
+    posted_date = models.DateField(null=True, blank=True)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    reference = models.CharField(max_length=100, blank=True)
+    transaction_id = models.CharField(max_length=100, blank=True)
+    description = models.CharField(max_length=255, blank=True)
+    reason = models.CharField(max_length=20, choices=REASONS)
+    # The payment the line pointed at, when there was one
+    payment = models.ForeignKey(
+        Payment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='reconciliation_exceptions'
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['statement_import', 'line_number']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Line {self.line_number}: {self.get_reason_display()}"
+
+
 class Invoice(models.Model):
     """Invoice model for billing"""
     
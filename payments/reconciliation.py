@@ -0,0 +1,366 @@
+"""
+Bank statement reconciliation.
+
+Statements (CSV exports or OFX files) are read as a stream of
+``StatementLine`` tuples, one line at a time, and matched in batches so a
+statement of hundreds of thousands of lines never sits in memory. For each
+batch:
+
+* lines a completed payment already accounts for count as already
+  reconciled and go no further, so re-importing a statement completes
+  nothing new: a line with a transaction id some completed payment carries;
+  a line without one whose reference only completed payments carry, for
+  one of their amounts, or, when its reference names no payment, whose
+  amount and date a payment completed by an earlier import of the same
+  statement received; a line naming only completed payments for another
+  amount is an ``amount_mismatch``,
+* one query loads the open payments whose ``transaction_id`` or
+  ``reference_number`` (both indexed) appears in the batch, and a second
+  loads the open payments with one of the remaining lines' amounts due
+  within ``DATE_WINDOW_DAYS`` of them; both become dicts keyed by id,
+  reference and amount, so matching a line is a lookup, not a query,
+* a line matches one payment by transaction id, else reference, else a
+  unique amount-and-date candidate, and its amount must equal the
+  payment's ``net_amount``,
+* matches are locked and completed set-based, one ``UPDATE`` per posting
+  date plus a ``bulk_update`` of the bank's transaction ids, and posted to
+  the tenant ledger in the same transaction (neither calls
+  ``Payment.save``).
+
+Lines that are unreadable, unmatched, ambiguous, for a different amount or
+for a payment another line already took become ``ReconciliationException``
+rows for review. Debits (amounts of zero or less) are not payments and are
+only counted.
+"""
+import csv
+import datetime
+import re
+from collections import Counter, defaultdict, namedtuple
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .ledger import OPEN_STATUSES, PAYMENT_FIELDS, PaymentState, payment_postings, post
+from .models import Payment, ReconciliationException, StatementImport
+
+DEFAULT_BATCH_SIZE = 1000
+
+# How far a payment's due date may be from the bank's posting date for an amount match
+DATE_WINDOW_DAYS = 10
+
+CENTS = Decimal('0.01')
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%Y/%m/%d', '%d %b %Y', '%Y%m%d')
+
+# Accepted CSV header names per field
+CSV_COLUMNS = {
+    'posted_date': ('date', 'posted date', 'posting date', 'transaction date', 'value date'),
+    'amount': ('amount', 'credit', 'credit amount'),
+    'reference': ('reference', 'payment reference', 'ref'),
+    'transaction_id': ('transaction id', 'transaction_id', 'fitid', 'id'),
+    'description': ('description', 'narrative', 'details', 'memo'),
+}
+
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<\r\n]*)')
+
+StatementLine = namedtuple(
+    'StatementLine', 'line_number posted_date amount reference transaction_id description error'
+)
+
+
+def detect_format(name):
+    return 'ofx' if name.lower().endswith(('.ofx', '.qfx')) else 'csv'
+
+
+def parse_date(value):
+    value = value.strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f'Unrecognised date {value!r}')
+
+
+def parse_amount(value):
+    cleaned = re.sub(r'[^0-9.\-]', '', value)
+    try:
+        return Decimal(cleaned).quantize(CENTS)
+    except InvalidOperation:
+        raise ValueError(f'Unrecognised amount {value!r}')
+
+
+def statement_line(line_number, date, amount, reference='', transaction_id='', description=''):
+    """A parsed line, or one carrying the parse error"""
+    texts = (reference.strip()[:100], transaction_id.strip()[:100], description.strip()[:255])
+    try:
+        return StatementLine(line_number, parse_date(date), parse_amount(amount), *texts, '')
+    except ValueError as error:
+        return StatementLine(line_number, None, None, *texts, str(error))
+
+
+def read_csv(stream):
+    """Lines of a CSV statement with a header row; the header is checked straight away"""
+    reader = csv.reader(stream)
+    header = [name.strip().lower() for name in next(reader, [])]
+    columns = {}
+    for field, names in CSV_COLUMNS.items():
+        columns[field] = next((header.index(name) for name in names if name in header), None)
+    if columns['posted_date'] is None or columns['amount'] is None:
+        raise ValueError('The statement needs a date and an amount column')
+
+    def cell(row, field):
+        index = columns[field]
+        return row[index] if index is not None and index < len(row) else ''
+
+    def lines():
+        for row in reader:
+            if not any(value.strip() for value in row):
+                continue
+            yield statement_line(
+                reader.line_num, cell(row, 'posted_date'), cell(row, 'amount'), cell(row, 'reference'),
+                cell(row, 'transaction_id'), cell(row, 'description'),
+            )
+
+    return lines()
+
+
+def read_ofx(stream):
+    """Lines (``STMTTRN`` records) of an OFX statement, SGML or XML"""
+    transaction_tags = None
+    for line_number, text in enumerate(stream, 1):
+        for closing, tag, value in OFX_TAG.findall(text):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if closing and transaction_tags is not None:
+                    yield statement_line(
+                        transaction_tags['line'], transaction_tags.get('DTPOSTED', '')[:8],
+                        transaction_tags.get('TRNAMT', ''),
+                        # Banks carry the payer's reference in REFNUM or, more often, MEMO
+                        transaction_tags.get('REFNUM') or transaction_tags.get('MEMO', ''),
+                        transaction_tags.get('FITID', ''),
+                        ' '.join(filter(None, (transaction_tags.get('NAME'), transaction_tags.get('MEMO')))),
+                    )
+                    transaction_tags = None
+                elif not closing:
+                    transaction_tags = {'line': line_number}
+            elif transaction_tags is not None and not closing:
+                transaction_tags[tag] = value.strip()
+
+
+def read_statement(stream, statement_format):
+    return read_ofx(stream) if statement_format == 'ofx' else read_csv(stream)
+
+
+def batches(lines, batch_size):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def settled(statement, lines):
+    """
+    ``(positions, mismatches)``: positions of the lines a completed payment
+    already accounts for, and a dict of position to payment id for lines
+    naming only completed payments of another amount.
+    """
+    completed = Payment.objects.filter(status='completed').order_by()
+    done_ids = set(completed.filter(
+        transaction_id__in={line.transaction_id for line in lines if line.transaction_id},
+    ).values_list('transaction_id', flat=True))
+    # Lines with a new transaction id are new money, even under a known reference
+    untracked = [line for line in lines if not line.transaction_id]
+
+    open_references, done_references = set(), defaultdict(dict)
+    for pk, reference, status, net_amount in Payment.objects.filter(
+        reference_number__in={line.reference for line in untracked if line.reference},
+    ).order_by('pk').values_list('pk', 'reference_number', 'status', 'net_amount'):
+        if status in OPEN_STATUSES:
+            open_references.add(reference)
+        else:
+            done_references[reference].setdefault(net_amount, pk)
+    for reference in open_references:
+        done_references.pop(reference, None)
+
+    # Untracked lines naming no payment were matched by amount and date; only
+    # a payment an earlier import of this statement completed vouches for one
+    named = open_references | set(done_references)
+    unnamed = [line for line in untracked if line.reference not in named]
+    received = Counter()
+    if unnamed:
+        received.update(completed.filter(
+            statement_import__source=statement.source,
+            net_amount__in={line.amount for line in unnamed},
+            received_date__in={line.posted_date for line in unnamed},
+        ).exclude(statement_import=statement).values_list('net_amount', 'received_date'))
+
+    positions, mismatches = set(), {}
+    for position, line in enumerate(lines):
+        if line.transaction_id:
+            if line.transaction_id in done_ids:
+                positions.add(position)
+        elif line.reference in done_references:
+            amounts = done_references[line.reference]
+            if line.amount in amounts:
+                positions.add(position)
+            else:
+                mismatches[position] = next(iter(amounts.values()))
+        elif line.reference not in open_references and received[line.amount, line.posted_date]:
+            received[line.amount, line.posted_date] -= 1
+            positions.add(position)
+    return positions, mismatches
+
+
+def payment_indexes(lines):
+    """Open candidate payments of a batch: ``(by transaction id, by reference, by amount)``"""
+    transaction_ids = {line.transaction_id for line in lines if line.transaction_id}
+    references = {line.reference for line in lines if line.reference}
+    by_transaction_id = defaultdict(list)
+    by_reference = defaultdict(list)
+    by_amount = defaultdict(list)
+
+    fields = ('pk', 'net_amount', 'due_date', 'reference_number', 'transaction_id')
+    open_payments = Payment.objects.filter(status__in=OPEN_STATUSES).order_by()
+    if transaction_ids or references:
+        for payment in open_payments.filter(
+            Q(transaction_id__in=transaction_ids) | Q(reference_number__in=references)
+        ).values_list(*fields, named=True):
+            if payment.transaction_id in transaction_ids:
+                by_transaction_id[payment.transaction_id].append(payment)
+            if payment.reference_number in references:
+                by_reference[payment.reference_number].append(payment)
+
+    rest = [line for line in lines if line.transaction_id not in by_transaction_id
+            and line.reference not in by_reference]
+    if rest:
+        window = datetime.timedelta(days=DATE_WINDOW_DAYS)
+        for payment in open_payments.filter(
+            net_amount__in={line.amount for line in rest},
+            due_date__gte=min(line.posted_date for line in rest) - window,
+            due_date__lte=max(line.posted_date for line in rest) + window,
+        ).values_list(*fields, named=True):
+            by_amount[payment.net_amount].append(payment)
+    return by_transaction_id, by_reference, by_amount
+
+
+def find_payment(line, indexes):
+    """``(payment, reason)``: the matched payment and '', or the best guess and why it failed"""
+    by_transaction_id, by_reference, by_amount = indexes
+    candidates = by_transaction_id.get(line.transaction_id) or by_reference.get(line.reference)
+    if candidates:
+        exact = [payment for payment in candidates if payment.net_amount == line.amount]
+        if len(exact) == 1:
+            return exact[0], ''
+        if exact or len(candidates) > 1:
+            return None, 'ambiguous'
+        return candidates[0], 'amount_mismatch'
+
+    nearby = [payment for payment in by_amount.get(line.amount, ())
+              if abs((payment.due_date - line.posted_date).days) <= DATE_WINDOW_DAYS]
+    if len(nearby) == 1:
+        return nearby[0], ''
+    return None, 'ambiguous' if nearby else 'no_match'
+
+
+def complete_payments(statement, matches):
+    """Complete the matched payments still open; returns the ids completed"""
+    now = timezone.now()
+    with transaction.atomic():
+        rows = Payment.objects.select_for_update().filter(
+            pk__in=matches, status__in=OPEN_STATUSES,
+        ).order_by('pk').values_list('pk', 'transaction_id', *PAYMENT_FIELDS)
+        by_date = defaultdict(list)
+        new_transaction_ids = []
+        postings = []
+        for pk, transaction_id, *state in rows:
+            line = matches[pk]
+            previous = PaymentState(*state)
+            by_date[line.posted_date].append(pk)
+            if line.transaction_id and line.transaction_id != transaction_id:
+                new_transaction_ids.append(Payment(pk=pk, transaction_id=line.transaction_id))
+            postings += payment_postings(
+                previous, previous._replace(status='completed', received_date=line.posted_date), pk,
+            )
+        # A statement batch spans few posting dates: one plain UPDATE per date,
+        # leaving the per-row CASE of bulk_update to the transaction ids alone
+        for posted_date, pks in by_date.items():
+            Payment.objects.filter(pk__in=pks).update(
+                status='completed', received_date=posted_date, statement_import=statement, updated_at=now,
+            )
+        Payment.objects.bulk_update(new_transaction_ids, ['transaction_id'])
+        post(postings)
+    return {pk for pks in by_date.values() for pk in pks}
+
+
+def exception_for(statement, line, reason, payment_id=None):
+    return ReconciliationException(
+        statement_import=statement,
+        line_number=line.line_number,
+        posted_date=line.posted_date,
+        amount=line.amount,
+        reference=line.reference,
+        transaction_id=line.transaction_id,
+        description=(line.error or line.description)[:255],
+        reason=reason,
+        payment_id=payment_id,
+    )
+
+
+def reconcile_batch(statement, lines):
+    """Match, complete and record one batch; returns (matched, already reconciled, exceptions)"""
+    exceptions = [exception_for(statement, line, 'unreadable') for line in lines if line.error]
+    credits = [line for line in lines if not line.error and line.amount > 0]
+
+    done, mismatches = settled(statement, credits)
+    exceptions += [exception_for(statement, credits[position], 'amount_mismatch', pk)
+                   for position, pk in mismatches.items()]
+    readable = [line for position, line in enumerate(credits)
+                if position not in done and position not in mismatches]
+    already = len(done)
+
+    matches = {}
+    if readable:
+        indexes = payment_indexes(readable)
+        for line in readable:
+            payment, reason = find_payment(line, indexes)
+            if not reason and payment.pk in matches:
+                reason = 'duplicate'
+            if reason:
+                exceptions.append(exception_for(statement, line, reason, payment.pk if payment else None))
+            else:
+                matches[payment.pk] = line
+
+    completed = complete_payments(statement, matches) if matches else set()
+    # Paid some other way while the batch was matched
+    exceptions += [exception_for(statement, line, 'duplicate', pk) for pk, line in matches.items()
+                   if pk not in completed]
+    ReconciliationException.objects.bulk_create(exceptions)
+    return len(completed), already, len(exceptions)
+
+
+def import_statement(stream, statement_format, source, user=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Reconcile a statement read from a text stream; returns its
+    ``StatementImport``. Raises ``ValueError`` for a CSV without date and
+    amount columns.
+    """
+    lines = read_statement(stream, statement_format)
+    statement = StatementImport.objects.create(
+        source=source[:255], statement_format=statement_format, imported_by=user,
+    )
+    for batch in batches(lines, batch_size):
+        matched, already, exceptions = reconcile_batch(statement, batch)
+        statement.lines += len(batch)
+        statement.matched += matched
+        statement.already_reconciled += already
+        statement.exceptions += exceptions
+    statement.finished_at = timezone.now()
+    statement.save()
+    return statement
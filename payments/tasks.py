@@ -0,0 +1,10 @@
+from celery import shared_task
+
+from .invoice_pdf import cache_root, invoice_documents, render_chunk
+from .models import Invoice
+
+
+@shared_task(acks_late=True, ignore_result=True)
+def render_invoice_pdfs(invoice_ids, root=None):
+    """Render the cached PDFs of a chunk of invoices; returns how many"""
+    return render_chunk(root or cache_root(), invoice_documents(Invoice.objects.filter(pk__in=invoice_ids)))
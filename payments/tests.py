@@ -1,3 +1,489 @@
-from django.test import TestCase
+import base64
+import datetime
+import io
+import os
+import re
+import tempfile
+import zlib
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+from properties.models import Property
+from tenants.models import Tenant
+from .billing import run as run_billing
+from .invoice_pdf import invoice_pdf_path, prune_cache, render_invoices
+from .late_fees import run as assess_late_fees
+from .reconciliation import import_statement
+from .tasks import render_invoice_pdfs
+from .ledger import property_aging, rebuild, tenant_arrears
+from .models import (
+    Invoice, LateFeeAssessment, LateFeeRule, LedgerEntry, Payment, ReconciliationException, TenantBalance,
+)
+
+
+class LedgerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.property = Property.objects.create(
+            title='Harbour View', property_type='apartment', address='1 Beach Road',
+            city='Durban', state='KZN', monthly_rent=Decimal('8000'),
+        )
+        cls.tenant = Tenant.objects.create(
+            rental_property=cls.property, first_name='Thandi', last_name='Dlamini',
+            email='thandi@example.com', phone='000', lease_start_date=datetime.date(2030, 1, 1),
+            lease_end_date=datetime.date(2030, 12, 31), monthly_rent=Decimal('8000'),
+        )
+
+    def pay(self, due_date, amount='8000.00', status='pending', **kwargs):
+        return Payment.objects.create(
+            rental_property=self.property, tenant=self.tenant, amount=Decimal(amount),
+            payment_date=due_date, due_date=due_date, status=status, **kwargs
+        )
+
+    def balance(self):
+        return TenantBalance.objects.get(tenant=self.tenant).balance
+
+    def test_running_balance_follows_payment_saves(self):
+        rent = self.pay(datetime.date(2030, 3, 1))
+        self.pay(datetime.date(2030, 4, 1), late_fee=Decimal('250.00'))
+        self.assertEqual(self.balance(), Decimal('16250.00'))
+
+        rent.status = 'completed'
+        rent.save()
+        self.assertEqual(self.balance(), Decimal('8250.00'))
+
+        entries = list(LedgerEntry.objects.filter(tenant=self.tenant).values_list('entry_type', 'amount', 'balance_after'))
+        self.assertEqual(entries, [
+            ('charge', Decimal('8000.00'), Decimal('8000.00')),
+            ('charge', Decimal('8250.00'), Decimal('16250.00')),
+            ('receipt', Decimal('-8000.00'), Decimal('8250.00')),
+        ])
+
+        # Voiding and deleting post adjustments; history stays
+        Payment.objects.get(due_date=datetime.date(2030, 4, 1)).delete()
+        self.assertEqual(self.balance(), Decimal('0.00'))
+        self.assertEqual(LedgerEntry.objects.count(), 4)
+
+    def test_rebuild_matches_incremental_balance(self):
+        self.pay(datetime.date(2030, 3, 1), status='completed')
+        self.pay(datetime.date(2030, 4, 1))
+        cancelled = self.pay(datetime.date(2030, 5, 1))
+        cancelled.status = 'cancelled'
+        cancelled.save()
+        balance = self.balance()
+
+        rebuild()
+        self.assertEqual(self.balance(), balance)
+        self.assertEqual(LedgerEntry.objects.count(), 3)
+
+    def test_aging_buckets(self):
+        today = datetime.date(2030, 6, 30)
+        for days in (0, 5, 30, 31, 75, 200):
+            self.pay(today - datetime.timedelta(days=days), amount='100.00')
+        self.pay(today - datetime.timedelta(days=10), status='completed')
+
+        with self.assertNumQueries(1):
+            rows = tenant_arrears(today)
+        row = rows[0]
+        self.assertEqual(row['days_0_30'], Decimal('200.00'))
+        self.assertEqual(row['days_31_60'], Decimal('100.00'))
+        self.assertEqual(row['days_61_90'], Decimal('100.00'))
+        self.assertEqual(row['days_90_plus'], Decimal('100.00'))
+        self.assertEqual(row['overdue'], Decimal('500.00'))
+        self.assertEqual(row['days_in_arrears'], 200)
+        self.assertEqual(row['tenant__ledger_balance__balance'], Decimal('600.00'))
+        self.assertEqual(property_aging(today)[0]['tenants_in_arrears'], 1)
+
+    def test_arrears_endpoint(self):
+        self.pay(datetime.date(2000, 1, 1))
+        user = User.objects.create_user(
+            email='manager@example.com', password='secret', first_name='Property', last_name='Manager'
+        )
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('payments:arrears')).status_code, 403)
+        user.is_staff = True
+        user.save()
+        response = self.client.get(reverse('payments:arrears'))
+        self.assertEqual(response.json()['tenants'][0]['days_90_plus'], '8000.00')
+        self.assertEqual(self.client.get(reverse('payments:arrears'), {'property': 'x'}).status_code, 400)
+
+
+class BillingRunTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.property = Property.objects.create(
+            title='Harbour View', property_type='apartment', address='1 Beach Road',
+            city='Durban', state='KZN', monthly_rent=Decimal('8000'),
+        )
+        cls.tenants = [
+            Tenant.objects.create(
+                rental_property=cls.property, first_name='Tenant', last_name=str(number),
+                email=f'tenant{number}@example.com', phone='000', lease_start_date=datetime.date(2030, 1, 1),
+                lease_end_date=datetime.date(2031, 12, 31), monthly_rent=Decimal('8000'),
+            )
+            for number in range(3)
+        ]
+        for tenant, frequency in zip(cls.tenants, ('monthly', 'quarterly', 'monthly')):
+            Payment.objects.create(
+                rental_property=cls.property, tenant=tenant, amount=Decimal('8000.00'),
+                discount=Decimal('500.00'), payment_date=datetime.date(2031, 1, 31),
+                due_date=datetime.date(2031, 1, 31), is_recurring=True, recurring_frequency=frequency,
+            )
+        cls.tenants[2].status = 'inactive'
+        cls.tenants[2].save()
+
+    def test_run_is_idempotent(self):
+        report = run_billing(datetime.date(2031, 2, 1), with_invoices=True)
+        self.assertEqual((report['templates'], report['due'], report['created'], report['invoices']), (2, 1, 1, 1))
+        charge = Payment.objects.get(billing_period=datetime.date(2031, 2, 1))
+        self.assertEqual(charge.tenant, self.tenants[0])
+        # Clamped to the end of February, net amount computed in the batch path
+        self.assertEqual(charge.due_date, datetime.date(2031, 2, 28))
+        self.assertEqual(charge.net_amount, Decimal('7500.00'))
+        self.assertEqual(TenantBalance.objects.get(tenant=self.tenants[0]).balance, Decimal('15000.00'))
+
+        again = run_billing(datetime.date(2031, 2, 1), with_invoices=True)
+        self.assertEqual((again['created'], again['skipped']), (0, 1))
+        self.assertEqual(Payment.objects.filter(billing_period__isnull=False).count(), 1)
+
+        # Back to the 31st after the short month
+        run_billing(datetime.date(2031, 3, 1))
+        self.assertEqual(Payment.objects.get(billing_period=datetime.date(2031, 3, 1)).due_date, datetime.date(2031, 3, 31))
+
+    def test_hand_entered_charge_counts_as_billed(self):
+        Payment.objects.create(
+            rental_property=self.property, tenant=self.tenants[0], amount=Decimal('8000.00'),
+            payment_date=datetime.date(2031, 2, 3), due_date=datetime.date(2031, 2, 3),
+            is_recurring=True, recurring_frequency='monthly',
+        )
+        report = run_billing(datetime.date(2031, 2, 1))
+        self.assertEqual((report['due'], report['created'], report['skipped']), (1, 0, 1))
+        self.assertEqual(Payment.objects.filter(tenant=self.tenants[0], due_date__month=2).count(), 1)
+
+    def test_quarterly_charges_fall_due_every_third_month(self):
+        run_billing(datetime.date(2031, 2, 1))
+        run_billing(datetime.date(2031, 3, 1))
+        report = run_billing(datetime.date(2031, 4, 1))
+        self.assertEqual(report['created'], 2)
+        self.assertEqual(
+            Payment.objects.filter(tenant=self.tenants[1], billing_period__isnull=False).get().due_date,
+            datetime.date(2031, 4, 30),
+        )
+
+
+class LateFeeTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.properties = [
+            Property.objects.create(
+                title=title, property_type='apartment', address='1 Beach Road',
+                city='Durban', state='KZN', monthly_rent=Decimal('8000'),
+            )
+            for title in ('Harbour View', 'Berea Court')
+        ]
+        cls.tenants = [
+            Tenant.objects.create(
+                rental_property=rental_property, first_name='Tenant', last_name=rental_property.title,
+                email=f'tenant{number}@example.com', phone='000', lease_start_date=datetime.date(2030, 1, 1),
+                lease_end_date=datetime.date(2030, 12, 31), monthly_rent=Decimal('8000'),
+            )
+            for number, rental_property in enumerate(cls.properties)
+        ]
+        LateFeeRule.objects.create(percentage=Decimal('5'), grace_days=5)
+        LateFeeRule.objects.create(
+            rental_property=cls.properties[1], flat_fee=Decimal('100'), percentage=Decimal('10'),
+            grace_days=0, max_fee=Decimal('500'),
+        )
+
+    def pay(self, tenant, due_date, amount='8000.00', **kwargs):
+        return Payment.objects.create(
+            rental_property=tenant.rental_property, tenant=tenant, amount=Decimal(amount),
+            discount=Decimal('200.00'), payment_date=due_date, due_date=due_date, **kwargs
+        )
+
+    def test_rules_apply_once_with_grace_and_caps(self):
+        today = datetime.date(2030, 3, 10)
+        default = self.pay(self.tenants[0], datetime.date(2030, 3, 1))
+        in_grace = self.pay(self.tenants[0], datetime.date(2030, 3, 6))
+        paid = self.pay(self.tenants[0], datetime.date(2030, 3, 1), status='completed')
+        capped = self.pay(self.tenants[1], datetime.date(2030, 3, 9))
+        small = self.pay(self.tenants[1], datetime.date(2030, 3, 9), amount='1234.50')
+
+        report = assess_late_fees(today)
+        self.assertEqual((report['rules'], report['assessed'], report['fees']), (2, 3, Decimal('1123.45')))
+
+        def fees(payment):
+            payment.refresh_from_db()
+            return payment.late_fee, payment.net_amount
+
+        self.assertEqual(fees(default), (Decimal('400.00'), Decimal('8200.00')))
+        self.assertEqual(fees(capped), (Decimal('500.00'), Decimal('8300.00')))
+        self.assertEqual(fees(small), (Decimal('223.45'), Decimal('1257.95')))
+        self.assertEqual(fees(in_grace)[0], Decimal('0.00'))
+        self.assertEqual(fees(paid)[0], Decimal('0.00'))
+
+        # The ledger follows the set-based update
+        self.assertEqual(TenantBalance.objects.get(tenant=self.tenants[1]).balance, Decimal('9557.95'))
+        self.assertEqual(LedgerEntry.objects.filter(entry_type='adjustment').count(), 3)
+
+        again = assess_late_fees(today)
+        self.assertEqual(again['assessed'], 0)
+        self.assertEqual(LateFeeAssessment.objects.count(), 3)
+        audit = LateFeeAssessment.objects.get(payment=default)
+        self.assertEqual((audit.previous_fee, audit.late_fee, audit.days_overdue), (Decimal('0.00'), Decimal('400.00'), 9))
+
+    def test_dry_run_changes_nothing(self):
+        payment = self.pay(self.tenants[0], datetime.date(2030, 1, 1))
+        report = assess_late_fees(datetime.date(2030, 3, 1), dry_run=True)
+        self.assertEqual(report['assessed'], 1)
+        payment.refresh_from_db()
+        self.assertEqual(payment.late_fee, Decimal('0.00'))
+        self.assertFalse(LateFeeAssessment.objects.exists())
+
+
+STATEMENT = """Date,Description,Reference,Transaction ID,Amount
+2030-03-02,EFT THANDI,RENT-001,BANK-1,8000.00
+03/03/2030,EFT UNKNOWN,,BANK-2,7500.00
+2030-03-04,EFT PARTIAL,RENT-002,BANK-3,"4,000.00"
+2030-03-05,BANK FEES,,BANK-4,-25.00
+2030-03-06,EFT NOBODY,,BANK-5,123.45
+not a date,EFT BROKEN,,BANK-6,100.00
+"""
+
+OFX = """OFXHEADER:100
+DATA:OFXSGML
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20300302120000
+<TRNAMT>8000.00
+<FITID>OFX-1
+<NAME>THANDI DLAMINI
+<MEMO>RENT-001
+</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+class ReconciliationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.property = Property.objects.create(
+            title='Harbour View', property_type='apartment', address='1 Beach Road',
+            city='Durban', state='KZN', monthly_rent=Decimal('8000'),
+        )
+        cls.tenants = [
+            Tenant.objects.create(
+                rental_property=cls.property, first_name='Tenant', last_name=str(number),
+                email=f'tenant{number}@example.com', phone='000', lease_start_date=datetime.date(2030, 1, 1),
+                lease_end_date=datetime.date(2030, 12, 31), monthly_rent=Decimal('8000'),
+            )
+            for number in range(3)
+        ]
+
+    def pay(self, tenant, reference='', amount='8000.00'):
+        return Payment.objects.create(
+            rental_property=self.property, tenant=tenant, amount=Decimal(amount), reference_number=reference,
+            payment_date=datetime.date(2030, 3, 1), due_date=datetime.date(2030, 3, 1),
+        )
+
+    def test_matches_in_bulk_and_records_exceptions(self):
+        by_reference = self.pay(self.tenants[0], 'RENT-001')
+        by_amount = self.pay(self.tenants[1], amount='7500.00')
+        partial = self.pay(self.tenants[2], 'RENT-002')
+
+        statement = import_statement(io.StringIO(STATEMENT), 'csv', 'march.csv', batch_size=2)
+        self.assertEqual((statement.lines, statement.matched, statement.exceptions), (6, 2, 3))
+
+        by_reference.refresh_from_db()
+        self.assertEqual(by_reference.status, 'completed')
+        self.assertEqual(by_reference.transaction_id, 'BANK-1')
+        self.assertEqual(by_reference.received_date, datetime.date(2030, 3, 2))
+        self.assertEqual(Payment.objects.get(pk=by_amount.pk).status, 'completed')
+        self.assertEqual(TenantBalance.objects.get(tenant=self.tenants[0]).balance, Decimal('0.00'))
+
+        reasons = dict(ReconciliationException.objects.values_list('line_number', 'reason'))
+        self.assertEqual(reasons, {4: 'amount_mismatch', 6: 'no_match', 7: 'unreadable'})
+        self.assertEqual(ReconciliationException.objects.get(line_number=4).payment_id, partial.pk)
+
+        again = import_statement(io.StringIO(STATEMENT), 'csv', 'march.csv')
+        self.assertEqual((again.matched, again.already_reconciled), (0, 2))
+
+    def test_reimporting_without_transaction_ids_completes_nothing_new(self):
+        by_reference = self.pay(self.tenants[0], 'RENT-001')
+        same_amount = self.pay(self.tenants[1])
+        self.pay(self.tenants[2], amount='7500.00')
+        statement = 'Date,Reference,Amount\n2030-03-02,RENT-001,8000.00\n2030-03-03,MARCH RENT,7500.00\n'
+
+        first = import_statement(io.StringIO(statement), 'csv', 'march.csv')
+        self.assertEqual((first.matched, first.already_reconciled), (2, 0))
+        self.assertEqual(Payment.objects.get(pk=by_reference.pk).status, 'completed')
+        # Another open charge now fits the second line's amount and date
+        second_charge = self.pay(self.tenants[1], amount='7500.00')
+
+        again = import_statement(io.StringIO(statement), 'csv', 'march.csv')
+        self.assertEqual((again.matched, again.already_reconciled, again.exceptions), (0, 2, 0))
+        self.assertEqual(Payment.objects.get(pk=same_amount.pk).status, 'pending')
+        self.assertEqual(Payment.objects.get(pk=second_charge.pk).status, 'pending')
+
+    def test_same_import_does_not_vouch_for_unreferenced_lines(self):
+        matched = self.pay(self.tenants[0], 'R1', amount='1000.00')
+        # Completed outside reconciliation, for the same amount and date
+        manual = self.pay(self.tenants[1], amount='1000.00')
+        Payment.objects.filter(pk=manual.pk).update(status='completed', received_date=datetime.date(2030, 3, 2))
+        statement = 'Date,Reference,Amount\n2030-03-02,R1,1000\n2030-03-02,,1000\n2030-03-02,,1000\n'
+
+        first = import_statement(io.StringIO(statement), 'csv', 'march.csv', batch_size=1)
+        self.assertEqual((first.matched, first.already_reconciled, first.exceptions), (1, 0, 2))
+        self.assertEqual(Payment.objects.get(pk=matched.pk).statement_import, first)
+        self.assertEqual(
+            list(first.exception_lines.order_by('line_number').values_list('line_number', 'reason')),
+            [(3, 'no_match'), (4, 'no_match')],
+        )
+
+    def test_completed_reference_for_another_amount_is_an_exception(self):
+        payment = self.pay(self.tenants[0], 'R1', amount='1000.00')
+        import_statement(io.StringIO('Date,Reference,Amount\n2030-03-02,R1,1000\n'), 'csv', 'march.csv')
+
+        again = import_statement(
+            io.StringIO('Date,Reference,Amount\n2030-03-02,R1,1000\n2030-03-09,R1,5000.00\n'), 'csv', 'april.csv',
+        )
+        self.assertEqual((again.matched, again.already_reconciled, again.exceptions), (0, 1, 1))
+        exception = again.exception_lines.get()
+        self.assertEqual((exception.line_number, exception.reason), (3, 'amount_mismatch'))
+        self.assertEqual(exception.payment_id, payment.pk)
+
+    def test_ofx_and_ambiguous_amounts(self):
+        payment = self.pay(self.tenants[0], 'RENT-001')
+        self.pay(self.tenants[1], amount='7500.00')
+        self.pay(self.tenants[2], amount='7500.00')
+
+        statement = import_statement(io.StringIO(OFX), 'ofx', 'march.ofx')
+        self.assertEqual(statement.matched, 1)
+        payment.refresh_from_db()
+        self.assertEqual(payment.transaction_id, 'OFX-1')
+
+        import_statement(io.StringIO(STATEMENT), 'csv', 'march.csv')
+        self.assertEqual(ReconciliationException.objects.get(line_number=3).reason, 'ambiguous')
+
+    def test_upload_endpoint(self):
+        self.pay(self.tenants[0], 'RENT-001')
+        user = User.objects.create_user(
+            email='manager@example.com', password='secret', first_name='Property', last_name='Manager'
+        )
+        self.client.force_login(user)
+        url = reverse('payments:reconcile')
+        upload = SimpleUploadedFile('march.csv', STATEMENT.encode())
+        self.assertEqual(self.client.post(url, {'statement': upload}).status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        upload = SimpleUploadedFile('march.csv', STATEMENT.encode())
+        self.assertEqual(self.client.post(url, {'statement': upload}).json()['matched'], 1)
+        bad = SimpleUploadedFile('bad.csv', b'when,what\n')
+        self.assertEqual(self.client.post(url, {'statement': bad}).status_code, 400)
+
+
+class InvoicePdfTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        rental_property = Property.objects.create(
+            title='Harbour View', property_type='apartment', address='1 Beach Road',
+            city='Durban', state='KZN', monthly_rent=Decimal('8000'),
+        )
+        tenant = Tenant.objects.create(
+            rental_property=rental_property, first_name='Thandi', last_name='Dlamini',
+            email='thandi@example.com', phone='000', lease_start_date=datetime.date(2030, 1, 1),
+            lease_end_date=datetime.date(2030, 12, 31), monthly_rent=Decimal('8000'),
+        )
+        cls.invoices = [
+            Invoice.objects.create(
+                rental_property=rental_property, tenant=tenant, invoice_number=f'INV-{number}',
+                invoice_date=datetime.date(2030, 3, 1), due_date=datetime.date(2030, 3, 7), status='sent',
+                subtotal=Decimal('8000.00'), total_amount=Decimal('8000.00'), description='Rent for March (2030)',
+            )
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        override = override_settings(INVOICE_PDF_ROOT=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def read(self, invoice):
+        path, _ = invoice_pdf_path(invoice)
+        with open(path, 'rb') as handle:
+            return path, handle.read()
+
+    def test_unchanged_invoices_are_not_rendered_again(self):
+        report = render_invoices(Invoice.objects.all(), chunk_size=2, now=True)
+        self.assertEqual((report['rendered'], report['cached']), (3, 0))
+        self.assertEqual(render_invoices(Invoice.objects.all(), now=True)['cached'], 3)
+
+        path, pdf = self.read(self.invoices[0])
+        self.assertTrue(pdf.startswith(b'%PDF-'))
+        self.assertIn(b'/FontFile2', pdf)
+        os.unlink(path)
+        self.assertEqual(self.read(self.invoices[0])[1], pdf)
+
+        # A change to what is printed gets a new file; the old one is stale
+        Invoice.objects.filter(pk=self.invoices[0].pk).update(status='paid', paid_date=datetime.date(2030, 3, 5))
+        new_path, _ = invoice_pdf_path(self.invoices[0])
+        self.assertNotEqual(new_path, path)
+        self.assertEqual(prune_cache(Invoice.objects.all()), 1)
+        self.assertFalse(os.path.exists(path))
+
+    def test_names_outside_latin_1_are_embedded(self):
+        Tenant.objects.filter(pk=self.invoices[0].tenant_id).update(first_name='Łukasz', last_name='Смирнов')
+        _, pdf = self.read(self.invoices[0])
+        streams = []
+        for header, stream in re.findall(rb'<<([^<>]*)>>\s*stream\r?\n(.*?)endstream', pdf, re.S):
+            if b'/ASCII85Decode' in header:
+                stream = base64.a85decode(stream.strip().removesuffix(b'~>'))
+            if b'/FlateDecode' in header:
+                stream = zlib.decompress(stream)
+            streams.append(stream)
+        # The embedded subset maps a glyph back to every character of the name
+        for character in 'ŁСмирнов':
+            self.assertIn(b'<%04X>' % ord(character), b''.join(streams))
+
+    def test_missing_pdfs_are_queued_in_chunks(self):
+        with mock.patch.object(render_invoice_pdfs, 'delay') as delay:
+            report = render_invoices(Invoice.objects.all(), chunk_size=2)
+        self.assertEqual((report['missing'], report['rendered']), (3, 0))
+        self.assertEqual([len(call.args[0]) for call in delay.call_args_list], [2, 1])
+
+        for call in delay.call_args_list:
+            render_invoice_pdfs(*call.args)
+        self.assertEqual(render_invoices(Invoice.objects.all(), now=True)['cached'], 3)
+
+    def test_pdf_endpoint_streams_with_etag(self):
+        user = User.objects.create_user(
+            email='manager@example.com', password='secret', first_name='Property', last_name='Manager'
+        )
+        self.client.force_login(user)
+        url = reverse('payments:invoice_pdf', args=[self.invoices[0].pk])
+        self.assertEqual(self.client.get(url).status_code, 403)
+        user.is_staff = True
+        user.save()
+        response = self.client.get(url, {'download': '1'})
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('attachment; filename="INV-0.pdf"', response['Content-Disposition'])
+        self.assertTrue(b''.join(response.streaming_content).endswith(b'%%EOF\n'))
+        response.close()
+
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
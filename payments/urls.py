@@ -5,4 +5,8 @@ app_name = 'payments'
 
 urlpatterns = [
     path('', views.IndexView.as_view(), name='index'),
+    path('arrears/', views.arrears_report, name='arrears'),
+    path('billing-run/', views.billing_run, name='billing_run'),
+    path('reconcile/', views.reconcile_statement, name='reconcile'),
+    path('invoices/<uuid:pk>/pdf/', views.invoice_pdf, name='invoice_pdf'),
 ]
@@ -1,8 +1,22 @@
-from django.shortcuts import render
+import datetime
+import io
+import uuid
+from decimal import Decimal
+
+from django.shortcuts import get_object_or_404, render
 from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, HttpResponseNotModified, JsonResponse
+from django.views.decorators.http import require_http_methods
+from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.views.generic import TemplateView
 
+from .billing import run as run_billing
+from .invoice_pdf import invoice_pdf_path
+from .ledger import AGING_BUCKETS, property_aging, tenant_arrears
+from .models import Invoice
+from .reconciliation import detect_format, import_statement
+
 
 @method_decorator(login_required, name='dispatch')
 class IndexView(TemplateView):
@@ -12,3 +26,127 @@ class IndexView(TemplateView):
         context = super().get_context_data(**kwargs)
         context['user'] = self.request.user
         return context
+
+
+MAX_ARREARS_ROWS = 1000
+
+CENTS = Decimal('0.01')
+
+
+def amounts(row):
+    """Decimals as strings so the report stays exact in JSON"""
+    for name in ('overdue', 'tenant__ledger_balance__balance') + tuple(name for name, _, _ in AGING_BUCKETS):
+        if name in row and row[name] is not None:
+            row[name] = str(row[name].quantize(CENTS))
+    for name in ('tenant_id', 'rental_property_id'):
+        if name in row:
+            row[name] = str(row[name])
+    row['oldest_due'] = row['oldest_due'].isoformat()
+    return row
+
+
+@login_required
+def arrears_report(request):
+    """
+    Aging report from grouped SQL (API endpoint, staff only).
+    
+    Per property totals plus the tenants furthest in arrears;
+    ``?property=<uuid>`` narrows it, ``?limit=`` caps the tenant rows.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    try:
+        properties = [uuid.UUID(request.GET['property'])] if request.GET.get('property') else None
+        limit = min(max(int(request.GET.get('limit', 100)), 1), MAX_ARREARS_ROWS)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid property or limit'}, status=400)
+    
+    summary = property_aging(properties=properties)
+    return JsonResponse({
+        'properties': [amounts(row) for row in summary],
+        'tenants': [amounts(row) for row in tenant_arrears(properties=properties, limit=limit)],
+    })
+
+
+@login_required
+@require_http_methods(["POST"])
+def billing_run(request):
+    """
+    Generate the recurring charges due in a month (API endpoint, staff only).
+    
+    ``period=YYYY-MM`` (default: this month), ``invoices=1`` to also invoice,
+    ``dry_run=1`` to only count. Re-running a month creates nothing new.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    try:
+        period = request.POST.get('period')
+        period = datetime.datetime.strptime(period, '%Y-%m').date() if period else timezone.now().date()
+    except ValueError:
+        return JsonResponse({'error': 'Invalid period'}, status=400)
+    
+    report = run_billing(
+        period,
+        with_invoices=request.POST.get('invoices') == '1',
+        dry_run=request.POST.get('dry_run') == '1',
+    )
+    return JsonResponse(report)
+
+
+@login_required
+@require_http_methods(["POST"])
+def reconcile_statement(request):
+    """
+    Match an uploaded bank statement to open payments (API endpoint, staff only).
+    
+    ``statement`` is a CSV or OFX file, streamed rather than read whole;
+    ``format=csv|ofx`` overrides the guess from the file name. Unmatched lines
+    are stored as reconciliation exceptions.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    upload = request.FILES.get('statement')
+    if upload is None:
+        return JsonResponse({'error': 'No statement uploaded'}, status=400)
+    statement_format = request.POST.get('format') or detect_format(upload.name)
+    if statement_format not in ('csv', 'ofx'):
+        return JsonResponse({'error': 'Invalid format'}, status=400)
+    
+    stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        statement = import_statement(stream, statement_format, upload.name, user=request.user)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse({
+        'id': statement.pk,
+        'lines': statement.lines,
+        'matched': statement.matched,
+        'already_reconciled': statement.already_reconciled,
+        'exceptions': statement.exceptions,
+    })
+
+
+@login_required
+def invoice_pdf(request, pk):
+    """
+    Stream an invoice's PDF from the content-hash cache, rendering it first
+    if the invoice changed since it was last rendered. ``?download=1``
+    serves it as an attachment. Staff only: invoices carry no link to a
+    user account that could identify their tenant.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    invoice = get_object_or_404(Invoice, pk=pk)
+    path, digest = invoice_pdf_path(invoice)
+    etag = f'"{digest[:32]}"'
+    if request.headers.get('If-None-Match') == etag:
+        return HttpResponseNotModified(headers={'ETag': etag})
+    response = FileResponse(
+        open(path, 'rb'),
+        content_type='application/pdf',
+        as_attachment=request.GET.get('download') == '1',
+        filename=f'{invoice.invoice_number}.pdf',
+    )
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,15 @@
+"""
+Celery application for background jobs (image variants, invoice PDFs).
+
+Workers run with ``celery -A rentala worker``; tasks live in each app's
+``tasks`` module and are discovered automatically.
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rentala.settings')
+
+app = Celery('rentala')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     # Third-party apps
     'crispy_forms',
     'crispy_bootstrap5',
+    'rest_framework',
 
     # Local apps
     'core',
@@ -55,6 +56,7 @@ INSTALLED_APPS = [
     'properties',
     'tenants',
     'maintenance',
+    'api',
 ]
 
 MIDDLEWARE = [
@@ -145,6 +147,32 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Celery (rentala.celery) renders listing image variants and invoice PDFs;
+# late acks redeliver a job whose worker died mid-task
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# TrueType fonts embedded in invoice PDFs (see payments.invoice_pdf)
+INVOICE_PDF_FONT = os.environ.get('INVOICE_PDF_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+INVOICE_PDF_BOLD_FONT = os.environ.get(
+    'INVOICE_PDF_BOLD_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'
+)
+
+# In-memory listing catalog for filter-only searches (see listings.catalog)
+LISTING_CATALOG_ENABLED = os.environ.get('LISTING_CATALOG_ENABLED', 'False') == 'True'
+LISTING_CATALOG_MAX_ROWS = int(os.environ.get('LISTING_CATALOG_MAX_ROWS', 200000))
+LISTING_CATALOG_REFRESH_SECONDS = int(os.environ.get('LISTING_CATALOG_REFRESH_SECONDS', 5))
+
+# Platform service fee as a fraction of the stay (see bookings.pricing)
+BOOKING_SERVICE_FEE_RATE = os.environ.get('BOOKING_SERVICE_FEE_RATE', '0.10')
+
+# Seconds a signed price quote is honoured before it is priced again (see bookings.quotes)
+BOOKING_QUOTE_TTL = int(os.environ.get('BOOKING_QUOTE_TTL', 900))
+
+# Unpaid pending bookings older than this are cancelled by sweep_bookings
+BOOKING_PENDING_EXPIRY_HOURS = int(os.environ.get('BOOKING_PENDING_EXPIRY_HOURS', 24))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -155,6 +183,14 @@ AUTH_USER_MODEL = 'accounts.User'
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
+# REST API (api.urls); JWT for the desktop and mobile clients, sessions for the web
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ),
+}
+
 # Login/Logout URLs
 LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
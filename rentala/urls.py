@@ -21,6 +21,9 @@ urlpatterns = [
     # Original app URLs (for rental marketplace)
     path('listings/', include('listings.urls')),
     path('bookings/', include('bookings.urls')),
+    
+    # REST API for the web, desktop and mobile clients
+    path('api/', include('api.urls')),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,35 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from listings.models import Listing
+from .models import Review
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, **kwargs):
+    """Keep the stored rating/listing so an edit can be applied as a delta"""
+    instance._previous = None
+    if instance.pk:
+        instance._previous = (
+            Review.objects.filter(pk=instance.pk).values_list('listing_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def apply_review_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if created or previous is None:
+        Listing.adjust_rating(instance.listing_id, instance.rating, 1)
+        return
+    
+    old_listing_id, old_rating = previous
+    if old_listing_id != instance.listing_id:
+        Listing.adjust_rating(old_listing_id, -old_rating, -1)
+        Listing.adjust_rating(instance.listing_id, instance.rating, 1)
+    elif old_rating != instance.rating:
+        Listing.adjust_rating(instance.listing_id, instance.rating - old_rating, 0)
+
+
+@receiver(post_delete, sender=Review)
+def apply_review_deleted(sender, instance, **kwargs):
+    Listing.adjust_rating(instance.listing_id, -instance.rating, -1)
@@ -1,3 +1,65 @@
+from decimal import Decimal
+
 from django.test import TestCase
 
-# Create your tests here.
+from accounts.models import User
+from listings.models import Listing
+from .models import Review
+
+
+class RatingAggregateTests(TestCase):
+    """Review signals keep Listing's stored rating in step with a full rebuild"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.guest = User.objects.create_user(
+            email='guest@example.com', password='secret', first_name='Guest', last_name='User'
+        )
+        cls.listings = [
+            Listing.objects.create(
+                title=f'Listing {index}',
+                description='Sunny and central',
+                host=cls.guest,
+                price_per_day=100,
+                city='Cape Town',
+                country='South Africa',
+                is_approved=True,
+            )
+            for index in range(2)
+        ]
+
+    def aggregates(self):
+        return list(Listing.objects.order_by('id').values_list('rating_sum', 'rating_count', 'rating_average'))
+
+    def test_signals_match_rebuild(self):
+        first, second = self.listings
+        reviews = [Review.objects.create(listing=first, reviewer=self.guest, rating=rating) for rating in (5, 4, 2)]
+        self.assertEqual(self.aggregates()[0], (11, 3, Decimal('3.67')))
+
+        reviews[2].rating = 5
+        reviews[2].save()
+        reviews[1].listing = second
+        reviews[1].save()
+        reviews[0].delete()
+        self.assertEqual(self.aggregates(), [(5, 1, Decimal('5.00')), (4, 1, Decimal('4.00'))])
+
+        incremental = self.aggregates()
+        self.assertEqual(Listing.rebuild_rating_aggregates(), 0)
+        Listing.objects.update(rating_sum=0, rating_count=0, rating_average=None)
+        self.assertEqual(Listing.rebuild_rating_aggregates(), 2)
+        self.assertEqual(self.aggregates(), incremental)
+
+    def test_last_review_deleted_clears_average(self):
+        review = Review.objects.create(listing=self.listings[0], reviewer=self.guest, rating=3)
+        review.delete()
+        self.assertEqual(self.aggregates()[0], (0, 0, None))
+        self.assertIsNone(Listing.objects.get(pk=self.listings[0].pk).average_rating)
+
+    def test_half_cent_averages_round_half_up_on_both_paths(self):
+        # 29 / 8 = 3.625
+        for rating in (5, 5, 4, 4, 3, 3, 3, 2):
+            Review.objects.create(listing=self.listings[0], reviewer=self.guest, rating=rating)
+        self.assertEqual(self.aggregates()[0], (29, 8, Decimal('3.63')))
+        Listing.objects.update(rating_average=None)
+        Listing.rebuild_rating_aggregates()
+        self.assertEqual(self.aggregates()[0], (29, 8, Decimal('3.63')))
@@ -0,0 +1,101 @@
+# Generated by Django 4.2 on 2026-10-17 20:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('properties', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tenant',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('first_name', models.CharField(max_length=100)),
+                ('last_name', models.CharField(max_length=100)),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('phone', models.CharField(max_length=20)),
+                ('alternate_phone', models.CharField(blank=True, max_length=20)),
+                ('date_of_birth', models.DateField(blank=True, null=True)),
+                ('address', models.CharField(blank=True, max_length=255)),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('state', models.CharField(blank=True, max_length=100)),
+                ('country', models.CharField(blank=True, max_length=100)),
+                ('postal_code', models.CharField(blank=True, max_length=20)),
+                ('employer', models.CharField(blank=True, max_length=200)),
+                ('job_title', models.CharField(blank=True, max_length=100)),
+                ('monthly_income', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('emergency_contact_name', models.CharField(blank=True, max_length=200)),
+                ('emergency_contact_phone', models.CharField(blank=True, max_length=20)),
+                ('emergency_contact_relationship', models.CharField(blank=True, max_length=100)),
+                ('lease_start_date', models.DateField()),
+                ('lease_end_date', models.DateField()),
+                ('monthly_rent', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('security_deposit', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('pet_deposit', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('inactive', 'Inactive'), ('pending', 'Pending'), ('evicted', 'Evicted')], default='active', max_length=20)),
+                ('notes', models.TextField(blank=True)),
+                ('pets', models.TextField(blank=True)),
+                ('vehicles', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('move_in_date', models.DateField(blank=True, null=True)),
+                ('move_out_date', models.DateField(blank=True, null=True)),
+                ('rental_property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tenants', to='properties.property')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TenantNote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('note', models.TextField()),
+                ('is_important', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notes_history', to='tenants.tenant')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TenantDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('document_type', models.CharField(choices=[('id', 'ID/Passport'), ('lease', 'Lease Agreement'), ('employment', 'Employment Verification'), ('credit', 'Credit Report'), ('background', 'Background Check'), ('other', 'Other')], max_length=20)),
+                ('title', models.CharField(max_length=200)),
+                ('file', models.FileField(upload_to='tenant_documents/')),
+                ('description', models.TextField(blank=True)),
+                ('upload_date', models.DateTimeField(auto_now_add=True)),
+                ('expiration_date', models.DateField(blank=True, null=True)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='documents', to='tenants.tenant')),
+            ],
+            options={
+                'ordering': ['-upload_date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='tenant',
+            index=models.Index(fields=['rental_property', 'status'], name='tenants_ten_rental__914dfd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tenant',
+            index=models.Index(fields=['email'], name='tenants_ten_email_4879df_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tenant',
+            index=models.Index(fields=['last_name', 'first_name'], name='tenants_ten_last_na_4bfab3_idx'),
+        ),
+    ]